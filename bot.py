@@ -13,6 +13,8 @@ from discord.ext import commands
 from discord import app_commands
 from dotenv import load_dotenv
 
+from utils.ratelimit import AdmissionDenied, send_admission_denied
+
 # ロギングの設定
 logging.basicConfig(
     level=logging.INFO,
@@ -70,6 +72,112 @@ class DatabaseMixin:
                 )
             ''')
             
+            # 古いデータベースには表示名カラムがない場合がある
+            self._ensure_column(cursor, 'thoughts', 'display_name', 'TEXT')
+
+            # Webhook 配信したメッセージの Webhook ID
+            self._ensure_column(cursor, 'message_references', 'webhook_id', 'TEXT')
+
+            # 重複投稿防止用のハッシュ（重複判定ウィンドウ内の投稿だけ値を持つ）
+            self._ensure_column(cursor, 'thoughts', 'content_hash', 'TEXT')
+            cursor.execute('''
+                CREATE UNIQUE INDEX IF NOT EXISTS idx_thoughts_content_hash
+                ON thoughts (content_hash) WHERE content_hash IS NOT NULL
+            ''')
+
+            # 論理削除（墓標）と後片付けの状態
+            self._ensure_column(cursor, 'thoughts', 'deleted_at', 'TIMESTAMP')
+            self._ensure_column(cursor, 'thoughts', 'purge_attempts', 'INTEGER DEFAULT 0')
+            self._ensure_column(cursor, 'thoughts', 'purge_after', 'TIMESTAMP')
+            # 一覧・検索は削除されていない投稿だけを部分インデックスで引く
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_thoughts_live_user
+                ON thoughts (user_id, created_at) WHERE deleted_at IS NULL
+            ''')
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_thoughts_live_public
+                ON thoughts (created_at) WHERE deleted_at IS NULL AND is_private = 0
+            ''')
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_thoughts_tombstones
+                ON thoughts (deleted_at) WHERE deleted_at IS NOT NULL
+            ''')
+
+            # ユーザーごとの集計（削除済みでない投稿だけを数え、トリガーで維持する）
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'user_stats'")
+            user_stats_exists = cursor.fetchone() is not None
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS user_stats (
+                    user_id INTEGER PRIMARY KEY,
+                    total INTEGER NOT NULL DEFAULT 0,
+                    private INTEGER NOT NULL DEFAULT 0,
+                    anonymous INTEGER NOT NULL DEFAULT 0,
+                    last_post_at TIMESTAMP
+                )
+            ''')
+            self._create_user_stats_triggers(cursor)
+            if not user_stats_exists:
+                self._rebuild_user_stats(cursor)
+                logger.info("user_statsテーブルを作成し、集計を初期化しました")
+
+            # 投稿者の表示情報のキャッシュ（updated_at は UNIX 時刻）
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS user_profiles (
+                    user_id INTEGER PRIMARY KEY,
+                    username TEXT NOT NULL,
+                    display_name TEXT NOT NULL,
+                    avatar_url TEXT,
+                    updated_at REAL NOT NULL
+                )
+            ''')
+
+            # 編集履歴（差分または全文のスナップショット）
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS thought_revisions (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    post_id INTEGER NOT NULL,
+                    revision INTEGER NOT NULL,
+                    kind TEXT NOT NULL,
+                    data TEXT NOT NULL,
+                    category TEXT,
+                    image_url TEXT,
+                    editor_id INTEGER,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    UNIQUE (post_id, revision),
+                    FOREIGN KEY (post_id) REFERENCES thoughts (id) ON DELETE CASCADE
+                )
+            ''')
+
+            # メッセージからの復元の進捗（チャンネル・スレッドごとに処理済みの最新メッセージID）
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS recovery_checkpoints (
+                    channel_id TEXT PRIMARY KEY,
+                    last_message_id TEXT NOT NULL,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+
+            # 管理コマンドのバックグラウンドジョブ
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    kind TEXT NOT NULL,
+                    params TEXT,
+                    status TEXT NOT NULL,
+                    requested_by INTEGER,
+                    progress TEXT,
+                    result TEXT,
+                    error TEXT,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    started_at TIMESTAMP,
+                    finished_at TIMESTAMP
+                )
+            ''')
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_jobs_active
+                ON jobs (status) WHERE status IN ('queued', 'running')
+            ''')
+
             # インデックス作成
             cursor.execute('CREATE INDEX IF NOT EXISTS idx_thoughts_user_id ON thoughts (user_id)')
             cursor.execute('CREATE INDEX IF NOT EXISTS idx_thoughts_created_at ON thoughts (created_at)')
@@ -81,7 +189,101 @@ class DatabaseMixin:
             cursor.execute('PRAGMA cache_size=-2000')
             
             conn.commit()
-    
+
+    @staticmethod
+    def _ensure_column(cursor, table: str, column: str, definition: str) -> None:
+        """カラムが存在しなければ追加する"""
+        cursor.execute(f'PRAGMA table_info({table})')
+        columns = {row[1] for row in cursor.fetchall()}
+        if column not in columns:
+            cursor.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+            logger.info(f"{table}テーブルに{column}カラムを追加しました")
+
+    @staticmethod
+    def _create_user_stats_triggers(cursor) -> None:
+        """thoughts の変更に合わせて user_stats を更新するトリガーを作成する"""
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS trg_user_stats_insert
+            AFTER INSERT ON thoughts
+            WHEN NEW.user_id IS NOT NULL AND NEW.deleted_at IS NULL
+            BEGIN
+                INSERT INTO user_stats (user_id, total, private, anonymous, last_post_at)
+                VALUES (
+                    NEW.user_id, 1,
+                    CASE WHEN NEW.is_private THEN 1 ELSE 0 END,
+                    CASE WHEN NEW.is_anonymous THEN 1 ELSE 0 END,
+                    NEW.created_at
+                )
+                ON CONFLICT (user_id) DO UPDATE SET
+                    total = total + 1,
+                    private = private + excluded.private,
+                    anonymous = anonymous + excluded.anonymous,
+                    last_post_at = MAX(COALESCE(last_post_at, ''), excluded.last_post_at);
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS trg_user_stats_delete
+            AFTER DELETE ON thoughts
+            WHEN OLD.user_id IS NOT NULL AND OLD.deleted_at IS NULL
+            BEGIN
+                UPDATE user_stats SET
+                    total = total - 1,
+                    private = private - CASE WHEN OLD.is_private THEN 1 ELSE 0 END,
+                    anonymous = anonymous - CASE WHEN OLD.is_anonymous THEN 1 ELSE 0 END,
+                    last_post_at = (
+                        SELECT MAX(created_at) FROM thoughts
+                        WHERE user_id = OLD.user_id AND deleted_at IS NULL
+                    )
+                WHERE user_id = OLD.user_id;
+            END
+        ''')
+        # 更新は「古い値を引いて新しい値を足す」として扱う（削除済みの印もここで反映される）
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS trg_user_stats_update
+            AFTER UPDATE OF user_id, is_private, is_anonymous, deleted_at ON thoughts
+            BEGIN
+                UPDATE user_stats SET
+                    total = total - 1,
+                    private = private - CASE WHEN OLD.is_private THEN 1 ELSE 0 END,
+                    anonymous = anonymous - CASE WHEN OLD.is_anonymous THEN 1 ELSE 0 END,
+                    last_post_at = (
+                        SELECT MAX(created_at) FROM thoughts
+                        WHERE user_id = OLD.user_id AND deleted_at IS NULL
+                    )
+                WHERE user_id = OLD.user_id AND OLD.deleted_at IS NULL;
+                INSERT INTO user_stats (user_id, total, private, anonymous, last_post_at)
+                SELECT
+                    NEW.user_id, 1,
+                    CASE WHEN NEW.is_private THEN 1 ELSE 0 END,
+                    CASE WHEN NEW.is_anonymous THEN 1 ELSE 0 END,
+                    NEW.created_at
+                WHERE NEW.user_id IS NOT NULL AND NEW.deleted_at IS NULL
+                ON CONFLICT (user_id) DO UPDATE SET
+                    total = total + 1,
+                    private = private + excluded.private,
+                    anonymous = anonymous + excluded.anonymous,
+                    last_post_at = MAX(COALESCE(last_post_at, ''), excluded.last_post_at);
+            END
+        ''')
+
+    @staticmethod
+    def _rebuild_user_stats(cursor) -> int:
+        """user_stats を thoughts から作り直し、ユーザー数を返す"""
+        cursor.execute('DELETE FROM user_stats')
+        cursor.execute('''
+            INSERT INTO user_stats (user_id, total, private, anonymous, last_post_at)
+            SELECT
+                user_id,
+                COUNT(*),
+                SUM(CASE WHEN is_private THEN 1 ELSE 0 END),
+                SUM(CASE WHEN is_anonymous THEN 1 ELSE 0 END),
+                MAX(created_at)
+            FROM thoughts
+            WHERE user_id IS NOT NULL AND deleted_at IS NULL
+            GROUP BY user_id
+        ''')
+        return cursor.rowcount
+
     @contextlib.contextmanager
     def _get_db_connection(self):
         """データベース接続を取得するコンテキストマネージャ"""
@@ -129,6 +331,7 @@ class ThoughtBot(commands.Bot, DatabaseMixin):
     async def setup_hook(self):
         """起動時の初期化処理"""
         # コマンドツリーのクリアは行わない（各Cogのsetupで登録するため）
+        self.tree.error(self.on_app_command_error)
         logger.info('🔄 拡張機能の読み込みを開始します...')
         
         # コグの読み込み
@@ -142,9 +345,13 @@ class ThoughtBot(commands.Bot, DatabaseMixin):
             'cogs.thoughts.list',
             'cogs.thoughts.search',
             'cogs.thoughts.edit',
+            'cogs.thoughts.history',  # 編集履歴
             'cogs.thoughts.restore_messages',  # メッセージ整理用
             'cogs.thoughts.data_recovery',  # データ復元用
             'cogs.thoughts.user_fix',  # 投稿者情報修正用
+            'cogs.thoughts.metrics',  # メトリクス表示用
+            'cogs.thoughts.profiles',  # 投稿者プロフィールのキャッシュ
+            'cogs.thoughts.jobs',  # 管理コマンドのバックグラウンドジョブ
             'cogs.thoughts.help',
         ]
         
@@ -265,6 +472,15 @@ class ThoughtBot(commands.Bot, DatabaseMixin):
             except Exception as e:
                 logger.error(f'❌ コマンドツリーの再同期に失敗しました: {e}', exc_info=True)
     
+    async def on_app_command_error(self, interaction: discord.Interaction, error: app_commands.AppCommandError):
+        """スラッシュコマンドのエラーを処理する"""
+        if isinstance(error, AdmissionDenied):
+            await send_admission_denied(interaction, error)
+            return
+        
+        command_name = interaction.command.name if interaction.command else '不明'
+        logger.error(f'❌ コマンド /{command_name} の実行中にエラーが発生しました: {error}', exc_info=error)
+    
     async def on_ready(self):
         """ボットの準備が完了したときに呼び出される"""
         logger.info(f'✅ ログインしました: {self.user} (ID: {self.user.id})')
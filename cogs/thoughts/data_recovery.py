@@ -2,264 +2,330 @@ import discord
 from discord.ext import commands
 from discord import app_commands
 import sqlite3
+import asyncio
 import logging
-from typing import Optional
+import os
+import threading
+from typing import Dict, List, Optional, Tuple, Union
 from bot import DatabaseMixin
-from config import DEFAULT_AVATAR
+from config import CHANNELS
+from utils.budget import RequestBudget
+from utils.jobs import job_manager
+from utils.progress import ProgressReporter
+from utils.recovery import RecoveryWriter, load_checkpoint, parse_post_message, recover_from_export
 
 logger = logging.getLogger(__name__)
 
+# この件数のメッセージを処理するごとに書き込んでチェックポイントを保存する
+RECOVERY_CHECKPOINT_INTERVAL = 500
+# 同時に走査するチャンネル・スレッド数
+RECOVERY_CONCURRENCY = 4
+# 走査に使う1秒あたりのAPI呼び出し数（全ワーカーで共有）
+RECOVERY_RATE = 8.0
+# channel.history() / archived_threads() が1回のAPI呼び出しで返す件数
+HISTORY_PAGE_SIZE = 100
+# 進捗に表示するチャンネル・スレッドの最大数
+MAX_SHOWN_SOURCES = 15
+
+Source = Union[discord.TextChannel, discord.Thread]
+
+
+class SourceProgress:
+    """走査対象1つ分の進捗"""
+
+    def __init__(self, source: Source, resumed: bool) -> None:
+        self.source = source
+        self.resumed = resumed
+        self.state = 'waiting'
+        self.scanned = 0
+        self.recovered = 0
+        self.error: Optional[str] = None
+
+    def describe(self) -> str:
+        icon = "🧵" if isinstance(self.source, discord.Thread) else "📁"
+        mark = {'waiting': '⏳', 'running': '🔄', 'done': '✅', 'failed': '⚠️'}[self.state]
+        line = f"{mark} {icon} {self.source.name}: {self.scanned}件確認 / {self.recovered}件復元"
+        if self.resumed:
+            line += "（続きから）"
+        if self.error:
+            line += f" - {self.error}"
+        return line
+
+
 class DataRecovery(commands.Cog, DatabaseMixin):
     """データ復元用Cog"""
-    
+
     def __init__(self, bot: commands.Bot):
         self.bot = bot
         DatabaseMixin.__init__(self)
-    
+
     @app_commands.command(name="recover_from_messages", description="Discordメッセージからデータベースを復元します")
     @app_commands.default_permissions(administrator=True)
     @app_commands.checks.has_permissions(administrator=True)
-    @app_commands.describe(channel_id="復元するチャンネルID（省略可）")
-    async def recover_from_messages(self, interaction: discord.Interaction, channel_id: Optional[str] = None):
+    @app_commands.describe(
+        channel_id="復元するチャンネルID（省略可）",
+        full_scan="前回の続きからではなく、最初から走査し直す"
+    )
+    async def recover_from_messages(self, interaction: discord.Interaction, channel_id: Optional[str] = None, full_scan: bool = False):
         """Discordメッセージからデータベースを復元します"""
+        await job_manager.submit(
+            interaction,
+            'recover_from_messages',
+            lambda job: self._recover_from_messages(job, channel_id, full_scan),
+            {'channel_id': channel_id, 'full_scan': full_scan}
+        )
+
+    async def _recover_from_messages(self, interaction: discord.Interaction, channel_id: Optional[str], full_scan: bool) -> None:
+        """Discordメッセージからデータベースを復元します（ジョブとして実行）
+
+        チャンネル・スレッドごとに処理済みの最新メッセージIDを recovery_checkpoints に
+        保存し、通常は前回の続き（それ以降の新しいメッセージ）だけを走査します。
+        途中で中断しても、次回は最後に保存したチェックポイントから再開します。
+        アーカイブ済みのスレッドも含め、複数のチャンネル・スレッドを並行して走査します。
+        """
+        # 復元対象チャンネルを決定
+        channels = []
+        if channel_id:
+            target_channel = interaction.guild.get_channel_or_thread(int(channel_id))
+            if not target_channel:
+                await interaction.followup.send("❌ 指定されたチャンネルが見つかりません。", ephemeral=True)
+                return
+            channels.append(target_channel)
+        else:
+            # 公開チャンネルと非公開チャンネルの両方を確認
+            for channel_type, cid in CHANNELS.items():
+                ch = interaction.guild.get_channel(cid)
+                if ch:
+                    channels.append(ch)
+
+            if not channels:
+                await interaction.followup.send("❌ チャンネルが見つかりません。", ephemeral=True)
+                return
+
+        budget = RequestBudget(rate=RECOVERY_RATE, burst=RECOVERY_CONCURRENCY)
+
+        # チャンネルと、アクティブ・アーカイブ済み（公開・非公開）のスレッドを走査対象にする
+        sources: List[Source] = []
+        for channel in channels:
+            sources.append(channel)
+            sources.extend(await self._list_threads(channel, budget))
+
+        with self._get_db_connection() as conn:
+            # 既存の投稿IDは最初に1回だけ読み込む
+            writer = RecoveryWriter(conn)
+            progress: Dict[int, SourceProgress] = {}
+            after_ids: Dict[int, Optional[int]] = {}
+            for source in sources:
+                after_ids[source.id] = None if full_scan else load_checkpoint(conn, source.id)
+                progress[source.id] = SourceProgress(source, resumed=after_ids[source.id] is not None)
+
+            reporter = ProgressReporter("🔍 チャンネル・スレッドを走査しています", total=len(sources))
+            reporter.detail = lambda: self._describe_sources(progress, budget)
+            await reporter.start(interaction)
+
+            queue: asyncio.Queue = asyncio.Queue()
+            for source in sources:
+                queue.put_nowait(source)
+
+            async def worker() -> None:
+                while True:
+                    try:
+                        source = queue.get_nowait()
+                    except asyncio.QueueEmpty:
+                        return
+                    entry = progress[source.id]
+                    entry.state = 'running'
+                    try:
+                        await self._recover_source(writer, source, interaction.user.id, after_ids[source.id], budget, entry)
+                        entry.state = 'done'
+                    except discord.HTTPException as e:
+                        # 権限のないスレッドなどは飛ばして続ける（チェックポイントは書き込み済みの分まで進む）
+                        logger.warning(f"チャンネルの走査に失敗しました: {source.name} ({source.id}), error={e}")
+                        entry.state = 'failed'
+                        entry.error = f"{e.status} {e.text or ''}".strip()
+                        reporter.add_error(f"{source.name}: {entry.error}")
+                    reporter.advance()
+
+            workers = [asyncio.create_task(worker()) for _ in range(min(RECOVERY_CONCURRENCY, len(sources)))]
+            try:
+                async with reporter:
+                    await asyncio.gather(*workers)
+            finally:
+                for task in workers:
+                    task.cancel()
+                # 途中で失敗しても、走査済みの分は書き込んでおく
+                writer.flush()
+
+        recovered_count = writer.recovered
+        failed = sum(1 for entry in progress.values() if entry.state == 'failed')
+        scanned = sum(entry.scanned for entry in progress.values())
+        lines = [
+            f"✅ データベース復元が完了しました！",
+            f"📊 復元件数: {recovered_count}件",
+            f"📁 走査したチャンネル・スレッド: {len(sources) - failed}/{len(sources)}件",
+            f"📨 確認したメッセージ: {scanned}件",
+            f"📡 API呼び出し: {budget.used}回",
+            f"💾 データベースをバックアップすることをお勧めします。"
+        ]
+        lines.extend(entry.describe() for entry in progress.values() if entry.state == 'failed')
+        await reporter.finish("\n".join(lines))
+
+        logger.info(f"データベース復元完了: {recovered_count}件")
+
+    @app_commands.command(name="recover_from_export", description="保存したチャンネルのエクスポートファイルからデータベースを復元します")
+    @app_commands.default_permissions(administrator=True)
+    @app_commands.checks.has_permissions(administrator=True)
+    @app_commands.describe(
+        file_path="ボットのサーバー上にあるエクスポートファイル（JSON / JSONL）のパス",
+        channel_id="ファイルにチャンネルIDが含まれない場合のチャンネルID（省略可）",
+        is_private="非公開の投稿として復元するか（省略時はチャンネルから判定）"
+    )
+    async def recover_from_export(
+        self,
+        interaction: discord.Interaction,
+        file_path: str,
+        channel_id: Optional[str] = None,
+        is_private: Optional[bool] = None
+    ):
+        """保存したチャンネルのエクスポートファイルからデータベースを復元します"""
+        await job_manager.submit(
+            interaction,
+            'recover_from_export',
+            lambda job: self._recover_from_export(job, file_path, channel_id, is_private),
+            {'file_path': file_path, 'channel_id': channel_id, 'is_private': is_private}
+        )
+
+    async def _recover_from_export(
+        self,
+        interaction: discord.Interaction,
+        file_path: str,
+        channel_id: Optional[str],
+        is_private: Optional[bool]
+    ) -> None:
+        """エクスポートファイルから復元します（ジョブとして実行）
+
+        API を使わずにファイルを1メッセージずつ読み込み、別スレッドでまとめて書き込みます。
+        """
+        if not os.path.isfile(file_path):
+            await interaction.followup.send(f"❌ ファイルが見つかりません: {file_path}", ephemeral=True)
+            return
+
+        reporter = ProgressReporter("📦 エクスポートから復元しています")
+        recovered = 0
+        reporter.detail = lambda: [f"🔄 復元: {recovered}件"]
+        await reporter.start(interaction)
+
+        stop = threading.Event()
+
+        def on_progress(scanned: int, recovered_so_far: int) -> None:
+            nonlocal recovered
+            if stop.is_set():
+                raise RuntimeError("エクスポートからの復元はキャンセルされました")
+            reporter.done = scanned
+            recovered = recovered_so_far
+
+        def run() -> Tuple[int, int]:
+            with self._get_db_connection() as conn:
+                return recover_from_export(
+                    conn,
+                    file_path,
+                    interaction.user.id,
+                    channel_id=channel_id,
+                    is_private=is_private,
+                    on_progress=on_progress
+                )
+
         try:
-            await interaction.response.defer(ephemeral=True)
-            
-            # 復元対象チャンネルを決定
-            channels = []
-            if channel_id:
-                target_channel = interaction.guild.get_channel(int(channel_id))
-                if not target_channel:
-                    await interaction.followup.send("❌ 指定されたチャンネルが見つかりません。", ephemeral=True)
-                    return
-                channels.append(target_channel)
-            else:
-                # 公開チャンネルと非公開チャンネルの両方を確認
-                from config import CHANNELS
-                for channel_type, cid in CHANNELS.items():
-                    ch = interaction.guild.get_channel(cid)
-                    if ch:
-                        channels.append(ch)
-                
-                if not channels:
-                    await interaction.followup.send("❌ チャンネルが見つかりません。", ephemeral=True)
-                    return
-            
-            recovered_count = 0
-            
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                
-                # テーブルが存在することを確認
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS thoughts (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        content TEXT NOT NULL,
-                        category TEXT,
-                        image_url TEXT,
-                        is_anonymous BOOLEAN DEFAULT 0,
-                        is_private BOOLEAN DEFAULT 0,
-                        user_id INTEGER,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                    )
-                ''')
-                
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS message_references (
-                        post_id INTEGER,
-                        message_id TEXT,
-                        channel_id TEXT,
-                        PRIMARY KEY (post_id)
-                    )
-                ''')
-                
-                target_channels = [target_channel] if channel_id else channels
-                
-                for channel in target_channels:
-                    await interaction.followup.send(f"📁 {channel.name} のメッセージをスキャン中...", ephemeral=True)
-                    
-                    # チャンネルのメッセージを取得
-                    async for message in channel.history(limit=None):
-                        # ボットのメッセージのみを処理
-                        if message.author.bot and message.embeds:
-                            embed = message.embeds[0]
-                            
-                            # 投稿内容を取得
-                            content = embed.description
-                            if not content:
-                                continue
-                            
-                            # フッターから投稿IDを抽出
-                            footer_text = embed.footer.text if embed.footer else ""
-                            post_id = None
-                            
-                            if "ID:" in footer_text:
-                                try:
-                                    post_id = int(footer_text.split("ID:")[1].strip())
-                                except (ValueError, IndexError):
-                                    pass
-                            
-                            # カテゴリーを抽出
-                            category = None
-                            if "カテゴリ:" in footer_text:
-                                try:
-                                    category = footer_text.split("カテゴリ:")[1].split("|")[0].strip()
-                                    if category == "未設定":
-                                        category = None
-                                except (IndexError, AttributeError):
-                                    pass
-                            
-                            # message_referencesからuser_idを取得
-                            cursor.execute('''
-                                SELECT user_id 
-                                FROM message_references 
-                                WHERE message_id = ?
-                            ''', (message_id,))
-                            user_ref = cursor.fetchone()
-                            original_user_id = user_ref[0] if user_ref else None
-                            
-                            if original_user_id is None:
-                                print(f"[DEBUG] 投稿ID {post_id}: message_referencesにuser_idが見つかりません")
-                                continue
-                            else:
-                                print(f"[DEBUG] 投稿ID {post_id}: user_id={original_user_id} を検出、復元します")
-                            
-                            # 匿名設定を判定
-                            is_anonymous = embed.author.name == "匿名ユーザー"
-                            is_private = not any(ch.id == channel.id for ch in channels if ch.name and "公開" in ch.name)
-                            
-                            # データベースに存在しないことを確認
-                            if post_id:
-                                cursor.execute('SELECT id FROM thoughts WHERE id = ?', (post_id,))
-                                if not cursor.fetchone():
-                                    # データベースに挿入
-                                    cursor.execute('''
-                                        INSERT INTO thoughts (id, content, category, is_anonymous, is_private, user_id, created_at)
-                                        VALUES (?, ?, ?, ?, ?, ?, ?)
-                                    ''', (
-                                        post_id,
-                                        content,
-                                        category,
-                                        is_anonymous,
-                                        is_private,
-                                        original_user_id,  # 匿名の場合はNULL、非匿名の場合は復元実行者のID（暫定）
-                                        message.created_at
-                                    ))
-                                    
-                                    # メッセージ参照を追加
-                                    cursor.execute('''
-                                        INSERT INTO message_references (post_id, message_id, channel_id)
-                                        VALUES (?, ?, ?)
-                                    ''', (post_id, str(message.id), str(channel.id)))
-                                    
-                                    recovered_count += 1
-                                    
-                                    if recovered_count % 10 == 0:
-                                        await interaction.followup.send(
-                                            f"🔄 {recovered_count}件を復元中...", 
-                                            ephemeral=True
-                                        )
-                    
-                    # スレッドもスキャン
-                    if hasattr(channel, 'threads'):
-                        for thread in channel.threads:
-                            await interaction.followup.send(f"🧵 {thread.name} のメッセージをスキャン中...", ephemeral=True)
-                            
-                            async for message in thread.history(limit=None):
-                                # ボットのメッセージのみを処理
-                                if message.author.bot and message.embeds:
-                                    embed = message.embeds[0]
-                                    
-                                    # 投稿内容を取得
-                                    content = embed.description
-                                    if not content:
-                                        continue
-                                    
-                                    # フッターから投稿IDを抽出
-                                    footer_text = embed.footer.text if embed.footer else ""
-                                    post_id = None
-                                    
-                                    if "ID:" in footer_text:
-                                        try:
-                                            post_id = int(footer_text.split("ID:")[1].strip())
-                                        except (ValueError, IndexError):
-                                            pass
-                                    
-                                    # カテゴリーを抽出
-                                    category = None
-                                    if "カテゴリ:" in footer_text:
-                                        try:
-                                            category = footer_text.split("カテゴリ:")[1].split("|")[0].strip()
-                                            if category == "未設定":
-                                                category = None
-                                        except (IndexError, AttributeError):
-                                            pass
-                                    
-                                    # 匿名設定を判定
-                                    is_anonymous = embed.author.name == "匿名ユーザー"
-                                    print(f"[DEBUG] 復元時の匿名判定: author.name='{embed.author.name}', is_anonymous={is_anonymous}")
-                                    
-                                    # アイコンも確認
-                                    if hasattr(embed.author, 'icon_url') and embed.author.icon_url:
-                                        is_anonymous_by_icon = embed.author.icon_url == DEFAULT_AVATAR
-                                        print(f"[DEBUG] アイコンによる匿名判定: icon_url='{embed.author.icon_url}', is_anonymous_by_icon={is_anonymous_by_icon}")
-                                        # どちらか一方でも匿名なら匿名として扱う
-                                        is_anonymous = is_anonymous or is_anonymous_by_icon
-                                    
-                                    # 非公開設定を判定（親チャンネルから判定）
-                                    is_private = not any(ch.id == channel.id for ch in channels if ch.name and "公開" in ch.name)
-                                    
-                                    # データベースに存在しないことを確認
-                                    if post_id:
-                                        cursor.execute('SELECT id FROM thoughts WHERE id = ?', (post_id,))
-                                        if not cursor.fetchone():
-                                            # データベースに挿入
-                                            cursor.execute('''
-                                                INSERT INTO thoughts (id, content, category, is_anonymous, is_private, user_id, created_at)
-                                                VALUES (?, ?, ?, ?, ?, ?, ?)
-                                            ''', (
-                                                post_id,
-                                                content,
-                                                category,
-                                                int(is_anonymous),  # 明示的にintに変換
-                                                int(is_private),
-                                                interaction.user.id,  # 復元実行者のID
-                                                message.created_at
-                                            ))
-                                            print(f"[DEBUG] データベース挿入: post_id={post_id}, is_anonymous={int(is_anonymous)}, is_private={int(is_private)}")
-                                            
-                                            # メッセージ参照を追加
-                                            cursor.execute('''
-                                                INSERT INTO message_references (post_id, message_id, channel_id)
-                                                VALUES (?, ?, ?)
-                                            ''', (post_id, str(message.id), str(thread.id)))
-                                            
-                                            recovered_count += 1
-                                            
-                                            if recovered_count % 10 == 0:
-                                                await interaction.followup.send(
-                                                    f"🔄 {recovered_count}件を復元中...", 
-                                                    ephemeral=True
-                                                )
-                
-                conn.commit()
-            
-            await interaction.followup.send(
-                f"✅ データベース復元が完了しました！\n"
-                f"📊 復元件数: {recovered_count}件\n"
-                f"💾 データベースをバックアップすることをお勧めします。",
-                ephemeral=True
-            )
-            
-            logger.info(f"データベース復元完了: {recovered_count}件")
-            
-        except Exception as e:
-            logger.error(f"データ復元中にエラーが発生しました: {e}", exc_info=True)
-            await interaction.followup.send(
-                f"❌ エラーが発生しました: {e}",
-                ephemeral=True
-            )
+            async with reporter:
+                scanned, recovered = await asyncio.to_thread(run)
+        except asyncio.CancelledError:
+            # 書き込み中のスレッドは次の進捗通知で止める
+            stop.set()
+            raise
+
+        await reporter.finish(
+            f"✅ エクスポートからの復元が完了しました！\n"
+            f"📊 復元件数: {recovered}件\n"
+            f"📨 確認したメッセージ: {scanned}件\n"
+            f"💾 データベースをバックアップすることをお勧めします。"
+        )
+        logger.info(f"エクスポートからの復元完了: {file_path}, {scanned}件中{recovered}件")
+
+    @staticmethod
+    def _is_private_source(source: Source) -> bool:
+        """公開チャンネル（とそのスレッド）以外は非公開として扱います"""
+        channel_id = source.parent_id if isinstance(source, discord.Thread) else source.id
+        return channel_id != CHANNELS['public']
+
+    async def _list_threads(self, channel: Source, budget: RequestBudget) -> List[discord.Thread]:
+        """チャンネルのアクティブなスレッドとアーカイブ済みのスレッド（公開・非公開）を返します"""
+        if not isinstance(channel, discord.TextChannel):
+            return []
+        threads: Dict[int, discord.Thread] = {thread.id: thread for thread in channel.threads}
+        for private in (False, True):
+            try:
+                await budget.acquire()
+                count = 0
+                async for thread in channel.archived_threads(limit=None, private=private):
+                    threads.setdefault(thread.id, thread)
+                    count += 1
+                    if count % HISTORY_PAGE_SIZE == 0:
+                        await budget.acquire()
+            except discord.HTTPException as e:
+                kind = "非公開" if private else "公開"
+                logger.warning(f"アーカイブ済みの{kind}スレッドを取得できませんでした: {channel.name}, error={e}")
+        return list(threads.values())
+
+    @staticmethod
+    def _describe_sources(progress: Dict[int, SourceProgress], budget: RequestBudget) -> List[str]:
+        """走査中・失敗したチャンネル・スレッドと、投稿を復元できたものの進捗を返します"""
+        entries = list(progress.values())
+        scanned = sum(entry.scanned for entry in entries)
+        recovered = sum(entry.recovered for entry in entries)
+        lines = [f"📨 確認したメッセージ: {scanned}件 / 復元: {recovered}件 / 📡 API呼び出し: {budget.used}回"]
+        shown = [entry for entry in entries if entry.state in ('running', 'failed')]
+        shown += [entry for entry in entries if entry.state == 'done' and entry.recovered]
+        lines.extend(entry.describe() for entry in shown[:MAX_SHOWN_SOURCES])
+        if len(shown) > MAX_SHOWN_SOURCES:
+            lines.append(f"...ほか{len(shown) - MAX_SHOWN_SOURCES}件")
+        return lines
+
+    async def _recover_source(
+        self,
+        writer: RecoveryWriter,
+        source: Source,
+        restorer_id: int,
+        after_id: Optional[int],
+        budget: RequestBudget,
+        entry: SourceProgress
+    ) -> None:
+        """チャンネル（スレッド）のメッセージを古い順に走査し、DBにない投稿を復元します
+
+        復元する投稿は writer にため、RECOVERY_CHECKPOINT_INTERVAL 件のメッセージごとに
+        チェックポイントと一緒に1つの短いトランザクションで書き込みます。
+        中断しても書き込み済みの範囲は失われず、次回はその続きから再開します。
+        履歴は100件ずつ取得されるため、その1回ごとに共有の予算を消費します。
+        """
+        is_private = self._is_private_source(source)
+        after = discord.Object(id=after_id) if after_id else None
+        last_message_id = None
+
+        await budget.acquire()
+        async for message in source.history(limit=None, after=after, oldest_first=True):
+            # 投稿者は分からないため復元実行者のIDを暫定で設定する（/assign_user で修正）
+            post = parse_post_message(message, source.id, is_private, restorer_id)
+            if post is not None and writer.add(post):
+                entry.recovered += 1
+
+            entry.scanned += 1
+            last_message_id = message.id
+            if entry.scanned % HISTORY_PAGE_SIZE == 0:
+                await budget.acquire()
+            if entry.scanned % RECOVERY_CHECKPOINT_INTERVAL == 0:
+                writer.flush(checkpoint=(source.id, last_message_id))
+
+        if last_message_id is not None:
+            writer.flush(checkpoint=(source.id, last_message_id))
 
 async def setup(bot):
     await bot.add_cog(DataRecovery(bot))
@@ -3,27 +3,105 @@ from discord.ext import commands
 from discord import app_commands
 import sqlite3
 import logging
-from typing import Optional
+import asyncio
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
 from bot import DatabaseMixin
+from config import CHANNELS
+from utils.coalesce import edit_coalescer
+from utils.jobs import job_manager
+from utils.post_index import recent_post_index
+from utils.progress import ProgressReporter
+from utils.ratelimit import AdmissionDenied, admission, send_admission_denied, write_command_check
+from utils.references import MessageRef, partial_message
+from utils.webhooks import webhook_delivery
 
 logger = logging.getLogger(__name__)
 
+# 非公開ロールID
+PRIVATE_ROLE_ID = 1278762436569415771
+# 一括削除APIで一度に削除できる最大件数
+BULK_DELETE_LIMIT = 100
+# 一括削除APIで削除できるメッセージの経過時間（14日から余裕を持たせる）
+BULK_DELETE_MAX_AGE = timedelta(days=13, hours=23)
+# 古いメッセージを1件ずつ削除するときの間隔（秒）
+SINGLE_DELETE_INTERVAL = 1.0
+# データベースから1トランザクションで削除する投稿数
+DB_DELETE_CHUNK = 500
+# 削除済み（墓標付き）投稿を後片付けする間隔（秒）
+PURGE_POLL_INTERVAL = 60.0
+# 1回の後片付けで処理する投稿数
+PURGE_BATCH_SIZE = 50
+# 後片付けの最大試行回数
+MAX_PURGE_ATTEMPTS = 5
+# 再試行までの待ち時間の基準（秒、試行ごとに倍増）
+PURGE_RETRY_BASE = 30
+
 class Delete(commands.Cog, DatabaseMixin):
     """投稿削除用Cog"""
     
     def __init__(self, bot: commands.Bot):
         self.bot = bot
         DatabaseMixin.__init__(self)
+        self._purge_wakeup = asyncio.Event()
+        self._purge_task: Optional[asyncio.Task] = None
+    
+    async def cog_load(self) -> None:
+        self._purge_task = asyncio.create_task(self._purge_worker())
+    
+    async def cog_unload(self) -> None:
+        if self._purge_task is not None:
+            self._purge_task.cancel()
+    
+    async def _post_id_autocomplete(
+        self,
+        interaction: discord.Interaction,
+        current: str
+    ) -> List[app_commands.Choice[int]]:
+        """自分の最近の投稿から投稿IDの候補を返します"""
+        if not recent_post_index.is_warm(interaction.user.id):
+            with self._get_db_connection() as conn:
+                recent_post_index.warm(interaction.user.id, conn)
+        return recent_post_index.choices(interaction.user.id, current)
     
     @app_commands.command(name="delete", description="投稿を削除します")
-    @app_commands.describe(message_id="削除する投稿のメッセージID")
-    async def delete_post(self, interaction: discord.Interaction, message_id: str) -> None:
-        """メッセージIDで投稿を削除します"""
-        logger.info(f"delete コマンドが呼び出されました。ユーザー: {interaction.user}, メッセージID: {message_id}")
+    @app_commands.describe(
+        post_id="削除する投稿のID",
+        message_id="削除する投稿のメッセージID（投稿IDの代わりに指定できます）"
+    )
+    @app_commands.autocomplete(post_id=_post_id_autocomplete)
+    @write_command_check()
+    async def delete_post(
+        self,
+        interaction: discord.Interaction,
+        post_id: Optional[int] = None,
+        message_id: Optional[str] = None
+    ) -> None:
+        """投稿IDまたはメッセージIDで投稿を削除します"""
+        logger.info(f"delete コマンドが呼び出されました。ユーザー: {interaction.user}, 投稿ID: {post_id}, メッセージID: {message_id}")
+        
+        if post_id is None and not message_id:
+            await interaction.response.send_message(
+                "❌ 削除する投稿の投稿IDまたはメッセージIDを指定してください。",
+                ephemeral=True
+            )
+            return
         
         # 応答を遅延
         await interaction.response.defer(ephemeral=True)
         
+        # 応答を待つ間に他の書き込みで埋まっている場合がある
+        try:
+            admission.check_capacity()
+        except AdmissionDenied as e:
+            await send_admission_denied(interaction, e)
+            return
+        with admission.slot():
+            await self._delete_post(interaction, post_id, message_id)
+    
+    async def _delete_post(self, interaction: discord.Interaction, target_post_id: Optional[int], message_id: Optional[str]) -> None:
+        """投稿に削除済みの印を付けます（メッセージとデータの削除は後片付けで行います）"""
         try:
             # メッセージIDで投稿を検索
             with self._get_db_connection() as conn:
@@ -51,24 +129,28 @@ class Delete(commands.Cog, DatabaseMixin):
                         conn.commit()
                         logger.info("既存データにuser_idを補完しました")
                     
-                    cursor.execute('''
-                        SELECT mr.post_id, mr.channel_id, COALESCE(mr.user_id, t.user_id) as user_id, t.is_private
-                        FROM message_references mr
-                        JOIN thoughts t ON mr.post_id = t.id
-                        WHERE mr.message_id = ?
-                    ''', (message_id,))
+                    if target_post_id is not None:
+                        condition, param = 't.id = ?', target_post_id
+                    else:
+                        condition, param = 'mr.message_id = ?', message_id
+                    cursor.execute(f'''
+                        SELECT t.id, mr.channel_id, COALESCE(mr.user_id, t.user_id) as user_id, t.is_private, mr.webhook_id
+                        FROM thoughts t
+                        LEFT JOIN message_references mr ON mr.post_id = t.id
+                        WHERE {condition} AND t.deleted_at IS NULL
+                    ''', (param,))
                     
                     row = cursor.fetchone()
                     logger.info(f"クエリ結果: {row}")
                     
                     if not row:
                         await interaction.followup.send(
-                            "❌ 指定されたメッセージIDの投稿が見つかりません。",
+                            "❌ 指定された投稿が見つかりません。",
                             ephemeral=True
                         )
                         return
                     
-                    post_id, channel_id, post_user_id, is_private = row
+                    post_id, channel_id, post_user_id, is_private, webhook_id = row
                     logger.info(f"投稿を検出: post_id={post_id}, channel_id={channel_id}")
                     
                     # 権限チェック
@@ -80,66 +162,16 @@ class Delete(commands.Cog, DatabaseMixin):
                         )
                         return
                     
-                    # メッセージを削除
-                    try:
-                        channel = await interaction.guild.fetch_channel(int(channel_id))
-                        message = await channel.fetch_message(int(message_id))
-                        await message.delete()
-                        logger.info(f"メッセージ {message_id} を削除しました")
-                        
-                        # 非公開投稿の場合、スレッドも削除
-                        if is_private and channel.type == discord.ChannelType.private_thread:
-                            try:
-                                await channel.delete(reason="非公開投稿の削除に伴うスレッド削除")
-                                logger.info(f"プライベートスレッド {channel.id} を削除しました")
-                            except discord.Forbidden:
-                                logger.warning(f"スレッドの削除権限がありません: {channel.id}")
-                            except Exception as e:
-                                logger.error(f"スレッド削除中にエラー: {e}")
-                    except discord.NotFound:
-                        logger.warning(f"メッセージが見つかりません: {message_id}")
-                    except discord.Forbidden:
-                        logger.warning(f"メッセージの削除権限がありません: {message_id}")
-                    except Exception as e:
-                        logger.error(f"メッセージ削除中にエラー: {e}")
-                    
-                    # データベースから投稿を削除
-                    try:
-                        # メッセージ参照を先に削除
-                        cursor.execute('DELETE FROM message_references WHERE post_id = ?', (post_id,))
-                        # 投稿を削除
-                        cursor.execute('DELETE FROM thoughts WHERE id = ?', (post_id,))
-                        conn.commit()
-                        logger.info(f"投稿ID {post_id} をデータベースから削除しました")
-                    except Exception as e:
-                        logger.error(f"データベース削除中にエラー: {e}")
-                        conn.rollback()
-                        await interaction.followup.send(
-                            "❌ データベースの削除に失敗しました。",
-                            ephemeral=True
-                        )
-                        return
-                    
-                    # 非公開投稿の場合、ロールを確認
-                    if is_private:
-                        try:
-                            # 残りの非公開投稿数を確認
-                            cursor.execute('''
-                                SELECT COUNT(*) as count 
-                                FROM thoughts 
-                                WHERE user_id = ? AND is_private = 1
-                            ''', (post_user_id,))
-                            remaining_posts = cursor.fetchone()['count']
-                            
-                            if remaining_posts == 0:
-                                # 非公開ロールを削除
-                                member = await interaction.guild.fetch_member(post_user_id)
-                                private_role = interaction.guild.get_role(1278762436569415771)  # 非公開ロールID
-                                if private_role and member:
-                                    await member.remove_roles(private_role, reason="非公開投稿がなくなりました")
-                                    logger.info(f"ユーザー {member} から非公開ロールを削除しました")
-                        except Exception as e:
-                            logger.error(f"非公開ロールの削除中にエラーが発生しました: {e}")
+                    # 墓標を付けるだけで即座に応答し、メッセージとデータの削除は後片付けに任せる
+                    cursor.execute('''
+                        UPDATE thoughts
+                        SET deleted_at = CURRENT_TIMESTAMP, content_hash = NULL
+                        WHERE id = ? AND deleted_at IS NULL
+                    ''', (post_id,))
+                    conn.commit()
+                    recent_post_index.remove(post_user_id, post_id)
+                    self._purge_wakeup.set()
+                    logger.info(f"投稿ID {post_id} に削除済みの印を付けました")
                     
                     await interaction.followup.send(
                         "✅ 投稿を削除しました。",
@@ -153,5 +185,413 @@ class Delete(commands.Cog, DatabaseMixin):
                 ephemeral=True
             )
 
+    async def _delete_bot_message(self, channel_id: str, message_id: str, is_private: bool) -> None:
+        """ボットが送信した投稿メッセージを削除します（メッセージの fetch は行いません）"""
+        ref = MessageRef.from_row(channel_id, message_id)
+        await partial_message(self.bot, ref).delete()
+        logger.info(f"メッセージ {message_id} を削除しました")
+        
+        if not is_private:
+            return
+        
+        # スレッドの種類を確認するため、キャッシュにない場合だけチャンネルを取得する
+        channel = self.bot.get_channel(ref.channel_id)
+        if channel is None:
+            channel = await self.bot.fetch_channel(ref.channel_id)
+        
+        # 非公開投稿の場合、スレッドも削除
+        if channel.type == discord.ChannelType.private_thread:
+            try:
+                await channel.delete(reason="非公開投稿の削除に伴うスレッド削除")
+                logger.info(f"プライベートスレッド {channel.id} を削除しました")
+            except discord.Forbidden:
+                logger.warning(f"スレッドの削除権限がありません: {channel.id}")
+            except Exception as e:
+                logger.error(f"スレッド削除中にエラー: {e}")
+
+    async def _purge_worker(self) -> None:
+        """削除済みの印が付いた投稿を定期的に後片付けします"""
+        await self.bot.wait_until_ready()
+        while True:
+            self._purge_wakeup.clear()
+            try:
+                while await self._purge_batch() == PURGE_BATCH_SIZE:
+                    pass
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"削除済み投稿の後片付け中にエラーが発生しました: {e}", exc_info=True)
+            
+            try:
+                await asyncio.wait_for(self._purge_wakeup.wait(), timeout=PURGE_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+    
+    async def _purge_batch(self) -> int:
+        """後片付けの対象を1バッチ処理し、処理した件数を返します"""
+        with self._get_db_connection() as conn:
+            with self._get_cursor(conn) as cursor:
+                cursor.execute('''
+                    SELECT t.id, t.user_id, t.is_private, t.purge_attempts,
+                           mr.channel_id, mr.message_id, mr.webhook_id
+                    FROM thoughts t
+                    LEFT JOIN message_references mr ON mr.post_id = t.id
+                    WHERE t.deleted_at IS NOT NULL
+                      AND t.purge_attempts < ?
+                      AND (t.purge_after IS NULL OR t.purge_after <= CURRENT_TIMESTAMP)
+                    ORDER BY t.deleted_at
+                    LIMIT ?
+                ''', (MAX_PURGE_ATTEMPTS, PURGE_BATCH_SIZE))
+                rows = cursor.fetchall()
+                
+                for row in rows:
+                    try:
+                        await self._purge_post(cursor, row)
+                    except Exception as e:
+                        attempts = row['purge_attempts'] + 1
+                        delay = PURGE_RETRY_BASE * 2 ** (attempts - 1)
+                        cursor.execute('''
+                            UPDATE thoughts
+                            SET purge_attempts = ?, purge_after = datetime('now', ?)
+                            WHERE id = ?
+                        ''', (attempts, f'+{delay} seconds', row['id']))
+                        if attempts >= MAX_PURGE_ATTEMPTS:
+                            logger.error(f"投稿ID {row['id']} の後片付けを断念しました: {e}")
+                        else:
+                            logger.warning(f"投稿ID {row['id']} の後片付けに失敗しました（{delay}秒後に再試行）: {e}")
+        return len(rows)
+    
+    async def _purge_post(self, cursor: sqlite3.Cursor, row: sqlite3.Row) -> None:
+        """削除済みの投稿のメッセージを削除し、データベースから完全に削除します"""
+        post_id = row['id']
+        guild = None
+        if row['is_private']:
+            # 非公開投稿のスレッドは下で削除されるため、先にサーバーを特定しておく
+            guild = await self._resolve_guild(int(row['channel_id']) if row['channel_id'] else None)
+        if row['message_id'] and row['channel_id']:
+            try:
+                if row['webhook_id']:
+                    # Webhook 配信されたメッセージは同じ Webhook で削除する
+                    await webhook_delivery.delete(self.bot, int(row['channel_id']), int(row['webhook_id']), int(row['message_id']))
+                    logger.info(f"Webhook メッセージ {row['message_id']} を削除しました")
+                else:
+                    await self._delete_bot_message(row['channel_id'], row['message_id'], row['is_private'])
+            except discord.NotFound:
+                logger.warning(f"メッセージが見つかりません: {row['message_id']}")
+        
+        cursor.execute('BEGIN')
+        try:
+            cursor.execute('DELETE FROM message_references WHERE post_id = ?', (post_id,))
+            cursor.execute('DELETE FROM thought_revisions WHERE post_id = ?', (post_id,))
+            cursor.execute('DELETE FROM thoughts WHERE id = ? AND deleted_at IS NOT NULL', (post_id,))
+            cursor.execute('COMMIT')
+        except sqlite3.Error:
+            cursor.execute('ROLLBACK')
+            raise
+        edit_coalescer.forget(post_id)
+        logger.info(f"投稿ID {post_id} をデータベースから削除しました")
+        
+        # 非公開投稿の場合、ロールを確認
+        if row['is_private'] and guild is not None:
+            try:
+                # 残りの非公開投稿数を確認（トリガーで維持される集計を参照）
+                cursor.execute('SELECT private FROM user_stats WHERE user_id = ?', (row['user_id'],))
+                stats_row = cursor.fetchone()
+                remaining_posts = stats_row['private'] if stats_row else 0
+                
+                if remaining_posts == 0:
+                    # 非公開ロールを削除
+                    member = guild.get_member(int(row['user_id']))
+                    private_role = self._get_private_role(guild)
+                    if private_role and member and private_role in member.roles:
+                        await member.remove_roles(private_role, reason="非公開投稿がなくなりました")
+                        logger.info(f"ユーザー {member} から非公開ロールを削除しました")
+            except Exception as e:
+                logger.error(f"非公開ロールの削除中にエラーが発生しました: {e}")
+    
+    async def _resolve_guild(self, channel_id: Optional[int]) -> Optional[discord.Guild]:
+        """投稿のチャンネルからサーバーを取得します
+        
+        アーカイブされたスレッドのようにキャッシュにないチャンネルは API で取得し、
+        それでも取得できない場合は非公開投稿用チャンネルのサーバーを使います。
+        """
+        for candidate in (channel_id, CHANNELS['private']):
+            if candidate is None:
+                continue
+            channel = self.bot.get_channel(candidate)
+            if channel is None:
+                try:
+                    channel = await self.bot.fetch_channel(candidate)
+                except discord.HTTPException as e:
+                    logger.warning(f"チャンネルの取得に失敗しました: channel_id={candidate}, error={e}")
+                    continue
+            guild = getattr(channel, 'guild', None)
+            if guild is not None:
+                return guild
+        return None
+    
+    @staticmethod
+    def _get_private_role(guild: discord.Guild) -> Optional[discord.Role]:
+        """非公開ロールを取得します"""
+        return guild.get_role(PRIVATE_ROLE_ID) or discord.utils.get(guild.roles, name="非公開")
+
+    @app_commands.command(name="bulk_delete", description="条件に一致する投稿をまとめて削除します（管理者用）")
+    @app_commands.default_permissions(administrator=True)
+    @app_commands.checks.has_permissions(administrator=True)
+    @app_commands.describe(
+        user="この投稿者の投稿を削除",
+        category="このカテゴリーの投稿を削除",
+        since="この日付以降の投稿を削除（YYYY-MM-DD）",
+        until="この日付以前の投稿を削除（YYYY-MM-DD）",
+        post_ids="削除する投稿ID（カンマ区切り）",
+        dry_run="Trueの場合は対象件数の確認のみ行います"
+    )
+    async def bulk_delete(
+        self,
+        interaction: discord.Interaction,
+        user: Optional[discord.User] = None,
+        category: Optional[str] = None,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+        post_ids: Optional[str] = None,
+        dry_run: bool = False
+    ) -> None:
+        """条件に一致する投稿のメッセージとデータベースの行をまとめて削除します"""
+        try:
+            where, params = self._build_bulk_filter(user, category, since, until, post_ids)
+        except ValueError as e:
+            await interaction.response.send_message(f"❌ {e}", ephemeral=True)
+            return
+        
+        if dry_run:
+            await interaction.response.defer(ephemeral=True)
+            targets = self._select_bulk_targets(where, params)
+            channels = {row['channel_id'] for row in targets if row['message_id'] and row['channel_id']}
+            await interaction.followup.send(
+                f"🔍 対象: {len(targets)}件の投稿（{len(channels)}チャンネル）\n"
+                f"実行するには dry_run を False にしてください。",
+                ephemeral=True
+            )
+            return
+        
+        # 古いメッセージは1件ずつ間隔を空けて削除するため、バックグラウンドジョブとして実行する
+        await job_manager.submit(
+            interaction,
+            'bulk_delete',
+            lambda job: self._bulk_delete(job, where, params),
+            {
+                'user_id': user.id if user else None,
+                'category': category,
+                'since': since,
+                'until': until,
+                'post_ids': post_ids
+            }
+        )
+    
+    def _select_bulk_targets(self, where: str, params: list) -> List[sqlite3.Row]:
+        """一括削除の対象の投稿とメッセージ参照を取得します
+        
+        削除済みの印が付いた投稿は後片付けに任せ、対象に含めません。
+        """
+        with self._get_db_connection() as conn:
+            with self._get_cursor(conn) as cursor:
+                cursor.execute(f'''
+                    SELECT t.id, t.user_id, t.is_private, mr.channel_id, mr.message_id, mr.webhook_id
+                    FROM thoughts t
+                    LEFT JOIN message_references mr ON mr.post_id = t.id
+                    WHERE {where} AND t.deleted_at IS NULL
+                ''', params)
+                return cursor.fetchall()
+    
+    async def _bulk_delete(self, interaction: discord.Interaction, where: str, params: list) -> None:
+        """条件に一致する投稿をまとめて削除します（ジョブとして実行）"""
+        targets = self._select_bulk_targets(where, params)
+        if not targets:
+            await interaction.followup.send("ℹ️ 条件に一致する投稿はありません。", ephemeral=True)
+            return
+        
+        # チャンネルごとにまとめる
+        by_channel: Dict[int, List[Tuple[int, Optional[int]]]] = defaultdict(list)
+        for row in targets:
+            if row['message_id'] and row['channel_id']:
+                by_channel[int(row['channel_id'])].append(
+                    (int(row['message_id']), int(row['webhook_id']) if row['webhook_id'] else None)
+                )
+        
+        logger.info(f"一括削除を開始します: 実行者={interaction.user}, 対象={len(targets)}件, チャンネル={len(by_channel)}")
+        
+        stats = {'bulk': 0, 'single': 0, 'missing': 0, 'failed': 0}
+        channels_done = 0
+        progress = ProgressReporter(
+            "🗑️ 投稿のメッセージを削除しています",
+            total=sum(len(messages) for messages in by_channel.values())
+        )
+        progress.detail = lambda: [
+            f"📺 チャンネル: {channels_done}/{len(by_channel)}",
+            f"🗑️ 一括削除: {stats['bulk']}件 / 個別削除: {stats['single']}件 / "
+            f"見つからない: {stats['missing']}件 / 失敗: {stats['failed']}件"
+        ]
+        await progress.start(interaction)
+        async with progress:
+            for channel_id, messages in by_channel.items():
+                await self._delete_channel_messages(channel_id, messages, stats, progress)
+                channels_done += 1
+        
+        # データベースからチャンクごとに削除する
+        target_ids = [row['id'] for row in targets]
+        deleted_rows = 0
+        with self._get_db_connection() as conn:
+            with self._get_cursor(conn) as cursor:
+                for start in range(0, len(target_ids), DB_DELETE_CHUNK):
+                    chunk = target_ids[start:start + DB_DELETE_CHUNK]
+                    placeholders = ','.join('?' * len(chunk))
+                    cursor.execute('BEGIN')
+                    try:
+                        cursor.execute(f'DELETE FROM message_references WHERE post_id IN ({placeholders})', chunk)
+                        cursor.execute(f'DELETE FROM thought_revisions WHERE post_id IN ({placeholders})', chunk)
+                        cursor.execute(f'DELETE FROM thoughts WHERE id IN ({placeholders})', chunk)
+                        deleted_rows += cursor.rowcount
+                        cursor.execute('COMMIT')
+                    except sqlite3.Error as e:
+                        cursor.execute('ROLLBACK')
+                        logger.error(f"一括削除のデータベース処理中にエラー: {e}", exc_info=True)
+                        await progress.finish(
+                            f"❌ データベースの削除に失敗しました（{deleted_rows}件は削除済み）: {e}"
+                        )
+                        return
+                    for post_id in chunk:
+                        edit_coalescer.forget(post_id)
+                for row in targets:
+                    recent_post_index.remove(row['user_id'], row['id'])
+                
+                # 非公開投稿がなくなったユーザーからロールを外す
+                private_users = {row['user_id'] for row in targets if row['is_private']}
+                roles_removed = 0
+                if private_users and interaction.guild:
+                    user_list = list(private_users)
+                    placeholders = ','.join('?' * len(user_list))
+                    cursor.execute(f'''
+                        SELECT user_id FROM user_stats
+                        WHERE private > 0 AND user_id IN ({placeholders})
+                    ''', user_list)
+                    still_private = {row['user_id'] for row in cursor.fetchall()}
+                    private_role = self._get_private_role(interaction.guild)
+                    for user_id in private_users - still_private:
+                        member = interaction.guild.get_member(int(user_id))
+                        if private_role and member and private_role in member.roles:
+                            try:
+                                await member.remove_roles(private_role, reason="非公開投稿がなくなりました")
+                                roles_removed += 1
+                            except discord.HTTPException as e:
+                                logger.error(f"非公開ロールの削除中にエラーが発生しました: {e}")
+        
+        logger.info(f"一括削除が完了しました: DB={deleted_rows}件, {stats}")
+        await progress.finish(
+            f"✅ {deleted_rows}件の投稿を削除しました。\n"
+            f"🗑️ 一括削除: {stats['bulk']}件 / 個別削除: {stats['single']}件\n"
+            f"⚠️ 見つからなかったメッセージ: {stats['missing']}件 / 削除に失敗: {stats['failed']}件\n"
+            f"👤 非公開ロールを外したユーザー: {roles_removed}人"
+        )
+
+    @staticmethod
+    def _build_bulk_filter(
+        user: Optional[discord.User],
+        category: Optional[str],
+        since: Optional[str],
+        until: Optional[str],
+        post_ids: Optional[str]
+    ) -> Tuple[str, list]:
+        """一括削除の条件からWHERE句とパラメータを作成します"""
+        clauses = []
+        params: list = []
+        if user is not None:
+            clauses.append('t.user_id = ?')
+            params.append(user.id)
+        if category:
+            clauses.append('t.category = ?')
+            params.append(category)
+        try:
+            if since:
+                clauses.append('t.created_at >= ?')
+                params.append(datetime.strptime(since, '%Y-%m-%d').strftime('%Y-%m-%d'))
+            if until:
+                clauses.append('t.created_at < ?')
+                params.append((datetime.strptime(until, '%Y-%m-%d') + timedelta(days=1)).strftime('%Y-%m-%d'))
+        except ValueError:
+            raise ValueError("日付は YYYY-MM-DD 形式で指定してください。")
+        if post_ids:
+            try:
+                ids = [int(part) for part in post_ids.replace(' ', '').split(',') if part]
+            except ValueError:
+                raise ValueError("投稿IDは数字をカンマ区切りで指定してください。")
+            if ids:
+                clauses.append(f"t.id IN ({','.join('?' * len(ids))})")
+                params.extend(ids)
+        if not clauses:
+            raise ValueError("削除条件を1つ以上指定してください。")
+        return ' AND '.join(clauses), params
+
+    async def _delete_channel_messages(
+        self,
+        channel_id: int,
+        messages: List[Tuple[int, Optional[int]]],
+        stats: Dict[str, int],
+        progress: ProgressReporter
+    ) -> None:
+        """1つのチャンネル内のメッセージを削除します
+        
+        14日以内のメッセージは一括削除APIで100件ずつ、それより古いメッセージは
+        間隔を空けて1件ずつ削除します。
+        """
+        cutoff = discord.utils.utcnow() - BULK_DELETE_MAX_AGE
+        recent = [m for m in messages if discord.utils.snowflake_time(m[0]) > cutoff]
+        old = [m for m in messages if discord.utils.snowflake_time(m[0]) <= cutoff]
+        
+        channel = self.bot.get_channel(channel_id)
+        if channel is None and recent:
+            try:
+                channel = await self.bot.fetch_channel(channel_id)
+            except discord.NotFound:
+                stats['missing'] += len(messages)
+                progress.advance(len(messages))
+                return
+            except discord.HTTPException as e:
+                logger.warning(f"チャンネルの取得に失敗しました: channel_id={channel_id}, error={e}")
+        
+        if recent and channel is not None and hasattr(channel, 'delete_messages'):
+            for start in range(0, len(recent), BULK_DELETE_LIMIT):
+                chunk = recent[start:start + BULK_DELETE_LIMIT]
+                try:
+                    await channel.delete_messages(
+                        [discord.Object(id=message_id) for message_id, _ in chunk],
+                        reason="投稿の一括削除"
+                    )
+                    stats['bulk'] += len(chunk)
+                    progress.advance(len(chunk))
+                except discord.NotFound:
+                    # 一部がすでに削除されている場合は個別削除で確認する
+                    old.extend(chunk)
+                except discord.HTTPException as e:
+                    logger.warning(f"一括削除に失敗したため個別に削除します: channel_id={channel_id}, error={e}")
+                    old.extend(chunk)
+        else:
+            old.extend(recent)
+        
+        for message_id, webhook_id in old:
+            try:
+                if webhook_id:
+                    await webhook_delivery.delete(self.bot, channel_id, webhook_id, message_id)
+                else:
+                    await partial_message(self.bot, MessageRef(channel_id, message_id)).delete()
+                stats['single'] += 1
+            except discord.NotFound:
+                stats['missing'] += 1
+            except discord.HTTPException as e:
+                logger.warning(f"メッセージの削除に失敗しました: message_id={message_id}, error={e}")
+                stats['failed'] += 1
+                progress.add_error(f"メッセージ {message_id}: {e}")
+            progress.advance()
+            await asyncio.sleep(SINGLE_DELETE_INTERVAL)
+
 async def setup(bot: commands.Bot):
     await bot.add_cog(Delete(bot))
@@ -12,6 +12,16 @@ import discord
 from discord import app_commands, ui, Interaction, Embed, ButtonStyle
 from discord.ext import commands
 from bot import DatabaseMixin  # Added DatabaseMixin import
+from utils import metrics
+from utils.coalesce import edit_coalescer
+from utils.footer import encode_footer
+from utils.post_index import recent_post_index
+from utils.profiles import profile_cache
+from utils.ratelimit import AdmissionDenied, admission, send_admission_denied, write_command_check
+from utils.references import MessageRef, partial_message
+from utils.responder import DeadlineResponder
+from utils.revisions import record_revision
+from utils.webhooks import webhook_delivery
 
 # ロガーの設定
 logger = logging.getLogger(__name__)
@@ -51,6 +61,10 @@ class Edit(commands.Cog, DatabaseMixin):
         DatabaseMixin.__init__(self)
         logger.info("Edit cog が初期化されました")
     
+    async def cog_unload(self) -> None:
+        # 集約待ちの編集をメッセージに反映してから終了する
+        await edit_coalescer.drain()
+    
     @contextmanager
     def _get_db_connection(self) -> Iterator[sqlite3.Connection]:
         """データベース接続を取得します。
@@ -134,9 +148,7 @@ class Edit(commands.Cog, DatabaseMixin):
             self._is_anonymous: bool = bool(current_is_anonymous)
             self._is_private: bool = bool(current_is_private)
             
-            # デバッグログ
-            print(f"[DEBUG] EditModal初期化: is_anonymous={self._is_anonymous}, is_private={self._is_private}")
-            print(f"[DEBUG] 受け取った値: current_is_anonymous={current_is_anonymous}, current_is_private={current_is_private}")
+            logger.debug(f"EditModal初期化: post_id={post_id}, is_anonymous={self._is_anonymous}, is_private={self._is_private}")
             
             # コンポーネントの作成
             self.content = self.content_input = ui.TextInput(
@@ -189,15 +201,6 @@ class Edit(commands.Cog, DatabaseMixin):
                 if 'conn' in locals():
                     conn.close()
 
-        def _ensure_thoughts_display_name_column(self, cursor: sqlite3.Cursor) -> None:
-            try:
-                cursor.execute("PRAGMA table_info(thoughts)")
-                cols = {row[1] for row in cursor.fetchall()}
-                if 'display_name' not in cols:
-                    cursor.execute("ALTER TABLE thoughts ADD COLUMN display_name TEXT")
-            except sqlite3.Error as e:
-                logger.error(f"display_name カラム確認/追加に失敗しました: {e}", exc_info=True)
-        
         @contextmanager
         def _get_cursor(self, conn: sqlite3.Connection) -> Iterator[sqlite3.Cursor]:
             """データベースカーソルを取得します。
@@ -225,10 +228,25 @@ class Edit(commands.Cog, DatabaseMixin):
             Args:
                 interaction: インタラクションオブジェクト
             """
-            print(f"[DEBUG] on_submit が呼び出されました: post_id={self.post_id}")
-            print(f"[DEBUG] on_submit時の匿名状態: is_anonymous={self._is_anonymous}")
+            logger.debug(f"on_submit が呼び出されました: post_id={self.post_id}, is_anonymous={self._is_anonymous}")
             self._interaction = interaction
             
+            # モーダルを開いた時点ではなく、書き込む直前に同時実行数を判定する
+            try:
+                admission.check_capacity()
+            except AdmissionDenied as e:
+                await send_admission_denied(interaction, e)
+                return
+            with admission.slot():
+                async with DeadlineResponder(interaction, 'edit_modal') as responder:
+                    await self._submit(responder)
+        
+        async def _submit(self, responder: DeadlineResponder) -> None:
+            """入力値を検証して投稿を更新します。
+            
+            Args:
+                responder: 応答期限を管理するレスポンダー
+            """
             # 入力値のバリデーション
             content = self.content_input.value.strip()
             category = self.category_input.value.strip() if self.category_input.value else None
@@ -236,7 +254,7 @@ class Edit(commands.Cog, DatabaseMixin):
             display_name = None  # 表示名はDBから取得するため入力しない
             
             if not content:
-                await interaction.response.send_message(
+                await responder.send(
                     "投稿内容を入力してください。",
                     ephemeral=True
                 )
@@ -244,14 +262,14 @@ class Edit(commands.Cog, DatabaseMixin):
             
             # 画像URLのバリデーション
             if image_url and not self._is_valid_url(image_url):
-                await interaction.response.send_message(
+                await responder.send(
                     "無効な画像URLです。正しいURLを入力してください。",
                     ephemeral=True
                 )
                 return
             
             # 編集処理を実行
-            await self._edit_post(interaction, content, category, image_url, display_name)
+            await self._edit_post(responder, content, category, image_url, display_name)
         
         def _is_valid_url(self, url: str) -> bool:
             """URLが有効かどうかを検証します。
@@ -270,7 +288,7 @@ class Edit(commands.Cog, DatabaseMixin):
         
         async def _edit_post(
             self, 
-            interaction: discord.Interaction, 
+            responder: DeadlineResponder, 
             content: str, 
             category: Optional[str], 
             image_url: Optional[str],
@@ -279,7 +297,7 @@ class Edit(commands.Cog, DatabaseMixin):
             """投稿を編集します。
             
             Args:
-                interaction: インタラクションオブジェクト
+                responder: 応答期限を管理するレスポンダー
                 content: 投稿内容
                 category: カテゴリー
                 image_url: 画像URL
@@ -289,231 +307,180 @@ class Edit(commands.Cog, DatabaseMixin):
                 # データベース接続を取得
                 with self._get_db_connection() as conn:
                     with self._get_cursor(conn) as cursor:
-                        self._ensure_thoughts_display_name_column(cursor)
-                        # 投稿を更新
-                        print(f"[DEBUG] データベース更新前: is_anonymous={self._is_anonymous}, is_private={self._is_private}")
-                        cursor.execute("""
-                            UPDATE thoughts 
-                            SET content = ?, 
-                                category = ?, 
-                                image_url = ?, 
-                                is_anonymous = ?, 
-                                is_private = ?,
-                                updated_at = CURRENT_TIMESTAMP
-                            WHERE id = ?
-                        """, (
-                            content,
-                            category,
-                            image_url,
-                            int(self._is_anonymous),
-                            int(self._is_private),
-                            self.post_id
-                        ))
-                        print(f"[DEBUG] データベース更新完了: rowcount={cursor.rowcount}")
+                        # 投稿を更新し、描画に必要な値とメッセージ参照を同時に受け取る
+                        # 更新前の内容との差分を編集履歴に残す（同じトランザクション内）
+                        record_revision(cursor, self.post_id, content, category, image_url, responder.interaction.user.id)
+                        post = self._update_post_in_database(cursor, content, category, image_url)
                         
-                        if cursor.rowcount == 0:
-                            await interaction.response.send_message(
+                        if post is None:
+                            await responder.send(
                                 "投稿の更新に失敗しました。投稿が見つかりません。",
                                 ephemeral=True
                             )
                             return
                         
                         conn.commit()
+                recent_post_index.update(post['user_id'], self.post_id, post['content'], post['category'])
                 
-                # Discordメッセージを更新（エラーが無視されるように）
-                print(f"[DEBUG] Discordメッセージ更新を開始します: post_id={self.post_id}")
-                message_update_error: Optional[str] = None
-                try:
-                    print(f"[DEBUG] _update_discord_message を呼び出します")
-                    await self._update_discord_message(interaction, content, category, image_url)
-                    print(f"[DEBUG] Discordメッセージ更新が完了しました")
-                except Exception as e:
-                    logger.warning(f"Discordメッセージの更新に失敗しましたが、データベースは更新されています: {e}", exc_info=True)
-                    print(f"[DEBUG] Discordメッセージ更新エラー: {e}")
-                    # NOTE: Modal interaction では response 前の followup が失敗することがあるため、
-                    # ここでは followup を送らず、最終レスポンスに必ず含める。
-                    message_update_error = str(e)
-                print(f"[DEBUG] Discordメッセージ更新処理を終了します")
+                # Discordメッセージの更新は予約だけして待たない（失敗はフォローアップで伝える）
+                self._update_discord_message(post, responder.interaction)
                 
-                # 成功メッセージを送信
-                if message_update_error:
-                    await interaction.response.send_message(
-                        f"⚠️ 投稿内容はデータベースに保存されましたが、Discordメッセージの編集に失敗しました。\n"
-                        f"投稿ID: {self.post_id}\n"
-                        f"理由: {message_update_error}",
-                        ephemeral=True
-                    )
-                else:
-                    await interaction.response.send_message(
-                        f"✅ 投稿を更新しました！ (ID: {self.post_id})",
-                        ephemeral=True
-                    )
+                await responder.send(
+                    f"✅ 投稿を更新しました！ (ID: {self.post_id})",
+                    ephemeral=True
+                )
                 
                 logger.info(f"投稿を更新しました: id={self.post_id}")
                 
             except sqlite3.Error as e:
                 logger.error(f"データベースエラーが発生しました: {e}", exc_info=True)
-                if not interaction.response.is_done():
-                    await interaction.response.send_message(
+                if not responder.responded:
+                    await responder.send(
                         "投稿の更新中にデータベースエラーが発生しました。",
                         ephemeral=True
                     )
             except Exception as e:
                 logger.error(f"投稿の更新中にエラーが発生しました: {e}", exc_info=True)
-                if not interaction.response.is_done():
-                    await interaction.response.send_message(
+                if not responder.responded:
+                    await responder.send(
                         "投稿の更新中にエラーが発生しました。",
                         ephemeral=True
                     )
         
-        async def _update_discord_message(
-            self, 
-            interaction: discord.Interaction, 
-            content: str, 
-            category: Optional[str], 
-            image_url: Optional[str]
-        ) -> None:
-            """Discordのメッセージを更新します。
+        def _update_discord_message(self, post: Dict[str, Any], interaction: discord.Interaction) -> None:
+            """Discordのメッセージの更新を予約します。
+            
+            同じ投稿への編集が続いた場合は edit_coalescer がまとめ、
+            静止期間の後に最後に更新された状態で1回だけ反映します。
             
             Args:
-                interaction: インタラクションオブジェクト
-                content: 投稿内容
-                category: カテゴリー
-                image_url: 画像URL
+                post: _update_post_in_database が返した投稿データ
+                interaction: 更新に失敗したときに知らせるインタラクション
+            """
+            async def report_error(error: Exception) -> None:
+                await interaction.followup.send(
+                    f"⚠️ 投稿内容はデータベースに保存されましたが、Discordメッセージの編集に失敗しました。\n"
+                    f"投稿ID: {self.post_id}\n"
+                    f"理由: {error}",
+                    ephemeral=True
+                )
+            
+            edit_coalescer.schedule(self.post_id, lambda: self._flush_discord_message(post), on_error=report_error)
+        
+        async def _flush_discord_message(self, post: Dict[str, Any]) -> None:
+            """投稿データから埋め込みを作成し、メッセージに反映します。
+            
+            Args:
+                post: _update_post_in_database が返した投稿データ
             """
+            if post['message_id'] is None or post['channel_id'] is None:
+                raise RuntimeError(f"message_references が見つかりません (post_id={self.post_id})")
+            ref = MessageRef.from_row(post['channel_id'], post['message_id'], post['webhook_id'])
+            logger.info(f"メッセージ更新を試行: post_id={self.post_id}, message_id={ref.message_id}, channel_id={ref.channel_id}")
+            
+            embed = await self._build_embed(post)
+            
+            # 前回送信した内容と同じなら更新しない
+            if edit_coalescer.is_unchanged(self.post_id, ref.message_id, embed):
+                metrics.increment('edit.skipped_identical')
+                logger.info(f"内容に変更がないためメッセージ更新を省略しました: post_id={self.post_id}")
+                return
+            
             try:
+                await self._apply_edit(ref, embed)
+            except discord.NotFound:
+                # 参照が古い可能性があるため、DBから読み直して1回だけ再試行する
                 with self._get_db_connection() as conn:
                     with self._get_cursor(conn) as cursor:
-                        self._ensure_thoughts_display_name_column(cursor)
-                        cursor.execute("""
-                            SELECT message_id, channel_id 
-                            FROM message_references 
-                            WHERE post_id = ?
-                        """, (self.post_id,))
-                        
-                        message_ref = cursor.fetchone()
-                        if not message_ref:
-                            print(f"[DEBUG] Post {self.post_id} のメッセージ参照が見つかりません")
-                            logger.warning(f"Post {self.post_id} のメッセージ参照が見つかりません")
-                            logger.info(f"現在のメッセージ参照を確認します...")
-                            cursor.execute('SELECT post_id, message_id, channel_id FROM message_references LIMIT 5')
-                            refs = cursor.fetchall()
-                            print(f"[DEBUG] メッセージ参照一覧: {refs}")
-                            logger.info(f"メッセージ参照一覧: {refs}")
-                            raise RuntimeError(f"message_references が見つかりません (post_id={self.post_id})")
-                            
-                        message_id, channel_id = message_ref
-                        print(f"[DEBUG] メッセージ更新を試行: post_id={self.post_id}, message_id={message_id}, channel_id={channel_id}")
-                        logger.info(f"メッセージ更新を試行: post_id={self.post_id}, message_id={message_id}, channel_id={channel_id}")
-                        
-                        # チャンネルを取得（キャッシュから取得できない場合はfetch）
-                        channel = self.bot.get_channel(int(channel_id))
-                        if not channel:
-                            try:
-                                channel = await self.bot.fetch_channel(int(channel_id))
-                            except Exception as e:
-                                raise RuntimeError(f"チャンネル取得に失敗しました (channel_id={channel_id}): {e}")
-                        
-                        if not channel:
-                            raise RuntimeError(f"チャンネルが見つかりません (channel_id={channel_id})")
-                            
-                        try:
-                            message = await channel.fetch_message(int(message_id))
-                        except discord.NotFound:
-                            raise RuntimeError(f"メッセージが見つかりません (message_id={message_id})")
-                        except discord.Forbidden:
-                            raise RuntimeError(f"メッセージへのアクセス権限がありません (message_id={message_id})")
-                        
-                        # 埋め込みメッセージを作成
-                        embed = discord.Embed(
-                            description=content,
-                            color=discord.Color.blue()
-                        )
-                        
-                        # 表示名を設定
-                        print(f"[DEBUG] メッセージ更新時: is_anonymous={self._is_anonymous}")
-
-                        # DBから投稿者情報を取得（管理者編集でも投稿者情報を維持する）
-                        cursor.execute(
-                            'SELECT user_id, is_anonymous, display_name FROM thoughts WHERE id = ?',
-                            (self.post_id,)
-                        )
-                        row = cursor.fetchone()
-                        if not row:
-                            raise RuntimeError(f"投稿が見つかりません (post_id={self.post_id})")
-
-                        post_user_id, db_is_anonymous, db_display_name = row
-                        current_db_anonymous = bool(db_is_anonymous)
-                        print(f"[DEBUG] データベース現在値: is_anonymous={current_db_anonymous}, display_name={db_display_name}, user_id={post_user_id}")
-
-                        if current_db_anonymous:
-                            embed.set_author(name='匿名ユーザー', icon_url=DEFAULT_AVATAR)
-                            print(f"[DEBUG] データベース値で匿名ユーザー: {DEFAULT_AVATAR}")
-                        else:
-                            author_user = self.bot.get_user(int(post_user_id))
-                            if author_user is None:
-                                try:
-                                    author_user = await self.bot.fetch_user(int(post_user_id))
-                                except Exception:
-                                    author_user = None
-
-                            author_name = (db_display_name or None)
-                            if not author_name:
-                                author_name = str(author_user) if author_user else f"User {post_user_id}"
-
-                            author_icon = None
-                            if author_user:
-                                try:
-                                    author_icon = author_user.display_avatar.url
-                                except Exception:
-                                    author_icon = None
-
-                            if author_icon:
-                                embed.set_author(name=author_name, icon_url=author_icon)
-                            else:
-                                embed.set_author(name=author_name)
-                            print(f"[DEBUG] データベース値で通常ユーザー: {author_name}")
-                        
-                        # フッターにカテゴリーと投稿IDを表示
-                        # フッター設定（カテゴリーがない場合はIDのみ）
-                        # UIDを取得してfooterに含める
-                        cursor.execute('SELECT user_id FROM thoughts WHERE id = ?', (self.post_id,))
-                        user_id_row = cursor.fetchone()
-                        user_id = user_id_row[0] if user_id_row else interaction.user.id
-                        
-                        if category:
-                            embed.set_footer(text=f'カテゴリー: {category} | 投稿ID: {self.post_id}')
-                        else:
-                            embed.set_footer(text=f'投稿ID: {self.post_id}')
-                        
-                        # 画像があれば追加
-                        if image_url:
-                            embed.set_image(url=image_url)
-                        
-                        await message.edit(embed=embed)
-                        print(f"[DEBUG] メッセージを更新しました: post_id={self.post_id}, message_id={message_id}")
-                        logger.info(f"メッセージを更新しました: post_id={self.post_id}, message_id={message_id}")
-                        
-                        # 非公開投稿の場合はスレッドの最初のメッセージも更新
-                        # if self._is_private:
-                        #     try:
-                        #         # スレッドの場合はスレッド自体の名前も更新
-                        #         if hasattr(channel, 'thread') and channel.thread:
-                        #             thread = channel.thread
-                        #         elif isinstance(channel, discord.Thread):
-                        #             thread = channel
-                        #         else:
-                        #             thread = None
-                        #         
-                        #         if thread:
-                        #             preview = content[:50] + ('...' if len(content) > 50 else '')
-                        #             await thread.edit(name=f"非公開投稿 - ID: {self.post_id} - {preview}")
-                        #             logger.info(f"スレッド名を更新しました: post_id={self.post_id}")
-                        #     except Exception as e:
-                        #         logger.warning(f"スレッド名の更新に失敗しました: {e}")
-                        
-            except Exception as e:
-                logger.error(f"Discordメッセージの更新中にエラーが発生しました: {e}", exc_info=True)
+                        fresh_ref = self._load_message_ref(cursor)
+                if fresh_ref == ref:
+                    raise RuntimeError(f"メッセージが見つかりません (message_id={ref.message_id})")
+                ref = fresh_ref
+                await self._apply_edit(ref, embed)
+            except discord.Forbidden:
+                raise RuntimeError(f"メッセージへのアクセス権限がありません (message_id={ref.message_id})")
+            edit_coalescer.remember(self.post_id, ref.message_id, embed)
+            logger.info(f"メッセージを更新しました: post_id={self.post_id}, message_id={ref.message_id}")
+        
+        async def _build_embed(self, post: Dict[str, Any]) -> discord.Embed:
+            """投稿データから埋め込みメッセージを作成します。
+            
+            投稿者情報はDBの値を使います（管理者が編集しても投稿者情報を維持する）。
+            
+            Args:
+                post: 投稿データ
+                
+            Returns:
+                discord.Embed: 埋め込みメッセージ
+            """
+            embed = discord.Embed(
+                description=post['content'],
+                color=discord.Color.blue()
+            )
+            
+            post_user_id = post['user_id']
+            if post['is_anonymous']:
+                embed.set_author(name='匿名ユーザー', icon_url=DEFAULT_AVATAR)
+            else:
+                # プロフィールキャッシュを優先し、ユーザーの取得はキャッシュにない場合だけ行う
+                profile = await profile_cache.resolve(self.bot, post_user_id)
+                
+                author_name = (post['display_name'] or None)
+                if not author_name:
+                    author_name = profile.username if profile else f"User {post_user_id}"
+                
+                author_icon = profile.avatar_url if profile else None
+                
+                if author_icon:
+                    embed.set_author(name=author_name, icon_url=author_icon)
+                else:
+                    embed.set_author(name=author_name)
+            
+            # フッター設定（カテゴリーがない場合はIDのみ）
+            embed.set_footer(text=encode_footer(self.post_id, post['category']))
+            
+            # 画像があれば追加
+            if post['image_url']:
+                embed.set_image(url=post['image_url'])
+            
+            return embed
+        
+        def _load_message_ref(self, cursor: sqlite3.Cursor) -> MessageRef:
+            """message_references から投稿のメッセージ位置を読み込みます。
+            
+            Args:
+                cursor: データベースカーソル
+                
+            Returns:
+                MessageRef: メッセージの位置
+            """
+            cursor.execute("""
+                SELECT message_id, channel_id, webhook_id
+                FROM message_references 
+                WHERE post_id = ?
+            """, (self.post_id,))
+            
+            message_ref = cursor.fetchone()
+            if not message_ref:
+                logger.warning(f"Post {self.post_id} のメッセージ参照が見つかりません")
+                raise RuntimeError(f"message_references が見つかりません (post_id={self.post_id})")
+            
+            message_id, channel_id, webhook_id = message_ref
+            ref = MessageRef.from_row(channel_id, message_id, webhook_id)
+            return ref
+        
+        async def _apply_edit(self, ref: MessageRef, embed: discord.Embed) -> None:
+            """メッセージを取得せずに埋め込みを更新します（API呼び出しは1回）。
+            
+            Args:
+                ref: メッセージの位置
+                embed: 新しい埋め込み
+            """
+            if ref.webhook_id:
+                # Webhook 配信されたメッセージは同じ Webhook で編集する
+                await webhook_delivery.edit(self.bot, ref.channel_id, ref.webhook_id, ref.message_id, embed)
+            else:
+                await partial_message(self.bot, ref).edit(embed=embed)
         
         async def on_error(self, interaction: discord.Interaction, error: Exception) -> None:
             """エラーが発生した際に呼び出されます。
@@ -532,56 +499,54 @@ class Edit(commands.Cog, DatabaseMixin):
             # discord.ui.Modal の既定の on_error も呼び出す
             await super().on_error(interaction, error)
         
-        async def _update_post_in_database(
+        def _update_post_in_database(
             self, 
-            conn: sqlite3.Connection, 
-            post_id: int, 
-            user_id: int, 
+            cursor: sqlite3.Cursor, 
             content: str, 
-            category: str, 
-            image_url: Optional[str], 
-            is_anonymous: bool, 
-            is_private: bool,
-            display_name: Optional[str]
+            category: Optional[str], 
+            image_url: Optional[str]
         ) -> Optional[Dict[str, Any]]:
-            """データベースの投稿を更新します。
+            """データベースの投稿を更新し、更新後の投稿とメッセージ参照を返します。
+            
+            表示名は変更しません（匿名化しても元の表示名は保持されます）。
+            管理者による編集もあるため、投稿者での絞り込みは行いません。
             
+            Args:
+                cursor: データベースカーソル
+                content: 投稿内容
+                category: カテゴリー
+                image_url: 画像URL
+                
             Returns:
-                Optional[Dict[str, Any]]: 更新された投稿データ、失敗時はNone
+                Optional[Dict[str, Any]]: 更新された投稿データ、投稿がない場合はNone
             """
-            try:
-                with self._get_cursor(conn) as cursor:
-                    cursor.execute('''
-                        UPDATE thoughts 
-                        SET content = ?, 
-                            category = ?, 
-                            image_url = ?,
-                            is_anonymous = ?,
-                            is_private = ?,
-                            updated_at = ?,
-                            display_name = ?
-                        WHERE id = ? AND user_id = ?
-                        RETURNING *
-                    ''', (
-                        content,
-                        category,
-                        image_url,
-                        is_anonymous,
-                        is_private,
-                        datetime.now().isoformat(),
-                        None if is_anonymous else display_name,
-                        post_id,
-                        user_id
-                    ))
-                    
-                    result = cursor.fetchone()
-                    if result:
-                        return dict(result)
-                    return None
-                    
-            except sqlite3.Error as e:
-                logger.error(f"Failed to update post {post_id}: {e}", exc_info=True)
-                return None
+            cursor.execute("""
+                UPDATE thoughts 
+                SET content = ?, 
+                    category = ?, 
+                    image_url = ?,
+                    is_anonymous = ?,
+                    is_private = ?,
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE id = ? AND deleted_at IS NULL
+                RETURNING id, content, category, image_url, is_anonymous, is_private,
+                          user_id, display_name,
+                          (SELECT message_id FROM message_references WHERE post_id = thoughts.id) AS message_id,
+                          (SELECT channel_id FROM message_references WHERE post_id = thoughts.id) AS channel_id,
+                          (SELECT webhook_id FROM message_references WHERE post_id = thoughts.id) AS webhook_id
+            """, (
+                content,
+                category,
+                image_url,
+                int(self._is_anonymous),
+                int(self._is_private),
+                self.post_id
+            ))
+            
+            result = cursor.fetchone()
+            if result:
+                return dict(result)
+            return None
         
     class PostSelect(discord.ui.Select):
         def __init__(self, posts):
@@ -612,7 +577,7 @@ class Edit(commands.Cog, DatabaseMixin):
                     cursor.execute('''
                         SELECT content, category, image_url, is_anonymous, is_private, user_id
                         FROM thoughts 
-                        WHERE id = ? AND user_id = ?
+                        WHERE id = ? AND user_id = ? AND deleted_at IS NULL
                     ''', (post_id, interaction.user.id))
                     post = cursor.fetchone()
             
@@ -709,89 +674,98 @@ class Edit(commands.Cog, DatabaseMixin):
             )
             await interaction.response.send_modal(modal)
     
+    async def _post_id_autocomplete(
+        self,
+        interaction: discord.Interaction,
+        current: str
+    ) -> List[app_commands.Choice[int]]:
+        """自分の最近の投稿から投稿IDの候補を返します"""
+        if not recent_post_index.is_warm(interaction.user.id):
+            with self._get_db_connection() as conn:
+                recent_post_index.warm(interaction.user.id, conn)
+        return recent_post_index.choices(interaction.user.id, current)
+    
     @app_commands.command(name="edit", description="投稿を編集します")
     @app_commands.describe(post_id="編集する投稿のID（省略可）")
+    @app_commands.autocomplete(post_id=_post_id_autocomplete)
+    @write_command_check()
     async def edit_post(
         self, 
         interaction: discord.Interaction, 
         post_id: Optional[int] = None
     ):
         """投稿を編集します（モーダルで編集）"""
-        try:
-            # post_idが指定されている場合は直接編集モーダルを表示
-            if post_id is not None:
-                # データベースから投稿を取得
-                with self._get_db_connection() as conn:
-                    with self._get_cursor(conn) as cursor:
-                        cursor.execute('''
-                            SELECT content, category, image_url, is_anonymous, is_private, user_id
-                            FROM thoughts 
-                            WHERE id = ?
-                        ''', (post_id,))
-                        post = cursor.fetchone()
+        async with DeadlineResponder(interaction, 'edit') as responder:
+            try:
+                # post_idが指定されている場合は直接編集モーダルを表示
+                if post_id is not None:
+                    # データベースから投稿を取得
+                    with self._get_db_connection() as conn:
+                        with self._get_cursor(conn) as cursor:
+                            cursor.execute('''
+                                SELECT content, category, image_url, is_anonymous, is_private, user_id
+                                FROM thoughts 
+                                WHERE id = ? AND deleted_at IS NULL
+                            ''', (post_id,))
+                            post = cursor.fetchone()
                 
-                if not post:
-                    await interaction.response.send_message("❌ 指定された投稿が見つかりません。", ephemeral=True)
-                    return
+                    if not post:
+                        await responder.send("❌ 指定された投稿が見つかりません。", ephemeral=True)
+                        return
                 
-                current_content, current_category, current_image_url, current_is_anonymous, current_is_private, post_user_id = post
+                    current_content, current_category, current_image_url, current_is_anonymous, current_is_private, post_user_id = post
                 
-                # デバッグログ
-                print(f"[DEBUG] データベースから取得: is_anonymous={current_is_anonymous}, type={type(current_is_anonymous)}")
-                print(f"[DEBUG] bool変換後: {bool(current_is_anonymous)}")
+                    logger.debug(f"データベースから取得: post_id={post_id}, is_anonymous={current_is_anonymous!r}, is_private={current_is_private!r}")
                 
-                # 権限チェック（投稿者本人または管理者のみ編集可能）
-                is_owner = post_user_id == interaction.user.id
-                is_admin = interaction.user.guild_permissions.administrator if interaction.guild else False
+                    # 権限チェック（投稿者本人または管理者のみ編集可能）
+                    is_owner = post_user_id == interaction.user.id
+                    is_admin = interaction.user.guild_permissions.administrator if interaction.guild else False
                 
-                if not (is_owner or is_admin):
-                    await interaction.response.send_message("❌ この投稿を編集する権限がありません。", ephemeral=True)
-                    return
+                    if not (is_owner or is_admin):
+                        await responder.send("❌ この投稿を編集する権限がありません。", ephemeral=True)
+                        return
                 
-                # モーダルを表示
-                view = self.EditSetupView(
-                    cog=self,
-                    post_id=post_id,
-                    current_content=current_content,
-                    current_category=current_category,
-                    current_image_url=current_image_url,
-                    current_is_anonymous=bool(current_is_anonymous),
-                    current_is_private=bool(current_is_private)
-                )
-                await interaction.response.send_message("設定を確認してから『編集を開く』を押してください。", view=view, ephemeral=True)
-                return
+                    # モーダルを表示
+                    view = self.EditSetupView(
+                        cog=self,
+                        post_id=post_id,
+                        current_content=current_content,
+                        current_category=current_category,
+                        current_image_url=current_image_url,
+                        current_is_anonymous=bool(current_is_anonymous),
+                        current_is_private=bool(current_is_private)
+                    )
+                    await responder.send("設定を確認してから『編集を開く』を押してください。", view=view, ephemeral=True)
+                    return
                 
-            # post_idが指定されていない場合は投稿一覧を表示
-            with self._get_db_connection() as conn:
-                with self._get_cursor(conn) as cursor:
-                    cursor.execute('''
-                        SELECT id, content, category
-                        FROM thoughts 
-                        WHERE user_id = ?
-                        ORDER BY created_at DESC
-                        LIMIT 25
-                    ''', (interaction.user.id,))
-                    posts = cursor.fetchall()
-            
-            if not posts:
-                await interaction.response.send_message("❌ 編集可能な投稿が見つかりませんでした。", ephemeral=True)
-                return
+                # post_idが指定されていない場合は投稿一覧を表示
+                with self._get_db_connection() as conn:
+                    with self._get_cursor(conn) as cursor:
+                        cursor.execute('''
+                            SELECT id, content, category
+                            FROM thoughts 
+                            WHERE user_id = ? AND deleted_at IS NULL
+                            ORDER BY created_at DESC
+                            LIMIT 25
+                        ''', (interaction.user.id,))
+                        posts = cursor.fetchall()
             
-            # 投稿選択用のビューを表示
-            view = self.PostSelectView(self, posts)
-            await interaction.response.send_message(
-                "📝 編集する投稿を選択してください（最新25件）",
-                view=view,
-                ephemeral=True
-            )
+                if not posts:
+                    await responder.send("❌ 編集可能な投稿が見つかりませんでした。", ephemeral=True)
+                    return
             
-        except Exception as e:
-            error_msg = f"コマンド実行中にエラーが発生しました: {str(e)}\n```{type(e).__name__}```"
-            print(f"Command Error in edit_post: {error_msg}")
-            if not interaction.response.is_done():
-                await interaction.response.send_message("❌ エラーが発生しました。もう一度お試しください。", ephemeral=True)
-            else:
-                await interaction.followup.send("❌ エラーが発生しました。もう一度お試しください。", ephemeral=True)
+                # 投稿選択用のビューを表示
+                view = self.PostSelectView(self, posts)
+                await responder.send(
+                    "📝 編集する投稿を選択してください（最新25件）",
+                    view=view,
+                    ephemeral=True
+                )
+            
+            except Exception as e:
+                logger.error(f"edit_post の実行中にエラーが発生しました: {e}", exc_info=True)
+                if not responder.responded:
+                    await responder.send("❌ エラーが発生しました。もう一度お試しください。", ephemeral=True)
 
 async def setup(bot):
     await bot.add_cog(Edit(bot))
@@ -0,0 +1,110 @@
+"""投稿の編集履歴を表示するCog"""
+
+import logging
+from typing import Optional
+
+import discord
+from discord import app_commands
+from discord.ext import commands
+
+from bot import DatabaseMixin
+from utils.revisions import list_revisions, load_revision
+
+# ロガーの設定
+logger = logging.getLogger(__name__)
+
+
+class History(commands.Cog, DatabaseMixin):
+    """編集履歴表示用Cog"""
+
+    def __init__(self, bot: commands.Bot) -> None:
+        self.bot = bot
+        DatabaseMixin.__init__(self)
+
+    @app_commands.command(name="history", description="投稿の編集履歴を表示します")
+    @app_commands.describe(
+        post_id="履歴を表示する投稿ID",
+        revision="表示する版番号（省略時は版の一覧を表示）"
+    )
+    async def history(
+        self,
+        interaction: discord.Interaction,
+        post_id: int,
+        revision: Optional[int] = None
+    ) -> None:
+        """投稿の版の一覧、または指定した版の内容を表示します"""
+        try:
+            with self._get_db_connection() as conn:
+                with self._get_cursor(conn) as cursor:
+                    cursor.execute('SELECT user_id FROM thoughts WHERE id = ? AND deleted_at IS NULL', (post_id,))
+                    row = cursor.fetchone()
+                    if not row:
+                        await interaction.response.send_message("❌ 指定された投稿が見つかりません。", ephemeral=True)
+                        return
+
+                    # 権限チェック（投稿者本人または管理者のみ）
+                    is_owner = row['user_id'] == interaction.user.id
+                    is_admin = interaction.user.guild_permissions.administrator if interaction.guild else False
+                    if not (is_owner or is_admin):
+                        await interaction.response.send_message("❌ この投稿の履歴を表示する権限がありません。", ephemeral=True)
+                        return
+
+                    if revision is None:
+                        revisions = list_revisions(cursor, post_id)
+                        embed = self._build_list_embed(post_id, revisions)
+                    else:
+                        found = load_revision(cursor, post_id, revision)
+                        if found is None:
+                            await interaction.response.send_message(
+                                f"❌ 投稿ID {post_id} の版 {revision} は見つかりません。",
+                                ephemeral=True
+                            )
+                            return
+                        embed = discord.Embed(
+                            title=f"📜 投稿ID {post_id} / 版 {found.revision}",
+                            description=found.content[:4096],
+                            color=discord.Color.blue()
+                        )
+                        embed.add_field(name="カテゴリー", value=found.category or "未設定")
+                        if found.editor_id:
+                            embed.add_field(name="編集者", value=f"<@{found.editor_id}>")
+                        if found.created_at:
+                            embed.add_field(name="日時", value=str(found.created_at))
+                        if found.image_url:
+                            embed.set_image(url=found.image_url)
+
+            await interaction.response.send_message(embed=embed, ephemeral=True)
+
+        except Exception as e:
+            logger.error(f"編集履歴の表示中にエラーが発生しました: {e}", exc_info=True)
+            if not interaction.response.is_done():
+                await interaction.response.send_message(
+                    f"❌ 編集履歴の表示中にエラーが発生しました: {e}",
+                    ephemeral=True
+                )
+
+    @staticmethod
+    def _build_list_embed(post_id: int, revisions: list) -> discord.Embed:
+        """版の一覧を表示する埋め込みを作成します"""
+        embed = discord.Embed(
+            title=f"📜 投稿ID {post_id} の編集履歴",
+            color=discord.Color.blue()
+        )
+        if not revisions:
+            embed.description = "この投稿はまだ編集されていません。"
+            return embed
+
+        lines = []
+        for rev in revisions:
+            kind = "全文" if rev['kind'] == 'snapshot' else "差分"
+            editor = f"<@{rev['editor_id']}>" if rev['editor_id'] else "不明"
+            label = "元の投稿" if rev['revision'] == 0 else f"版 {rev['revision']}"
+            lines.append(f"`{label}` {rev['created_at']} / {editor} / {kind} {rev['size']}B")
+        embed.description = "\n".join(lines)[:4096]
+        embed.set_footer(text="/history post_id revision:<版番号> で内容を表示できます")
+        return embed
+
+
+async def setup(bot: commands.Bot) -> None:
+    """Cogをボットに追加"""
+    await bot.add_cog(History(bot))
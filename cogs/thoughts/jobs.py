@@ -0,0 +1,128 @@
+"""管理コマンドのバックグラウンドジョブを管理するCog"""
+
+import json
+import logging
+
+import discord
+from discord import app_commands
+from discord.ext import commands
+
+from bot import DatabaseMixin
+from utils.jobs import job_manager
+
+# ロガーの設定
+logger = logging.getLogger(__name__)
+
+# 状態ごとの表示
+STATUS_LABELS = {
+    'queued': '⏳ 待機中',
+    'running': '🔄 実行中',
+    'succeeded': '✅ 完了',
+    'failed': '❌ 失敗',
+    'cancelled': '🛑 キャンセル',
+    'interrupted': '⚠️ 中断',
+}
+
+
+class Jobs(commands.Cog, DatabaseMixin):
+    """バックグラウンドジョブ管理用Cog"""
+
+    def __init__(self, bot: commands.Bot) -> None:
+        self.bot = bot
+        DatabaseMixin.__init__(self)
+
+    async def cog_load(self) -> None:
+        job_manager.start()
+
+    async def cog_unload(self) -> None:
+        await job_manager.stop()
+
+    @app_commands.command(name="jobs", description="最近のバックグラウンドジョブを表示します")
+    @app_commands.default_permissions(administrator=True)
+    @app_commands.checks.has_permissions(administrator=True)
+    async def list_jobs(self, interaction: discord.Interaction):
+        """最近のバックグラウンドジョブを表示します"""
+        rows = job_manager.recent(limit=10)
+
+        embed = discord.Embed(
+            title="📋 バックグラウンドジョブ",
+            color=discord.Color.blue()
+        )
+        if not rows:
+            embed.description = "まだジョブはありません。"
+        else:
+            embed.description = "\n".join(
+                f"`#{row['id']}` {STATUS_LABELS.get(row['status'], row['status'])} "
+                f"**{row['kind']}** ({row['created_at']})"
+                for row in rows
+            )
+            embed.set_footer(text="/job_status <job_id> で詳細を確認できます")
+
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
+    @app_commands.command(name="job_status", description="バックグラウンドジョブの状態を表示します")
+    @app_commands.default_permissions(administrator=True)
+    @app_commands.checks.has_permissions(administrator=True)
+    @app_commands.describe(job_id="ジョブID")
+    async def job_status(self, interaction: discord.Interaction, job_id: int):
+        """バックグラウンドジョブの状態を表示します"""
+        row = job_manager.get(job_id)
+        if row is None:
+            await interaction.response.send_message(f"❌ ジョブ #{job_id} が見つかりません。", ephemeral=True)
+            return
+
+        embed = discord.Embed(
+            title=f"📋 ジョブ #{row['id']}: {row['kind']}",
+            color=discord.Color.blue()
+        )
+        embed.add_field(name="状態", value=STATUS_LABELS.get(row['status'], row['status']), inline=True)
+        embed.add_field(name="実行者", value=f"<@{row['requested_by']}>" if row['requested_by'] else "不明", inline=True)
+
+        params = json.loads(row['params'] or '{}')
+        if params:
+            embed.add_field(
+                name="パラメーター",
+                value="\n".join(f"{key}: {value}" for key, value in params.items())[:1024],
+                inline=False
+            )
+
+        times = [f"登録: {row['created_at']}"]
+        if row['started_at']:
+            times.append(f"開始: {row['started_at']}")
+        if row['finished_at']:
+            times.append(f"終了: {row['finished_at']}")
+        embed.add_field(name="時刻 (UTC)", value="\n".join(times), inline=False)
+
+        if row['progress']:
+            embed.add_field(name="最新の表示", value=row['progress'][-1024:], inline=False)
+        if row['result']:
+            embed.add_field(name="結果", value=row['result'][:1024], inline=False)
+        if row['error']:
+            embed.add_field(name="エラー", value=row['error'][:1024], inline=False)
+            embed.color = discord.Color.red()
+
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
+    @app_commands.command(name="job_cancel", description="待機中・実行中のバックグラウンドジョブをキャンセルします")
+    @app_commands.default_permissions(administrator=True)
+    @app_commands.checks.has_permissions(administrator=True)
+    @app_commands.describe(job_id="ジョブID")
+    async def job_cancel(self, interaction: discord.Interaction, job_id: int):
+        """待機中・実行中のバックグラウンドジョブをキャンセルします"""
+        previous = await job_manager.cancel(job_id)
+        if previous is None:
+            await interaction.response.send_message(
+                f"❌ ジョブ #{job_id} は待機中・実行中ではありません。",
+                ephemeral=True
+            )
+            return
+
+        await interaction.response.send_message(
+            f"🛑 ジョブ #{job_id} を{'停止' if previous == 'running' else 'キャンセル'}しました。",
+            ephemeral=True
+        )
+        logger.info(f"ジョブ #{job_id} をキャンセルしました: user_id={interaction.user.id}")
+
+
+async def setup(bot: commands.Bot) -> None:
+    await bot.add_cog(Jobs(bot))
@@ -100,7 +100,7 @@ class List(commands.Cog, DatabaseMixin):
                             t.display_name,
                             t.image_url
                         FROM thoughts t
-                        WHERE t.user_id = ? AND t.user_id != 0
+                        WHERE t.user_id = ? AND t.user_id != 0 AND t.deleted_at IS NULL
                         ORDER BY t.created_at DESC
                         LIMIT ?
                     ''', (user_id, limit))
@@ -113,6 +113,25 @@ class List(commands.Cog, DatabaseMixin):
             logger.error(f"投稿の取得中にエラーが発生しました: {e}", exc_info=True)
             raise
 
+    def _fetch_user_stats(self, user_id: int) -> Optional[Dict[str, Any]]:
+        """ユーザーの投稿数の集計を取得します。
+        
+        Args:
+            user_id: ユーザーID
+            
+        Returns:
+            Optional[Dict[str, Any]]: 集計（投稿がない場合はNone）
+        """
+        with self._get_db_connection() as conn:
+            with self._get_cursor(conn) as cursor:
+                cursor.execute('''
+                    SELECT total, private, anonymous, last_post_at
+                    FROM user_stats
+                    WHERE user_id = ?
+                ''', (user_id,))
+                row = cursor.fetchone()
+                return dict(row) if row else None
+
     @app_commands.command(name="list", description="自分の投稿一覧を表示します")
     @app_commands.describe(limit="表示する件数 (デフォルト: 10, 最大: 25)")
     async def list_posts(self, interaction: discord.Interaction, limit: int = 10) -> None:
@@ -153,6 +172,17 @@ class List(commands.Cog, DatabaseMixin):
                     )
                     return await interaction.followup.send(embed=embed, ephemeral=True)
                 
+                # ヘッダーに表示する集計
+                stats = self._fetch_user_stats(interaction.user.id)
+                header = None
+                if stats:
+                    header = (
+                        f"📊 投稿数: {stats['total']}件"
+                        f"（🔒 非公開 {stats['private']}件 / 👤 匿名 {stats['anonymous']}件）"
+                    )
+                    if stats['last_post_at']:
+                        header += f"\n🕒 最終投稿: {stats['last_post_at']}"
+                
                 # ページネーションの設定
                 items_per_page = 3  # 1ページあたりの表示数
                 pages = []
@@ -160,6 +190,7 @@ class List(commands.Cog, DatabaseMixin):
                 for i in range(0, len(posts), items_per_page):
                     embed = discord.Embed(
                         title=f"📋 {interaction.user.display_name} さんの投稿一覧",
+                        description=header,
                         color=discord.Color.blue()
                     )
                     
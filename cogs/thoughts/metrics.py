@@ -0,0 +1,53 @@
+"""ボット内部のメトリクスを表示するCog"""
+
+import logging
+
+import discord
+from discord import app_commands
+from discord.ext import commands
+
+from utils import metrics
+
+# ロガーの設定
+logger = logging.getLogger(__name__)
+
+
+class Metrics(commands.Cog):
+    """メトリクス表示用Cog"""
+
+    def __init__(self, bot: commands.Bot) -> None:
+        self.bot = bot
+
+    @app_commands.command(name="metrics", description="ボットの内部メトリクスを表示します")
+    @app_commands.default_permissions(administrator=True)
+    @app_commands.checks.has_permissions(administrator=True)
+    async def show_metrics(self, interaction: discord.Interaction):
+        """ボットの内部メトリクスを表示します"""
+        counters = metrics.counters()
+        timings = metrics.timings()
+
+        embed = discord.Embed(
+            title="📈 メトリクス",
+            color=discord.Color.blue()
+        )
+
+        if counters:
+            lines = [f"`{name}`: {value}" for name, value in sorted(counters.items())]
+            embed.add_field(name="カウンター", value="\n".join(lines)[:1024], inline=False)
+
+        if timings:
+            lines = [
+                f"`{name}`: {count}回 / 平均 {avg * 1000:.0f}ms / 最大 {peak * 1000:.0f}ms"
+                for name, (count, avg, peak) in sorted(timings.items())
+            ]
+            embed.add_field(name="所要時間", value="\n".join(lines)[:1024], inline=False)
+
+        if not counters and not timings:
+            embed.description = "まだ記録されたメトリクスはありません。"
+
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
+
+async def setup(bot: commands.Bot) -> None:
+    """Cogをボットに追加"""
+    await bot.add_cog(Metrics(bot))
@@ -13,7 +13,13 @@ from discord.ext import commands
 import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from config import CHANNELS, DEFAULT_AVATAR
+from config import CHANNELS, DEFAULT_AVATAR, WEBHOOK_DELIVERY
+from utils import metrics
+from utils.footer import encode_footer
+from utils.idempotency import DEDUPE_WINDOW_SECONDS, content_hash, recent_posts
+from utils.post_index import recent_post_index
+from utils.ratelimit import AdmissionDenied, admission, send_admission_denied, write_command_check
+from utils.webhooks import webhook_delivery
 
 # ロガーの設定
 logger = logging.getLogger(__name__)
@@ -23,247 +29,9 @@ class Post(commands.Cog):
         self.bot = bot
         logger.info("Post cog が初期化されました")
 
-    class VisibilitySelect(ui.Select):
-        def __init__(self):
-            options = [
-                discord.SelectOption(label='公開', value='public', description='誰でも見ることができます', emoji='👥'),
-                discord.SelectOption(label='非公開', value='private', description='自分と管理者のみが削除できます', emoji='🔒')
-            ]
-            super().__init__(
-                placeholder='公開設定を選択...',
-                min_values=1,
-                max_values=1,
-                options=options
-            )
-            self.value = 'public'  # デフォルト値
-            
-        async def callback(self, interaction: discord.Interaction):
-            self.value = self.values[0]
-            await interaction.response.defer()
-    
-    class PostModal(ui.Modal, title='新規投稿'):
-        def __init__(self) -> None:
-            super().__init__(timeout=300)  # 明示的にタイムアウトを設定
-            self.is_public = True  # デフォルトは公開
-            
-            # メッセージ入力
-            self.message = ui.TextInput(
-                label='メッセージ',
-                placeholder='投稿するメッセージを入力してください...',
-                style=discord.TextStyle.paragraph,
-                max_length=2000,
-                required=True
-            )
-            
-            # カテゴリ入力
-            self.category = ui.TextInput(
-                label='カテゴリ',
-                placeholder='カテゴリを入力（例: 独り言, 愚痴, 考えごと など）',
-                max_length=50,
-                required=False
-            )
-            
-            # 画像URL入力
-            self.image_url = ui.TextInput(
-                label='画像URL（任意）',
-                placeholder='画像のURLを入力（https://...）',
-                required=False
-            )
-            
-            # 匿名設定
-            self.anonymous = ui.TextInput(
-                label='表示名（任意）',
-                placeholder='「匿名」と入力すると匿名で投稿します',
-                required=False
-            )
-            
-            # UIコンポーネントを追加
-            self.add_item(self.message)
-            self.add_item(self.category)
-            self.add_item(self.image_url)
-            self.add_item(self.anonymous)
-            
-            # 公開/非公開選択を追加
-            self.visibility = ui.TextInput(
-                label='公開設定',
-                placeholder='「公開」または「非公開」と入力してください',
-                default='公開',
-                required=True
-            )
-            self.add_item(self.visibility)
-
-        async def on_submit(self, interaction: discord.Interaction) -> None:
-            """フォームが送信されたときの処理"""
-            await interaction.response.defer(ephemeral=True)
-            
-            # モーダルから値を取得
-            message = self.message.value
-            category = self.category.value if self.category.value else None
-            image_url = self.image_url.value if self.image_url.value else None
-            visibility_value = (self.visibility.value or "").strip().lower()
-            if visibility_value in {"公開", "public"}:
-                is_public = True
-            elif visibility_value in {"非公開", "private"}:
-                is_public = False
-            else:
-                await interaction.followup.send(
-                    "❌ 公開設定は「公開」または「非公開」と入力してください。",
-                    ephemeral=True
-                )
-                return
-            is_anonymous = self.anonymous.value and self.anonymous.value.lower() == '匿名'
-            
-            # データベースに保存
-            try:
-                post_cog = interaction.client.get_cog('Post')
-                if not post_cog:
-                    await interaction.followup.send(
-                        "❌ エラーが発生しました。もう一度お試しください。",
-                        ephemeral=True
-                    )
-                    return
-                
-                post_id = await post_cog._save_post_to_db(
-                    interaction.user.id,
-                    message,
-                    category,
-                    image_url,
-                    is_public,
-                    is_anonymous
-                )
-                
-                # 投稿先チャンネルを決定
-                channel_id = CHANNELS['public'] if is_public else CHANNELS['private']
-                channel = interaction.guild.get_channel(channel_id)
-                
-                if not channel:
-                    await interaction.followup.send(
-                        "❌ 投稿先チャンネルが見つかりませんでした。",
-                        ephemeral=True
-                    )
-                    return
-                
-                # 埋め込みメッセージを作成
-                embed = discord.Embed(
-                    description=message,
-                    color=discord.Color.blue() if is_public else discord.Color.dark_grey()
-                )
-                
-                # 投稿者情報を追加（匿名設定に応じて表示を変更）
-                if is_anonymous:
-                    embed.set_author(name="匿名ユーザー", icon_url=DEFAULT_AVATAR)
-                else:
-                    embed.set_author(
-                        name=str(interaction.user),
-                        icon_url=interaction.user.display_avatar.url
-                    )
-                
-                # 画像を追加（ある場合）
-                if image_url:
-                    embed.set_image(url=image_url)
-                
-                footer_parts = []
-                if category:
-                    footer_parts.append(f"カテゴリ: {category}")
-                footer_parts.append(f"投稿ID: {post_id}")
-                # UIDは表示しない（DBのみで管理）
-                embed.set_footer(text=" | ".join(footer_parts))
-                
-                # メッセージを送信
-                if is_public:
-                    # 公開投稿は通常通りチャンネルにメッセージを送信
-                    sent_message = await channel.send(embed=embed)
-                else:
-                    # 非公開投稿の場合はスレッドを作成
-                    thread_name = f"非公開投稿 - {interaction.user.name}"
-                    if category:
-                        thread_name += f" - {category}"
-                    
-                    # スレッドを作成
-                    try:
-                        thread = await channel.create_thread(
-                            name=thread_name[:100],
-                            type=discord.ChannelType.private_thread,
-                            reason=f"非公開投稿のスレッド作成 - {interaction.user.id}",
-                            invitable=False
-                        )
-                    except discord.Forbidden:
-                        await interaction.followup.send(
-                            "❌ 非公開スレッドを作成する権限がありません。（botにスレッド作成/管理権限が必要です）",
-                            ephemeral=True
-                        )
-                        return
-                    except discord.HTTPException as e:
-                        logger.error(f"スレッド作成に失敗しました: {e}", exc_info=True)
-                        await interaction.followup.send(
-                            "❌ 非公開スレッドの作成に失敗しました。",
-                            ephemeral=True
-                        )
-                        return
-                    
-                    # 投稿者をスレッドに追加
-                    await thread.add_user(interaction.user)
-                    
-                    # スレッドにメッセージを送信
-                    sent_message = await thread.send(embed=embed)
-                    
-                    # 非公開ロールを取得または作成
-                    private_role = discord.utils.get(interaction.guild.roles, name="非公開")
-                    if not private_role:
-                        private_role = await interaction.guild.create_role(
-                            name="非公開",
-                            reason="非公開投稿用のロールを作成"
-                        )
-                    
-                    # 投稿者に非公開ロールを付与
-                    if private_role not in interaction.user.roles:
-                        await interaction.user.add_roles(private_role)
-                    
-                    # 非公開ロールを持つメンバーをスレッドに追加
-                    for member in private_role.members:
-                        if member != interaction.user:  # 既に追加済みの場合はスキップ
-                            try:
-                                await thread.add_user(member)
-                            except discord.HTTPException:
-                                pass
-                
-                # メッセージ参照を保存
-                with post_cog._get_db_connection() as conn:
-                    with post_cog._get_cursor(conn) as cursor:
-                        cursor.execute('''
-                            INSERT INTO message_references (
-                                channel_id, message_id, post_id
-                            ) VALUES (?, ?, ?)
-                        ''', (
-                            str(sent_message.channel.id),
-                            str(sent_message.id),
-                            post_id
-                        ))
-                        conn.commit()
-                
-                # 完了メッセージを送信
-                embed = discord.Embed(
-                    title="✅ 投稿が完了しました！",
-                    description=f"[メッセージにジャンプ]({sent_message.jump_url})",
-                    color=discord.Color.green()
-                )
-                embed.add_field(name="ID", value=f"`{post_id}`", inline=True)
-                if category:
-                    embed.add_field(name="カテゴリ", value=f"`{category}`", inline=True)
-                embed.add_field(name="表示名", value=f"`{'匿名' if is_anonymous else '名義'}`", inline=True)
-                
-                await interaction.followup.send(embed=embed, ephemeral=True)
-                
-            except Exception as e:
-                logger.error(f"投稿中にエラーが発生しました: {e}", exc_info=True)
-                error_message = f"❌ 投稿中にエラーが発生しました。\n詳細: {str(e)}"
-                await interaction.followup.send(
-                    error_message,
-                    ephemeral=True
-                )
-
     @app_commands.command(name="post", description="新しい投稿を作成します")
     @app_commands.guild_only()
+    @write_command_check()
     async def post(self, interaction: discord.Interaction) -> None:
         """新しい投稿を作成します"""
         try:
@@ -326,23 +94,100 @@ class Post(commands.Cog):
 
     async def _save_post_to_db(self, user_id: int, message: str, category: Optional[str] = None, 
                              image_url: Optional[str] = None, is_public: bool = True, 
-                             is_anonymous: bool = False) -> int:
-        """投稿をデータベースに保存し、投稿IDを返します"""
+                             is_anonymous: bool = False) -> Tuple[int, bool]:
+        """投稿をデータベースに保存し、(投稿ID, 新規作成したか) を返します
+
+        直前に同じ内容の投稿がある場合は保存せず、既存の投稿IDを返します。
+        """
+        key = recent_posts.make_key(user_id, message, category, image_url, is_public, is_anonymous)
+        existing_id = recent_posts.get(key)
+        if existing_id is not None:
+            metrics.increment('post.duplicate.window')
+            logger.info(f"重複投稿を検出しました（メモリ）: user_id={user_id}, post_id={existing_id}")
+            return existing_id, False
+
+        dedupe_hash = content_hash(user_id, message, category, image_url, is_public, is_anonymous)
         try:
             with self._get_db_connection() as conn:
                 with self._get_cursor(conn) as cursor:
-                    cursor.execute(''' 
-                        INSERT INTO thoughts (
-                            user_id, content, category, image_url, 
-                            is_anonymous, is_private, created_at, updated_at
-                        ) VALUES (?, ?, ?, ?, ?, ?, datetime('now'), datetime('now'))
-                    ''', (user_id, message, category, image_url, 1 if is_anonymous else 0, 1 if not is_public else 0))
+                    # 期限切れのハッシュを外す（部分インデックスなので対象は直近の投稿のみ）
+                    cursor.execute('''
+                        UPDATE thoughts SET content_hash = NULL
+                        WHERE content_hash IS NOT NULL AND created_at < datetime('now', ?)
+                    ''', (f'-{DEDUPE_WINDOW_SECONDS} seconds',))
+                    try:
+                        cursor.execute(''' 
+                            INSERT INTO thoughts (
+                                user_id, content, category, image_url, 
+                                is_anonymous, is_private, created_at, updated_at, content_hash
+                            ) VALUES (?, ?, ?, ?, ?, ?, datetime('now'), datetime('now'), ?)
+                        ''', (user_id, message, category, image_url, 1 if is_anonymous else 0, 1 if not is_public else 0, dedupe_hash))
+                    except sqlite3.IntegrityError:
+                        # 別プロセス・再起動前の投稿と重複した場合
+                        conn.rollback()
+                        cursor.execute('SELECT id FROM thoughts WHERE content_hash = ?', (dedupe_hash,))
+                        row = cursor.fetchone()
+                        if row is None:
+                            raise
+                        recent_posts.put(key, row['id'])
+                        metrics.increment('post.duplicate.db')
+                        logger.info(f"重複投稿を検出しました（DB）: user_id={user_id}, post_id={row['id']}")
+                        return row['id'], False
                     conn.commit()
-                    return cursor.lastrowid
+                    post_id = cursor.lastrowid
+                    recent_posts.put(key, post_id)
+                    recent_post_index.add(user_id, post_id, message, category)
+                    metrics.increment('post.created')
+                    return post_id, True
         except sqlite3.Error as e:
             logger.error(f"データベースへの投稿保存中にエラーが発生しました: {e}")
             raise
 
+    def _discard_undelivered_post(
+        self,
+        user_id: int,
+        post_id: int,
+        message: str,
+        category: Optional[str],
+        image_url: Optional[str],
+        is_public: bool,
+        is_anonymous: bool
+    ) -> None:
+        """チャンネルに送信できなかった投稿を取り消します
+
+        投稿を残したままだと、ユーザーが再送信しても重複として扱われ、
+        メッセージのない投稿だけが残るためです。メッセージ参照がある投稿は消しません。
+        """
+        recent_posts.discard(recent_posts.make_key(user_id, message, category, image_url, is_public, is_anonymous))
+        recent_post_index.remove(user_id, post_id)
+        try:
+            with self._get_db_connection() as conn:
+                with self._get_cursor(conn) as cursor:
+                    cursor.execute('''
+                        DELETE FROM thoughts
+                        WHERE id = ? AND NOT EXISTS (
+                            SELECT 1 FROM message_references WHERE post_id = ?
+                        )
+                    ''', (post_id, post_id))
+                    conn.commit()
+                    if cursor.rowcount:
+                        logger.info(f"送信できなかった投稿を取り消しました: post_id={post_id}")
+        except sqlite3.Error as e:
+            logger.error(f"送信できなかった投稿の取り消しに失敗しました: post_id={post_id}, {e}")
+
+    async def _find_message_url(self, guild_id: int, post_id: int) -> Optional[str]:
+        """投稿IDに対応するメッセージのURLを返します（未送信ならNone）"""
+        with self._get_db_connection() as conn:
+            with self._get_cursor(conn) as cursor:
+                cursor.execute(
+                    'SELECT channel_id, message_id FROM message_references WHERE post_id = ?',
+                    (post_id,)
+                )
+                row = cursor.fetchone()
+        if not row:
+            return None
+        return f"https://discord.com/channels/{guild_id}/{row['channel_id']}/{row['message_id']}"
+
     class VisibilitySelect(ui.Select):
         def __init__(self):
             options = [
@@ -414,6 +259,17 @@ class Post(commands.Cog):
 
         async def on_submit(self, interaction: discord.Interaction) -> None:
             """フォームが送信されたときの処理"""
+            # モーダルを開いた時点ではなく、書き込む直前に同時実行数を判定する
+            try:
+                admission.check_capacity()
+            except AdmissionDenied as e:
+                await send_admission_denied(interaction, e)
+                return
+            with admission.slot():
+                await self._submit(interaction)
+
+        async def _submit(self, interaction: discord.Interaction) -> None:
+            """投稿を保存してチャンネルに送信します"""
             await interaction.response.defer(ephemeral=True)
             
             # モーダルから値を取得
@@ -432,6 +288,16 @@ class Post(commands.Cog):
                 )
                 return
             is_anonymous = self.anonymous.value.lower() == '匿名'
+            post_cog = None
+            post_id: Optional[int] = None
+            created = False
+
+            def discard_undelivered() -> None:
+                # 保存したがチャンネルに送信できなかった投稿は取り消して再送信できるようにする
+                if post_cog is not None and created:
+                    post_cog._discard_undelivered_post(
+                        interaction.user.id, post_id, message, category, image_url, is_public, is_anonymous
+                    )
             
             # データベースに保存
             try:
@@ -443,7 +309,7 @@ class Post(commands.Cog):
                     )
                     return
                 
-                post_id = await post_cog._save_post_to_db(
+                post_id, created = await post_cog._save_post_to_db(
                     interaction.user.id,
                     message,
                     category,
@@ -452,6 +318,18 @@ class Post(commands.Cog):
                     is_anonymous
                 )
                 
+                if not created:
+                    # 再送信・ダブルクリックによる重複はチャンネルに送らない
+                    jump_url = await post_cog._find_message_url(interaction.guild.id, post_id)
+                    notice = f"⚠️ 同じ内容の投稿を受け付け済みのため、重複投稿をスキップしました。(ID: {post_id})"
+                    if jump_url:
+                        notice += f"\n[メッセージにジャンプ]({jump_url})"
+                    await interaction.followup.send(notice, ephemeral=True)
+                    return
+                
+                # Webhook 配信時のみ設定される
+                webhook_id: Optional[int] = None
+
                 # 公開/非公開でチャンネルを分ける
                 if is_public:
                     # 公開チャンネルに投稿
@@ -475,15 +353,24 @@ class Post(commands.Cog):
                     if image_url:
                         embed.set_image(url=image_url)
 
-                    footer_parts = []
-                    if category:
-                        footer_parts.append(f"カテゴリ: {category}")
-                    footer_parts.append(f"投稿ID: {post_id}")
                     # UIDは表示しない（DBのみで管理）
-                    embed.set_footer(text=" | ".join(footer_parts))
+                    embed.set_footer(text=encode_footer(post_id, category))
                     
                     # メッセージを送信
-                    sent_message = await channel.send(embed=embed)
+                    if WEBHOOK_DELIVERY:
+                        # Webhook で投稿者の名前・アイコンとして送信（ボットとは別のレート制限）
+                        if is_anonymous:
+                            sent_message = await webhook_delivery.send(channel, embed, "匿名ユーザー", DEFAULT_AVATAR)
+                        else:
+                            sent_message = await webhook_delivery.send(
+                                channel,
+                                embed,
+                                interaction.user.display_name,
+                                interaction.user.display_avatar.url
+                            )
+                        webhook_id = sent_message.webhook_id
+                    else:
+                        sent_message = await channel.send(embed=embed)
                 else:
                     # 非公開チャンネルを取得
                     private_channel = interaction.guild.get_channel(CHANNELS['private'])
@@ -528,6 +415,7 @@ class Post(commands.Cog):
                                 invitable=False
                             )
                         except discord.Forbidden:
+                            discard_undelivered()
                             await interaction.followup.send(
                                 "❌ 非公開スレッドを作成する権限がありません。（botにスレッド作成/管理権限が必要です）",
                                 ephemeral=True
@@ -535,6 +423,7 @@ class Post(commands.Cog):
                             return
                         except discord.HTTPException as e:
                             logger.error(f"スレッド作成に失敗しました: {e}", exc_info=True)
+                            discard_undelivered()
                             await interaction.followup.send(
                                 "❌ 非公開スレッドの作成に失敗しました。",
                                 ephemeral=True
@@ -576,12 +465,8 @@ class Post(commands.Cog):
                     if image_url:
                         embed.set_image(url=image_url)
 
-                    footer_parts = []
-                    if category:
-                        footer_parts.append(f"カテゴリ: {category}")
-                    footer_parts.append(f"投稿ID: {post_id}")
                     # UIDは表示しない（DBのみで管理）
-                    embed.set_footer(text=" | ".join(footer_parts))
+                    embed.set_footer(text=encode_footer(post_id, category))
                     
                     sent_message = await thread.send(embed=embed)
                     
@@ -604,18 +489,18 @@ class Post(commands.Cog):
                                 logger.error(f"カラム追加に失敗しました: {e}")
                                 # カラムがない場合はthoughtsからuser_idを取得する方式に変更
                                 cursor.execute('''
-                                    INSERT OR REPLACE INTO message_references (post_id, message_id, channel_id)
-                                    VALUES (?, ?, ?)
-                                ''', (post_id, sent_message.id, channel.id))
+                                    INSERT OR REPLACE INTO message_references (post_id, message_id, channel_id, webhook_id)
+                                    VALUES (?, ?, ?, ?)
+                                ''', (post_id, sent_message.id, channel.id, webhook_id))
                                 conn.commit()
                                 logger.info("user_idなしでmessage_referencesに保存しました")
                                 await interaction.followup.send(embed=embed, ephemeral=True)
                                 return
                         
                         cursor.execute('''
-                            INSERT OR REPLACE INTO message_references (post_id, message_id, channel_id, user_id)
-                            VALUES (?, ?, ?, ?)
-                        ''', (post_id, sent_message.id, channel.id, interaction.user.id))
+                            INSERT OR REPLACE INTO message_references (post_id, message_id, channel_id, user_id, webhook_id)
+                            VALUES (?, ?, ?, ?, ?)
+                        ''', (post_id, sent_message.id, channel.id, interaction.user.id, webhook_id))
                         conn.commit()
                 
                 # 公開投稿の場合のみ完了メッセージを送信（非公開は既に送信済み）
@@ -634,6 +519,7 @@ class Post(commands.Cog):
                 
             except Exception as e:
                 logger.error(f"投稿中にエラーが発生しました: {e}", exc_info=True)
+                discard_undelivered()
                 error_message = f"❌ 投稿中にエラーが発生しました。\n詳細: {str(e)}"
                 await interaction.followup.send(
                     error_message,
@@ -0,0 +1,40 @@
+"""投稿者プロフィールのキャッシュを最新に保つCog"""
+
+import logging
+
+import discord
+from discord.ext import commands
+
+from utils.profiles import profile_cache
+
+# ロガーの設定
+logger = logging.getLogger(__name__)
+
+
+class Profiles(commands.Cog):
+    """インタラクションやメンバー更新イベントからプロフィールを記録するCog"""
+
+    def __init__(self, bot: commands.Bot) -> None:
+        self.bot = bot
+
+    @commands.Cog.listener()
+    async def on_interaction(self, interaction: discord.Interaction) -> None:
+        """コマンドを使ったユーザーの表示情報を記録します"""
+        profile_cache.remember(interaction.user)
+
+    @commands.Cog.listener()
+    async def on_member_update(self, before: discord.Member, after: discord.Member) -> None:
+        """ニックネームやサーバーアイコンの変更を記録します"""
+        if before.display_name != after.display_name or before.display_avatar != after.display_avatar:
+            profile_cache.remember(after)
+
+    @commands.Cog.listener()
+    async def on_user_update(self, before: discord.User, after: discord.User) -> None:
+        """ユーザー名やアイコンの変更を記録します"""
+        if str(before) != str(after) or before.display_avatar != after.display_avatar:
+            profile_cache.remember(after)
+
+
+async def setup(bot: commands.Bot) -> None:
+    """Cogをボットに追加"""
+    await bot.add_cog(Profiles(bot))
@@ -2,30 +2,117 @@ import sqlite3
 import discord
 from discord.ext import commands
 from discord import app_commands
+import asyncio
 import logging
 import os
+import threading
 from dotenv import load_dotenv
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Dict, List, Optional, Tuple, Union
+
+from config import BACKUP_INTERVAL_HOURS, BACKUP_KEEP_DAILY, BACKUP_KEEP_MONTHLY, BACKUP_KEEP_WEEKLY
+from utils.backup import (
+    BACKUP_DIR,
+    backup_database,
+    create_backup,
+    is_backup_file,
+    load_manifest,
+    prune_backups,
+    restore_database,
+    verify_backup,
+)
+from utils.budget import RequestBudget
+from utils.coalesce import edit_coalescer
+from utils.footer import encode_footer
+from utils.idempotency import recent_posts
+from utils.jobs import job_manager
+from utils.post_index import recent_post_index
+from utils.profiles import profile_cache
+from utils.progress import ProgressReporter
 
 logger = logging.getLogger(__name__)
 
+# 参照の確認で1回に読み込む件数
+VERIFY_PAGE_SIZE = 500
+# 同時に確認するメッセージ数
+VERIFY_CONCURRENCY = 8
+# 確認に使う1秒あたりのAPI呼び出し数
+VERIFY_RATE = 10.0
+# channel.history() が1回のAPI呼び出しで返すメッセージ数
+HISTORY_PAGE_SIZE = 100
+# 孤立データを1回の DELETE で削除する件数
+CLEANUP_CHUNK_SIZE = 500
+# 定期バックアップが必要かを確認する間隔（秒）
+BACKUP_CHECK_INTERVAL = 600
+# バックアップの種類ごとの表示
+BACKUP_KIND_LABELS = {'manual': '手動', 'scheduled': '定期'}
+
 class MessageRestore(commands.Cog):
     """メッセージ復元用Cog"""
     
     def __init__(self, bot):
         self.bot = bot
         self.db_path = os.getenv('DB_PATH', 'thoughts.db')
+        # 手動・定期のバックアップと復元を同時に行わない
+        self._backup_lock = asyncio.Lock()
+        self._backup_task: Optional[asyncio.Task] = None
+    
+    async def cog_load(self) -> None:
+        if BACKUP_INTERVAL_HOURS > 0:
+            self._backup_task = asyncio.create_task(self._backup_worker())
+    
+    async def cog_unload(self) -> None:
+        if self._backup_task is not None:
+            self._backup_task.cancel()
+    
+    async def _backup_worker(self) -> None:
+        """BACKUP_INTERVAL_HOURS ごとにバックアップを取り、古い定期バックアップを削除します"""
+        await self.bot.wait_until_ready()
+        interval = timedelta(hours=BACKUP_INTERVAL_HOURS)
+        while True:
+            try:
+                # 再起動しても間隔が保たれるよう、最後の定期バックアップの時刻で判定する
+                scheduled = [e for e in load_manifest() if e.get('kind') == 'scheduled']
+                last = max((datetime.fromisoformat(e['created_at']) for e in scheduled), default=None)
+                if (last is None or datetime.now() - last >= interval) and not self._backup_lock.locked():
+                    await self._scheduled_backup()
+            except Exception as e:
+                logger.error(f"定期バックアップに失敗しました: {e}", exc_info=True)
+            await asyncio.sleep(BACKUP_CHECK_INTERVAL)
+    
+    async def _scheduled_backup(self) -> None:
+        """定期バックアップを1回取ります"""
+        async with self._backup_lock:
+            entry = await asyncio.to_thread(create_backup, self.db_path, kind='scheduled')
+            removed = await asyncio.to_thread(
+                prune_backups, BACKUP_KEEP_DAILY, BACKUP_KEEP_WEEKLY, BACKUP_KEEP_MONTHLY
+            )
+        logger.info(
+            f"定期バックアップを作成しました: {entry['filename']} "
+            f"({entry['original_size']} → {entry['size']} bytes)"
+        )
+        if removed:
+            logger.info(f"古い定期バックアップを削除しました: {', '.join(removed)}")
     
     @app_commands.command(name="restore_messages", description="古いメッセージ参照を整理します")
     @app_commands.default_permissions(administrator=True)
     @app_commands.checks.has_permissions(administrator=True)
     @app_commands.describe(
         message_id="対象のメッセージID（省略可）",
-        action="アクション（check/delete/resend、省略可）"
+        action="アクション（check/delete/resend、省略可。message_idを省略してscanを指定すると履歴の走査で確認）"
     )
     async def restore_messages(self, interaction: discord.Interaction, message_id: Optional[str] = None, action: Optional[str] = None):
         """古いメッセージ参照を整理します"""
+        if not (message_id and action):
+            # すべての参照の確認は時間がかかるため、バックグラウンドジョブとして実行する
+            await job_manager.submit(
+                interaction,
+                'restore_messages',
+                lambda job: self._restore_all_references(job, action),
+                {'action': action}
+            )
+            return
+        
         try:
             await interaction.response.defer(ephemeral=True)
             
@@ -38,7 +125,7 @@ class MessageRestore(commands.Cog):
                         SELECT mr.post_id, mr.message_id, mr.channel_id, t.content, t.category, t.is_anonymous, t.is_private, t.user_id
                         FROM message_references mr
                         JOIN thoughts t ON mr.post_id = t.id
-                        WHERE CAST(mr.message_id AS TEXT) = ?
+                        WHERE CAST(mr.message_id AS TEXT) = ? AND t.deleted_at IS NULL
                     """, (str(message_id),))
                     
                     ref = cursor.fetchone()
@@ -100,9 +187,9 @@ class MessageRestore(commands.Cog):
                     elif action == "resend":
                         # メッセージを再送信
                         try:
-                            # 投稿者情報を取得
-                            member = await interaction.guild.fetch_member(user_id)
-                            display_name = member.display_name if member else f"ユーザー{user_id}"
+                            # 投稿者情報を取得（プロフィールキャッシュを優先）
+                            profile = await profile_cache.resolve(self.bot, user_id)
+                            display_name = profile.display_name if profile else f"ユーザー{user_id}"
                             
                             # 埋め込みメッセージを作成
                             embed = discord.Embed(
@@ -116,11 +203,11 @@ class MessageRestore(commands.Cog):
                             else:
                                 embed.set_author(
                                     name=display_name,
-                                    icon_url=member.display_avatar.url if member else None
+                                    icon_url=profile.avatar_url if profile else None
                                 )
                             
                             # フッターにカテゴリーと投稿IDを表示
-                            embed.set_footer(text=f'カテゴリー: {category or "未設定"} | ID: {post_id}')
+                            embed.set_footer(text=encode_footer(post_id, category))
                             
                             # チャンネルに送信
                             channel = await interaction.guild.fetch_channel(int(channel_id))
@@ -129,7 +216,7 @@ class MessageRestore(commands.Cog):
                             # 新しいメッセージ参照を更新
                             cursor.execute("""
                                 UPDATE message_references 
-                                SET message_id = ?
+                                SET message_id = ?, webhook_id = NULL
                                 WHERE post_id = ?
                             """, (str(new_message.id), post_id))
                             
@@ -155,92 +242,6 @@ class MessageRestore(commands.Cog):
                             f"⚠️ 不正なアクションです。使用可能なアクション: check, delete, resend",
                             ephemeral=True
                         )
-                else:
-                    # すべてのメッセージ参照をチェック（パフォーマンス対策）
-                    cursor.execute("""
-                        SELECT COUNT(*) FROM message_references
-                    """)
-                    total_refs = cursor.fetchone()[0]
-                    
-                    # 大量データの場合は警告
-                    if total_refs > 1000:
-                        await interaction.followup.send(
-                            f"⚠️ {total_refs}件のメッセージ参照があります。\n"
-                            f"処理に時間がかかる場合があります。\n"
-                            f"個別に確認する場合は /restore_messages <message_id> check を使用してください。",
-                            ephemeral=True
-                        )
-                        return
-                    
-                    cursor.execute("""
-                        SELECT mr.post_id, mr.message_id, mr.channel_id, t.created_at
-                        FROM message_references mr
-                        JOIN thoughts t ON mr.post_id = t.id
-                        ORDER BY t.created_at DESC
-                        LIMIT 500
-                    """)
-                    
-                    all_refs = cursor.fetchall()
-                    
-                    if not all_refs:
-                        await interaction.followup.send("✅ メッセージ参照はありません。")
-                        return
-                    
-                    # 無効なメッセージ参照をチェック
-                    invalid_refs = []
-                    valid_refs = []
-                    
-                    for ref in all_refs:
-                        post_id, message_id, channel_id, created_at = ref
-                        
-                        try:
-                            # チャンネルを取得してメッセージが存在するか確認
-                            channel = await interaction.guild.fetch_channel(int(channel_id))
-                            await channel.fetch_message(int(message_id))
-                            valid_refs.append(ref)
-                        except (discord.NotFound, discord.Forbidden, discord.HTTPException):
-                            # メッセージが見つからないかアクセスできない
-                            invalid_refs.append(ref)
-                        except Exception as e:
-                            logger.warning(f"メッセージ確認中にエラー: {e}")
-                            invalid_refs.append(ref)
-                    
-                    # 無効な参照を削除
-                    if invalid_refs:
-                        invalid_post_ids = [ref[0] for ref in invalid_refs]
-                        placeholders = ','.join(['?'] * len(invalid_post_ids))
-                        cursor.execute(f"""
-                            DELETE FROM message_references 
-                            WHERE post_id IN ({placeholders})
-                        """, invalid_post_ids)
-                        
-                        conn.commit()
-                        
-                        await interaction.followup.send(
-                            f"✅ {len(invalid_refs)}件の無効なメッセージ参照を削除しました。\n"
-                            f"📊 有効な参照: {len(valid_refs)}件\n"
-                            f"🗑️ 削除された参照: {len(invalid_refs)}件\n\n"
-                            f"💡 個別に操作するには:\n"
-                            f"/restore_messages <message_id> check - メッセージを確認\n"
-                            f"/restore_messages <message_id> delete - 参照を削除\n"
-                            f"/restore_messages <message_id> resend - メッセージを再送信",
-                            ephemeral=True
-                        )
-                        
-                        # 詳細を表示（最大10件）
-                        if len(invalid_refs) <= 10:
-                            details = "\n".join([f"• 投稿ID: {ref[0]} (チャンネル: {ref[2]})" for ref in invalid_refs[:10]])
-                            await interaction.followup.send(f"削除された参照:\n{details}", ephemeral=True)
-                    else:
-                        await interaction.followup.send(
-                            f"✅ すべてのメッセージ参照は有効です。（{len(valid_refs)}件）\n\n"
-                            f"💡 個別に操作するには:\n"
-                            f"/restore_messages <message_id> check - メッセージを確認\n"
-                            f"/restore_messages <message_id> delete - 参照を削除\n"
-                            f"/restore_messages <message_id> resend - メッセージを再送信",
-                            ephemeral=True
-                        )
-                
         except Exception as e:
             logger.error(f"メッセージ整理中にエラーが発生しました: {e}", exc_info=True)
             await interaction.followup.send(
@@ -248,50 +249,375 @@ class MessageRestore(commands.Cog):
                 ephemeral=True
             )
 
+    async def _restore_all_references(self, interaction: discord.Interaction, action: Optional[str]) -> None:
+        """すべてのメッセージ参照を確認し、無効な参照を削除します（ジョブとして実行）"""
+        with sqlite3.connect(self.db_path) as conn:
+            if action == "scan":
+                # チャンネルの履歴を走査してまとめて確認する
+                await self._scan_all_references(interaction, conn)
+            else:
+                # すべてのメッセージ参照をページごとに並行して確認する
+                await self._verify_all_references(interaction, conn)
+
+    async def _resolve_channel(self, channel_id: int, budget: RequestBudget) -> Union[discord.abc.GuildChannel, discord.Thread]:
+        """チャンネルを取得します（キャッシュにない場合だけAPIを呼びます）"""
+        channel = self.bot.get_channel(channel_id)
+        if channel is not None:
+            return channel
+        async with budget:
+            return await self.bot.fetch_channel(channel_id)
+
+    async def _verify_all_references(self, interaction: discord.Interaction, conn: sqlite3.Connection) -> None:
+        """すべてのメッセージ参照を確認し、メッセージが存在しない参照をまとめて削除します
+
+        参照は post_id 順にページ単位で読み込み、チャンネルはそれぞれ1回だけ取得します。
+        メッセージの確認は同時実行数と1秒あたりの呼び出し数を制限して並行に行います。
+        メッセージ（またはチャンネル）が見つからない場合だけ無効とし、
+        権限不足や一時的なエラーは削除しません。
+        """
+        cursor = conn.cursor()
+        cursor.execute('SELECT COUNT(*) FROM message_references')
+        total_refs = cursor.fetchone()[0]
+        if total_refs == 0:
+            await interaction.followup.send("✅ メッセージ参照はありません。", ephemeral=True)
+            return
+        
+        budget = RequestBudget(rate=VERIFY_RATE, burst=VERIFY_CONCURRENCY)
+        semaphore = asyncio.Semaphore(VERIFY_CONCURRENCY)
+        # channel_id -> チャンネル（None: 存在しない、False: 取得できない）
+        channels: Dict[int, object] = {}
+        invalid_refs: List[Tuple[int, str]] = []
+        invalid_details: List[str] = []
+        valid_count = 0
+        error_count = 0
+        last_post_id = 0
+        
+        progress = ProgressReporter("🔍 メッセージ参照を確認しています", total=total_refs)
+        progress.detail = lambda: [
+            f"✅ 有効: {valid_count}件 / 🗑️ 無効: {len(invalid_refs)}件 / ⚠️ 確認できず: {error_count}件",
+            f"📡 API呼び出し: {budget.used}回"
+        ]
+        await progress.start(interaction)
+        
+        async def check(post_id: int, message_id: str, channel_id: str) -> str:
+            channel = channels[int(channel_id)]
+            if channel is None:
+                return 'invalid'
+            if channel is False:
+                return 'error'
+            async with semaphore:
+                try:
+                    async with budget:
+                        await channel.fetch_message(int(message_id))
+                    return 'valid'
+                except discord.NotFound:
+                    return 'invalid'
+                except discord.HTTPException as e:
+                    logger.warning(f"メッセージ確認中にエラー: message_id={message_id}, error={e}")
+                    progress.add_error(f"メッセージ {message_id}: {e.status} {e.text}".strip())
+                    return 'error'
+        
+        while True:
+            cursor.execute('''
+                SELECT post_id, message_id, channel_id
+                FROM message_references
+                WHERE post_id > ?
+                ORDER BY post_id
+                LIMIT ?
+            ''', (last_post_id, VERIFY_PAGE_SIZE))
+            page = cursor.fetchall()
+            if not page:
+                break
+            last_post_id = page[-1][0]
+            
+            # このページで初めて出てきたチャンネルを取得する
+            for channel_id in {int(row[2]) for row in page} - channels.keys():
+                try:
+                    channels[channel_id] = await self._resolve_channel(channel_id, budget)
+                except discord.NotFound:
+                    channels[channel_id] = None
+                except discord.HTTPException as e:
+                    logger.warning(f"チャンネルの取得に失敗しました: channel_id={channel_id}, error={e}")
+                    progress.add_error(f"チャンネル {channel_id}: {e.status} {e.text}".strip())
+                    channels[channel_id] = False
+            
+            results = await asyncio.gather(*(check(*row) for row in page))
+            for row, result in zip(page, results):
+                if result == 'valid':
+                    valid_count += 1
+                elif result == 'invalid':
+                    invalid_refs.append((row[0], str(row[1])))
+                    invalid_details.append(f"• 投稿ID: {row[0]} (チャンネル: {row[2]})")
+                else:
+                    error_count += 1
+            progress.advance(len(page))
+            await progress.update()
+        
+        self._delete_invalid_references(conn, invalid_refs)
+        await self._report_verification(interaction, progress, valid_count, invalid_details, error_count, budget)
+
+    def _delete_invalid_references(self, conn: sqlite3.Connection, invalid_refs: List[Tuple[int, str]]) -> None:
+        """無効な参照を1回の DELETE でまとめて削除します
+
+        確認中に再送信などで参照が差し替えられていることがあるため、
+        (post_id, message_id) が確認時のまま残っている参照だけを短い書き込みトランザクションで削除します。
+        """
+        if not invalid_refs:
+            return
+        cursor = conn.cursor()
+        cursor.execute('DROP TABLE IF EXISTS temp.invalid_refs')
+        cursor.execute('CREATE TEMP TABLE invalid_refs (post_id INTEGER NOT NULL, message_id TEXT NOT NULL, PRIMARY KEY (post_id, message_id))')
+        cursor.executemany('INSERT OR IGNORE INTO invalid_refs (post_id, message_id) VALUES (?, ?)', invalid_refs)
+        conn.commit()
+        
+        cursor.execute('BEGIN IMMEDIATE')
+        try:
+            cursor.execute('''
+                DELETE FROM message_references
+                WHERE EXISTS (
+                    SELECT 1 FROM invalid_refs i
+                    WHERE i.post_id = message_references.post_id
+                      AND i.message_id = CAST(message_references.message_id AS TEXT)
+                )
+            ''')
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    async def _report_verification(
+        self,
+        interaction: discord.Interaction,
+        progress: ProgressReporter,
+        valid_count: int,
+        invalid_details: List[str],
+        error_count: int,
+        budget: RequestBudget
+    ) -> None:
+        """参照の確認結果を進捗メッセージに表示します"""
+        invalid_count = len(invalid_details)
+        logger.info(f"メッセージ参照の確認が完了しました: 有効{valid_count}件, 無効{invalid_count}件, エラー{error_count}件, API{budget.used}回")
+        
+        summary = (
+            f"📊 有効な参照: {valid_count}件\n"
+            f"🗑️ 削除された参照: {invalid_count}件\n"
+            f"⚠️ 確認できなかった参照: {error_count}件\n"
+            f"📡 API呼び出し: {budget.used}回\n\n"
+            f"💡 個別に操作するには:\n"
+            f"/restore_messages <message_id> check - メッセージを確認\n"
+            f"/restore_messages <message_id> delete - 参照を削除\n"
+            f"/restore_messages <message_id> resend - メッセージを再送信"
+        )
+        if invalid_count:
+            await progress.finish(f"✅ {invalid_count}件の無効なメッセージ参照を削除しました。\n" + summary)
+            # 詳細を表示（最大10件）
+            if invalid_count <= 10:
+                await interaction.followup.send("削除された参照:\n" + "\n".join(invalid_details), ephemeral=True)
+        else:
+            await progress.finish(f"✅ 無効なメッセージ参照はありません。\n" + summary)
+
+    async def _scan_channel_history(
+        self,
+        conn: sqlite3.Connection,
+        channel: Union[discord.abc.Messageable, discord.Thread],
+        min_id: int,
+        max_id: int,
+        budget: RequestBudget
+    ) -> int:
+        """参照されている範囲のチャンネル履歴を走査し、存在するメッセージIDを seen_messages に記録します
+
+        Returns:
+            int: 走査したメッセージ数
+        """
+        seen = 0
+        batch: List[Tuple[str]] = []
+        await budget.acquire()
+        async for message in channel.history(
+            limit=None,
+            after=discord.Object(id=min_id - 1),
+            before=discord.Object(id=max_id + 1),
+            oldest_first=True
+        ):
+            batch.append((str(message.id),))
+            seen += 1
+            if seen % HISTORY_PAGE_SIZE == 0:
+                conn.executemany('INSERT OR IGNORE INTO seen_messages (message_id) VALUES (?)', batch)
+                # 走査中にトランザクションを開いたままにしない
+                conn.commit()
+                batch.clear()
+                # 次のページの取得分
+                await budget.acquire()
+        if batch:
+            conn.executemany('INSERT OR IGNORE INTO seen_messages (message_id) VALUES (?)', batch)
+            conn.commit()
+        return seen
+
+    async def _find_missing_by_history(
+        self,
+        conn: sqlite3.Connection,
+        budget: RequestBudget,
+        progress: Optional[ProgressReporter] = None
+    ) -> Tuple[List[Tuple[int, str]], int, int]:
+        """チャンネルの履歴を走査し、存在しないメッセージへの参照を探します
+
+        message_fetch をメッセージごとに呼ぶ代わりに、参照されている範囲の履歴を
+        チャンネル（スレッド）ごとに1回ずつ100件単位で読み込み、見つかったメッセージIDを
+        一時テーブル seen_messages に記録してから SQL で message_references と突き合わせます。
+        チャンネル自体が存在しない場合はそのチャンネルの参照をすべて無効とし、
+        権限不足などで走査できなかったチャンネルの参照は判定しません。
+        走査は数分かかることがあるため、一時テーブルへの書き込みはその都度コミットし、
+        WAL の読み取りスナップショットを走査中に保持しないようにしています。
+
+        Returns:
+            Tuple[List[Tuple[int, str, str]], int, int]:
+                無効な参照の (post_id, channel_id, message_id)、走査できなかった参照数、走査したメッセージ数
+        """
+        cursor = conn.cursor()
+        cursor.execute('DROP TABLE IF EXISTS temp.seen_messages')
+        cursor.execute('DROP TABLE IF EXISTS temp.scanned_channels')
+        cursor.execute('CREATE TEMP TABLE seen_messages (message_id TEXT PRIMARY KEY)')
+        cursor.execute('''
+            CREATE TEMP TABLE scanned_channels (
+                channel_id TEXT PRIMARY KEY,
+                missing INTEGER NOT NULL,
+                min_id INTEGER NOT NULL,
+                max_id INTEGER NOT NULL
+            )
+        ''')
+        conn.commit()
+        
+        cursor.execute('''
+            SELECT CAST(channel_id AS TEXT),
+                   MIN(CAST(message_id AS INTEGER)),
+                   MAX(CAST(message_id AS INTEGER)),
+                   COUNT(*)
+            FROM message_references
+            GROUP BY CAST(channel_id AS TEXT)
+        ''')
+        ranges = cursor.fetchall()
+        
+        semaphore = asyncio.Semaphore(VERIFY_CONCURRENCY)
+        failed_refs = 0
+        scanned_messages = 0
+        
+        async def scan(channel_id: str, min_id: int, max_id: int, ref_count: int) -> None:
+            nonlocal failed_refs, scanned_messages
+            async with semaphore:
+                try:
+                    channel = await self._resolve_channel(int(channel_id), budget)
+                    scanned_messages += await self._scan_channel_history(conn, channel, min_id, max_id, budget)
+                    conn.execute('INSERT INTO scanned_channels (channel_id, missing, min_id, max_id) VALUES (?, 0, ?, ?)', (channel_id, min_id, max_id))
+                    conn.commit()
+                except discord.NotFound:
+                    conn.execute('INSERT INTO scanned_channels (channel_id, missing, min_id, max_id) VALUES (?, 1, ?, ?)', (channel_id, min_id, max_id))
+                    conn.commit()
+                except discord.HTTPException as e:
+                    logger.warning(f"チャンネル履歴の走査に失敗しました: channel_id={channel_id}, error={e}")
+                    failed_refs += ref_count
+                    if progress is not None:
+                        progress.add_error(f"チャンネル {channel_id}: {e.status} {e.text}".strip())
+            if progress is not None:
+                progress.advance()
+        
+        if progress is not None:
+            progress.total = len(ranges)
+            progress.detail = lambda: [
+                f"📨 走査したメッセージ: {scanned_messages}件 / 📡 API呼び出し: {budget.used}回"
+            ]
+            async with progress:
+                await asyncio.gather(*(scan(*row) for row in ranges))
+        else:
+            await asyncio.gather(*(scan(*row) for row in ranges))
+        
+        # 走査中に追加・差し替えられた参照は走査した範囲の外にあるので判定しない
+        cursor.execute('''
+            SELECT mr.post_id, CAST(mr.channel_id AS TEXT), CAST(mr.message_id AS TEXT)
+            FROM message_references mr
+            JOIN scanned_channels sc ON sc.channel_id = CAST(mr.channel_id AS TEXT)
+            LEFT JOIN seen_messages s ON s.message_id = CAST(mr.message_id AS TEXT)
+            WHERE sc.missing = 1
+               OR (s.message_id IS NULL AND CAST(mr.message_id AS INTEGER) BETWEEN sc.min_id AND sc.max_id)
+            ORDER BY mr.post_id
+        ''')
+        missing = cursor.fetchall()
+        cursor.execute('DELETE FROM seen_messages')
+        conn.commit()
+        return missing, failed_refs, scanned_messages
+
+    async def _scan_all_references(self, interaction: discord.Interaction, conn: sqlite3.Connection) -> None:
+        """チャンネル履歴の走査ですべてのメッセージ参照を確認し、無効な参照をまとめて削除します"""
+        cursor = conn.cursor()
+        cursor.execute('SELECT COUNT(*) FROM message_references')
+        total_refs = cursor.fetchone()[0]
+        if total_refs == 0:
+            await interaction.followup.send("✅ メッセージ参照はありません。", ephemeral=True)
+            return
+        
+        progress = ProgressReporter(f"🔍 {total_refs}件のメッセージ参照をチャンネル履歴の走査で確認しています", unit="チャンネル")
+        await progress.start(interaction)
+        
+        budget = RequestBudget(rate=VERIFY_RATE, burst=VERIFY_CONCURRENCY)
+        missing, failed_refs, _ = await self._find_missing_by_history(conn, budget, progress)
+        
+        invalid_refs = [(post_id, message_id) for post_id, _, message_id in missing]
+        invalid_details = [f"• 投稿ID: {post_id} (チャンネル: {channel_id})" for post_id, channel_id, _ in missing]
+        self._delete_invalid_references(conn, invalid_refs)
+        valid_count = total_refs - len(missing) - failed_refs
+        await self._report_verification(interaction, progress, valid_count, invalid_details, failed_refs, budget)
+
     @app_commands.command(name="backup_database", description="データベースをバックアップします")
     @app_commands.default_permissions(administrator=True)
     @app_commands.checks.has_permissions(administrator=True)
     async def backup_database(self, interaction: discord.Interaction):
         """データベースをバックアップします"""
+        await job_manager.submit(
+            interaction,
+            'backup_database',
+            lambda job: self._backup_database(job)
+        )
+
+    async def _backup_database(self, interaction: discord.Interaction) -> None:
+        """データベースをバックアップします（ジョブとして実行）
+
+        コピーは別スレッドで少しずつ行い、その間もボットは応答を続けます。
+        """
+        progress = ProgressReporter("💾 データベースをバックアップしています", unit="ページ")
+        stage = 'copy'
+        progress.detail = lambda: ["🗜️ 圧縮しています..."] if stage == 'compress' else []
+        await progress.start(interaction)
+        stop = threading.Event()
+
+        def on_progress(remaining: int, total: int) -> None:
+            if stop.is_set():
+                raise RuntimeError("バックアップはキャンセルされました")
+            progress.total = total
+            progress.done = total - remaining
+
+        def on_stage(name: str) -> None:
+            nonlocal stage
+            stage = name
+
+        # データベースをコピーして圧縮
         try:
-            await interaction.response.defer(ephemeral=True)
-            
-            # バックアップファイル名を作成
-            timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-            backup_path = f"backup/thoughts_backup_{timestamp}.db"
-            
-            # バックアップディレクトリを作成
-            os.makedirs("backup", exist_ok=True)
-            
-            # データベースをコピー
-            with sqlite3.connect(self.db_path) as source:
-                with sqlite3.connect(backup_path) as backup:
-                    source.backup(backup)
-            
-            # バックアップ情報を記録
-            backup_info = {
-                'timestamp': timestamp,
-                'size': os.path.getsize(backup_path),
-                'original_size': os.path.getsize(self.db_path),
-                'readable_time': datetime.now().strftime("%Y年%m月%d日 %H:%M:%S")
-            }
-            
-            await interaction.followup.send(
-                f"✅ データベースをバックアップしました。\n"
-                f"📁 バックアップファイル: {backup_path}\n"
-                f"📊 サイズ: {backup_info['size']} bytes\n"
-                f"🕐 作成時刻: {backup_info['readable_time']}",
-                ephemeral=True
-            )
-            
-            logger.info(f"データベースをバックアップしました: {backup_path}")
-            
-        except Exception as e:
-            logger.error(f"バックアップ中にエラーが発生しました: {e}", exc_info=True)
-            await interaction.followup.send(
-                f"❌ バックアップに失敗しました: {e}",
-                ephemeral=True
-            )
+            async with self._backup_lock:
+                async with progress:
+                    entry = await asyncio.to_thread(
+                        create_backup, self.db_path, progress=on_progress, on_stage=on_stage
+                    )
+        except asyncio.CancelledError:
+            # コピー中のスレッドは次のステップで止める
+            stop.set()
+            raise
+        
+        await progress.finish(
+            f"✅ データベースをバックアップしました。\n"
+            f"📁 バックアップファイル: {BACKUP_DIR}/{entry['filename']}\n"
+            f"📊 サイズ: {entry['size']} bytes（圧縮前 {entry['original_size']} bytes）\n"
+            f"📝 投稿数: {entry['rows'].get('thoughts', 0)}件\n"
+            f"🕐 作成時刻: {datetime.fromisoformat(entry['created_at']).strftime('%Y年%m月%d日 %H:%M:%S')}"
+        )
+        
+        logger.info(f"データベースをバックアップしました: {entry['filename']}")
 
     @app_commands.command(name="list_backups", description="バックアップ一覧を表示します")
     @app_commands.default_permissions(administrator=True)
@@ -301,23 +627,30 @@ class MessageRestore(commands.Cog):
         try:
             await interaction.response.defer(ephemeral=True)
             
-            if not os.path.exists("backup"):
+            if not os.path.exists(BACKUP_DIR):
                 await interaction.followup.send(
                     "📁 バックアップはありません。",
                     ephemeral=True
                 )
                 return
             
-            # バックアップファイル一覧を取得
+            # バックアップファイル一覧を取得（マニフェストにあるものは記録した作成時刻と行数を使う）
+            manifest = {entry['filename']: entry for entry in load_manifest()}
             backup_files = []
-            for filename in os.listdir("backup"):
-                if filename.startswith("thoughts_backup_") and filename.endswith(".db"):
-                    filepath = os.path.join("backup", filename)
+            for filename in os.listdir(BACKUP_DIR):
+                if is_backup_file(filename):
+                    filepath = os.path.join(BACKUP_DIR, filename)
                     stat = os.stat(filepath)
+                    entry = manifest.get(filename, {})
                     backup_files.append({
                         'filename': filename,
                         'size': stat.st_size,
-                        'created': datetime.fromtimestamp(stat.st_ctime)
+                        'created': (
+                            datetime.fromisoformat(entry['created_at']) if entry
+                            else datetime.fromtimestamp(stat.st_ctime)
+                        ),
+                        'kind': entry.get('kind'),
+                        'posts': entry.get('rows', {}).get('thoughts')
                     })
             
             if not backup_files:
@@ -339,10 +672,15 @@ class MessageRestore(commands.Cog):
             for backup in backup_files[:10]:  # 最大10件表示
                 created_str = backup['created'].strftime("%Y-%m-%d %H:%M:%S")
                 size_mb = backup['size'] / (1024 * 1024)
+                value = f"作成: {created_str}\nサイズ: {size_mb:.2f} MB"
+                if backup['kind']:
+                    value += f"\n種類: {BACKUP_KIND_LABELS.get(backup['kind'], backup['kind'])}"
+                if backup['posts'] is not None:
+                    value += f" / 投稿数: {backup['posts']}件"
                 
                 embed.add_field(
                     name=f"📄 {backup['filename']}",
-                    value=f"作成: {created_str}\nサイズ: {size_mb:.2f} MB",
+                    value=value,
                     inline=False
                 )
             
@@ -364,144 +702,185 @@ class MessageRestore(commands.Cog):
     @app_commands.checks.has_permissions(administrator=True)
     async def restore_backup(self, interaction: discord.Interaction, backup_filename: str):
         """バックアップから復元します"""
-        try:
-            await interaction.response.defer(ephemeral=True)
-            
-            backup_path = os.path.join("backup", backup_filename)
-            
-            if not os.path.exists(backup_path):
-                await interaction.followup.send(
-                    f"❌ バックアップファイルが見つかりません: {backup_filename}",
-                    ephemeral=True
-                )
-                return
-            
-            # 現在のデータベースをバックアップ
-            current_backup = f"backup/current_backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}.db"
-            os.makedirs("backup", exist_ok=True)
-            
-            with sqlite3.connect(self.db_path) as source:
-                with sqlite3.connect(current_backup) as backup:
-                    source.backup(backup)
-            
-            # バックアップから復元
-            with sqlite3.connect(backup_path) as backup:
-                with sqlite3.connect(self.db_path) as target:
-                    backup.backup(target)
-            
+        await job_manager.submit(
+            interaction,
+            'restore_backup',
+            lambda job: self._restore_backup(job, backup_filename),
+            {'backup_filename': backup_filename},
+            exclusive=True
+        )
+
+    async def _restore_backup(self, interaction: discord.Interaction, backup_filename: str) -> None:
+        """バックアップから復元します（ジョブとして実行）
+
+        DB全体を置き換えるため、他のジョブや定期バックアップとは同時に実行しません。
+        復元後は古いDBの内容を覚えている各キャッシュを破棄します。
+        """
+        backup_path = os.path.join(BACKUP_DIR, backup_filename)
+        
+        if not os.path.exists(backup_path):
             await interaction.followup.send(
-                f"✅ バックアップから復元しました。\n"
-                f"📁 復元元: {backup_filename}\n"
-                f"💾 現在のバックアップ: {os.path.basename(current_backup)}",
+                f"❌ バックアップファイルが見つかりません: {backup_filename}",
                 ephemeral=True
             )
-            
-            logger.info(f"バックアップから復元しました: {backup_filename}")
-            
-        except Exception as e:
-            logger.error(f"バックアップ復元中にエラーが発生しました: {e}", exc_info=True)
+            return
+        
+        # 圧縮・転送中に壊れていないか確認する（マニフェストにないバックアップは確認しない）
+        if await asyncio.to_thread(verify_backup, backup_filename) is False:
             await interaction.followup.send(
-                f"❌ エラーが発生しました: {e}",
+                f"❌ バックアップファイルのチェックサムが一致しません: {backup_filename}\n"
+                f"ファイルが壊れている可能性があるため、復元を中止しました。",
                 ephemeral=True
             )
+            return
+        
+        async with self._backup_lock:
+            # 復元前の内容で上書きしないよう、集約待ちの編集は反映せずに捨てる
+            await edit_coalescer.reset()
+            
+            # 現在のデータベースをバックアップ
+            current_backup = f"{BACKUP_DIR}/current_backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}.db"
+            os.makedirs(BACKUP_DIR, exist_ok=True)
+            
+            await asyncio.to_thread(backup_database, self.db_path, current_backup)
+            
+            # バックアップから復元
+            await asyncio.to_thread(restore_database, backup_path, self.db_path)
+            
+            # 復元前のDBの投稿ID・内容を指しているキャッシュを破棄する
+            recent_post_index.clear()
+            recent_posts.clear()
+            profile_cache.clear()
+        
+        await interaction.followup.send(
+            f"✅ バックアップから復元しました。\n"
+            f"📁 復元元: {backup_filename}\n"
+            f"💾 現在のバックアップ: {os.path.basename(current_backup)}",
+            ephemeral=True
+        )
+        
+        logger.info(f"バックアップから復元しました: {backup_filename}")
 
     @app_commands.command(name="check_database", description="データベースの整合性をチェックします")
     @app_commands.default_permissions(administrator=True)
     @app_commands.checks.has_permissions(administrator=True)
-    async def check_database(self, interaction: discord.Interaction):
+    @app_commands.describe(
+        scan_history="チャンネル履歴を走査して、存在しないメッセージへの参照を数える（削除はしません）"
+    )
+    async def check_database(self, interaction: discord.Interaction, scan_history: bool = False):
         """データベースの整合性をチェックします"""
-        try:
-            await interaction.response.defer(ephemeral=True)
+        await job_manager.submit(
+            interaction,
+            'check_database',
+            lambda job: self._check_database(job, scan_history),
+            {'scan_history': scan_history}
+        )
+
+    async def _check_database(self, interaction: discord.Interaction, scan_history: bool) -> None:
+        """データベースの整合性をチェックします（ジョブとして実行）"""
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
             
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                
-                # データベースの基本情報を取得
-                cursor.execute('SELECT COUNT(*) FROM thoughts')
-                thoughts_count = cursor.fetchone()[0]
-                
-                cursor.execute('SELECT COUNT(*) FROM message_references')
-                refs_count = cursor.fetchone()[0]
-                
-                # 孤立したメッセージ参照を検出
-                cursor.execute("""
-                    SELECT COUNT(*)
-                    FROM message_references mr
-                    LEFT JOIN thoughts t ON mr.post_id = t.id
-                    WHERE t.id IS NULL
-                """)
-                orphaned_refs_count = cursor.fetchone()[0]
-                
-                # 参照されていない投稿を検出
-                cursor.execute("""
-                    SELECT COUNT(*)
-                    FROM thoughts t
-                    LEFT JOIN message_references mr ON t.id = mr.post_id
-                    WHERE mr.post_id IS NULL
-                """)
-                orphaned_posts_count = cursor.fetchone()[0]
-                
-                # データベースファイルのサイズを取得
-                db_size = os.path.getsize(self.db_path)
-                db_size_mb = db_size / (1024 * 1024)
-                
-                # 埋め込みを作成
-                embed = discord.Embed(
-                    title="🔍 データベース整合性チェック",
-                    color=discord.Color.blue()
+            # 存在しないメッセージへの参照をチャンネル履歴の走査で数える
+            missing_refs_count = None
+            if scan_history:
+                budget = RequestBudget(rate=VERIFY_RATE, burst=VERIFY_CONCURRENCY)
+                missing, failed_refs, _ = await self._find_missing_by_history(conn, budget)
+                missing_refs_count = len(missing)
+            
+            # データベースの基本情報を取得
+            # 削除済みの印が付いた投稿は後片付けを待っているだけなので数えない
+            cursor.execute('SELECT COUNT(*) FROM thoughts WHERE deleted_at IS NULL')
+            thoughts_count = cursor.fetchone()[0]
+            
+            cursor.execute('SELECT COUNT(*) FROM message_references')
+            refs_count = cursor.fetchone()[0]
+            
+            # 孤立したメッセージ参照を検出
+            cursor.execute("""
+                SELECT COUNT(*)
+                FROM message_references mr
+                LEFT JOIN thoughts t ON mr.post_id = t.id
+                WHERE t.id IS NULL
+            """)
+            orphaned_refs_count = cursor.fetchone()[0]
+            
+            # 参照されていない投稿を検出
+            cursor.execute("""
+                SELECT COUNT(*)
+                FROM thoughts t
+                LEFT JOIN message_references mr ON t.id = mr.post_id
+                WHERE mr.post_id IS NULL AND t.deleted_at IS NULL
+            """)
+            orphaned_posts_count = cursor.fetchone()[0]
+            
+            # データベースファイルのサイズを取得
+            db_size = os.path.getsize(self.db_path)
+            db_size_mb = db_size / (1024 * 1024)
+            
+            # 埋め込みを作成
+            embed = discord.Embed(
+                title="🔍 データベース整合性チェック",
+                color=discord.Color.blue()
+            )
+            
+            embed.add_field(
+                name="📊 基本情報",
+                value=f"📝 投稿数: {thoughts_count}\n"
+                      f"🔗 メッセージ参照数: {refs_count}\n"
+                      f"💾 データベースサイズ: {db_size_mb:.2f} MB",
+                inline=False
+            )
+            
+            # 問題の有無をチェック
+            issues = []
+            if orphaned_refs_count > 0:
+                issues.append(f"🗑️ 孤立したメッセージ参照: {orphaned_refs_count}件")
+            
+            if orphaned_posts_count > 0:
+                issues.append(f"📝 参照されていない投稿: {orphaned_posts_count}件")
+            
+            if missing_refs_count:
+                issues.append(f"🔗 存在しないメッセージへの参照: {missing_refs_count}件")
+            
+            if scan_history:
+                embed.add_field(
+                    name="📡 履歴の走査",
+                    value=f"存在しないメッセージへの参照: {missing_refs_count}件\n"
+                          f"走査できなかった参照: {failed_refs}件\n"
+                          f"API呼び出し: {budget.used}回",
+                    inline=False
                 )
-                
+            
+            if issues:
                 embed.add_field(
-                    name="📊 基本情報",
-                    value=f"📝 投稿数: {thoughts_count}\n"
-                          f"🔗 メッセージ参照数: {refs_count}\n"
-                          f"💾 データベースサイズ: {db_size_mb:.2f} MB",
+                    name="⚠️ 検出された問題",
+                    value="\n".join(issues),
                     inline=False
                 )
+                embed.color = discord.Color.orange()
                 
-                # 問題の有無をチェック
-                issues = []
-                if orphaned_refs_count > 0:
-                    issues.append(f"🗑️ 孤立したメッセージ参照: {orphaned_refs_count}件")
-                
-                if orphaned_posts_count > 0:
-                    issues.append(f"📝 参照されていない投稿: {orphaned_posts_count}件")
-                
-                if issues:
-                    embed.add_field(
-                        name="⚠️ 検出された問題",
-                        value="\n".join(issues),
-                        inline=False
-                    )
-                    embed.color = discord.Color.orange()
-                    
-                    embed.add_field(
-                        name="🔧 推奨されるアクション",
-                        value="\n".join([
-                            "• /cleanup_orphaned - 孤立したデータをクリーンアップ",
-                            "• /backup_database - 現在の状態をバックアップ",
-                            "• /restore_messages - メッセージ参照を整理"
-                        ]),
-                        inline=False
-                    )
-                else:
-                    embed.add_field(
-                        name="✅ 状態",
-                        value="データベースは健全です。問題は検出されませんでした。",
-                        inline=False
-                    )
-                    embed.color = discord.Color.green()
-                
-                await interaction.followup.send(embed=embed, ephemeral=True)
-                
-                logger.info(f"データベース整合性チェック完了: 投稿{thoughts_count}件, 参照{refs_count}件, 問題{len(issues)}件")
-                
-        except Exception as e:
-            logger.error(f"データベースチェック中にエラーが発生しました: {e}", exc_info=True)
-            await interaction.followup.send(
-                f"❌ エラーが発生しました: {e}",
-                ephemeral=True
-            )
+                embed.add_field(
+                    name="🔧 推奨されるアクション",
+                    value="\n".join([
+                        "• /cleanup_orphaned - 孤立したデータをクリーンアップ",
+                        "• /backup_database - 現在の状態をバックアップ",
+                        "• /restore_messages - メッセージ参照を整理",
+                        "• /restore_messages action:scan - 履歴の走査でメッセージ参照を整理"
+                    ]),
+                    inline=False
+                )
+            else:
+                embed.add_field(
+                    name="✅ 状態",
+                    value="データベースは健全です。問題は検出されませんでした。",
+                    inline=False
+                )
+                embed.color = discord.Color.green()
+            
+            await interaction.followup.send(embed=embed, ephemeral=True)
+            
+            logger.info(f"データベース整合性チェック完了: 投稿{thoughts_count}件, 参照{refs_count}件, 問題{len(issues)}件")
 
     @app_commands.command(name="cleanup_orphaned", description="孤立した参照をクリーンアップします")
     @app_commands.default_permissions(administrator=True)
@@ -523,64 +902,69 @@ class MessageRestore(commands.Cog):
                 """)
                 orphaned_refs = cursor.fetchall()
                 
-                # 参照されていない投稿を検出
+                # 参照されていない投稿を検出（削除済みの印が付いた投稿は後片付けに任せる）
                 cursor.execute("""
                     SELECT t.id, t.content, t.created_at
                     FROM thoughts t
                     LEFT JOIN message_references mr ON t.id = mr.post_id
-                    WHERE mr.post_id IS NULL
+                    WHERE mr.post_id IS NULL AND t.deleted_at IS NULL
                 """)
                 orphaned_posts = cursor.fetchall()
                 
-                cleanup_count = 0
+                if not orphaned_refs and not orphaned_posts:
+                    await interaction.followup.send(
+                        "✅ 孤立したデータはありません。データベースはクリーンです。",
+                        ephemeral=True
+                    )
+                    return
+                
+                progress = ProgressReporter("🧹 孤立したデータを削除しています", total=len(orphaned_refs) + len(orphaned_posts))
+                await progress.start(interaction)
                 
                 # 孤立したメッセージ参照を削除
-                if orphaned_refs:
-                    orphaned_post_ids = [ref[0] for ref in orphaned_refs]
-                    placeholders = ','.join(['?'] * len(orphaned_post_ids))
+                orphaned_ref_ids = [ref[0] for ref in orphaned_refs]
+                for i in range(0, len(orphaned_ref_ids), CLEANUP_CHUNK_SIZE):
+                    chunk = orphaned_ref_ids[i:i + CLEANUP_CHUNK_SIZE]
+                    placeholders = ','.join(['?'] * len(chunk))
                     cursor.execute(f"""
                         DELETE FROM message_references 
                         WHERE post_id IN ({placeholders})
-                    """, orphaned_post_ids)
-                    cleanup_count += len(orphaned_refs)
-                    
-                    await interaction.followup.send(
-                        f"🗑️ {len(orphaned_refs)}件の孤立したメッセージ参照を削除しました。\n"
-                        f"📊 削除された参照: {', '.join([str(ref[0]) for ref in orphaned_refs[:5]])}{'...' if len(orphaned_refs) > 5 else ''}",
-                        ephemeral=True
-                    )
+                    """, chunk)
+                    conn.commit()
+                    progress.advance(len(chunk))
+                    await progress.update()
                 
                 # 参照されていない投稿を削除
-                if orphaned_posts:
-                    orphaned_post_ids = [post[0] for post in orphaned_posts]
-                    placeholders = ','.join(['?'] * len(orphaned_post_ids))
+                orphaned_post_ids = [post[0] for post in orphaned_posts]
+                for i in range(0, len(orphaned_post_ids), CLEANUP_CHUNK_SIZE):
+                    chunk = orphaned_post_ids[i:i + CLEANUP_CHUNK_SIZE]
+                    placeholders = ','.join(['?'] * len(chunk))
                     cursor.execute(f"""
                         DELETE FROM thoughts 
-                        WHERE id IN ({placeholders})
-                    """, orphaned_post_ids)
-                    cleanup_count += len(orphaned_posts)
-                    
-                    await interaction.followup.send(
-                        f"🗑️ {len(orphaned_posts)}件の参照されていない投稿を削除しました。\n"
-                        f"📝 削除された投稿ID: {', '.join([str(post[0]) for post in orphaned_posts[:5]])}{'...' if len(orphaned_posts) > 5 else ''}",
-                        ephemeral=True
-                    )
+                        WHERE id IN ({placeholders}) AND deleted_at IS NULL
+                    """, chunk)
+                    conn.commit()
+                    progress.advance(len(chunk))
+                    await progress.update()
                 
-                if not orphaned_refs and not orphaned_posts:
-                    await interaction.followup.send(
-                        "✅ 孤立したデータはありません。データベースはクリーンです。",
-                        ephemeral=True
+                cleanup_count = len(orphaned_refs) + len(orphaned_posts)
+                lines = [
+                    f"✅ クリーンアップが完了しました。",
+                    f"🧹 合計 {cleanup_count}件の不要なデータを削除しました。"
+                ]
+                if orphaned_refs:
+                    lines.append(
+                        f"🗑️ 孤立したメッセージ参照: {len(orphaned_refs)}件 "
+                        f"({', '.join([str(ref[0]) for ref in orphaned_refs[:5]])}{'...' if len(orphaned_refs) > 5 else ''})"
                     )
-                
-                if cleanup_count > 0:
-                    conn.commit()
-                    await interaction.followup.send(
-                        f"✅ クリーンアップが完了しました。\n"
-                        f"🧹 合計 {cleanup_count}件の不要なデータを削除しました。",
-                        ephemeral=True
+                if orphaned_posts:
+                    lines.append(
+                        f"📝 参照されていない投稿: {len(orphaned_posts)}件 "
+                        f"({', '.join([str(post[0]) for post in orphaned_posts[:5]])}{'...' if len(orphaned_posts) > 5 else ''})"
                     )
-                    
-                    logger.info(f"クリーンアップ完了: {cleanup_count}件の不要なデータを削除")
+                await progress.finish("\n".join(lines))
+                
+                logger.info(f"クリーンアップ完了: {cleanup_count}件の不要なデータを削除")
                 
         except Exception as e:
             logger.error(f"クリーンアップ中にエラーが発生しました: {e}", exc_info=True)
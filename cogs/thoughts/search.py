@@ -96,8 +96,8 @@ class Search(commands.Cog, DatabaseMixin):
                         query += " AND t.user_id = ?"
                         params.append(int(user_id))
                     
-                    # 公開投稿のみ表示（プライベート投稿は非表示）
-                    query += " AND t.is_private = 0"
+                    # 公開投稿のみ表示（プライベート投稿・削除済みの投稿は非表示）
+                    query += " AND t.is_private = 0 AND t.deleted_at IS NULL"
                     
                     # ソートとリミット
                     query += " ORDER BY t.created_at DESC LIMIT ?"
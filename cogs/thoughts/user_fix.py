@@ -4,6 +4,7 @@ from discord import app_commands
 import sqlite3
 import logging
 from bot import DatabaseMixin
+from utils.post_index import recent_post_index
 
 logger = logging.getLogger(__name__)
 
@@ -37,6 +38,8 @@ class UserFix(commands.Cog, DatabaseMixin):
                     cursor.execute('UPDATE thoughts SET user_id = ? WHERE id = ?', (user.id, post_id))
                     
                     if cursor.rowcount > 0:
+                        # 投稿者が変わったので補完用インデックスを作り直させる
+                        recent_post_index.clear()
                         await interaction.followup.send(
                             f"✅ 投稿ID {post_id} の投稿者を {user.mention} に修正しました",
                             ephemeral=True
@@ -93,5 +96,26 @@ class UserFix(commands.Cog, DatabaseMixin):
             logger.error(f"user_id未設定投稿一覧エラー: {e}", exc_info=True)
             await interaction.followup.send(f"❌ エラー: {e}", ephemeral=True)
 
+    @app_commands.command(name="rebuild_user_stats", description="ユーザーごとの投稿数の集計を作り直します")
+    @app_commands.default_permissions(administrator=True)
+    @app_commands.checks.has_permissions(administrator=True)
+    async def rebuild_user_stats(self, interaction: discord.Interaction):
+        """トリガーを経由せずにデータが変更された場合に user_stats を作り直します"""
+        try:
+            await interaction.response.defer(ephemeral=True)
+            
+            with self._get_db_connection() as conn:
+                with self._get_cursor(conn) as cursor:
+                    cursor.execute('BEGIN')
+                    users = self._rebuild_user_stats(cursor)
+                    cursor.execute('COMMIT')
+            
+            await interaction.followup.send(f"✅ {users}人分の投稿数の集計を作り直しました", ephemeral=True)
+            logger.info(f"user_statsを再構築しました: {users}人")
+            
+        except Exception as e:
+            logger.error(f"集計の再構築エラー: {e}", exc_info=True)
+            await interaction.followup.send(f"❌ エラー: {e}", ephemeral=True)
+
 async def setup(bot: commands.Bot):
     await bot.add_cog(UserFix(bot))
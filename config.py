@@ -1,3 +1,5 @@
+import os
+
 # Default avatar for anonymous posts
 DEFAULT_AVATAR = "https://cdn.discordapp.com/attachments/958663922901217280/1457097821315399822/08350cafa4fabb8a6a1be2d9f18f2d88.png"
 
@@ -6,3 +8,15 @@ CHANNELS = {
     'public': 1457611087561101332,  # 公開用チャンネルのIDに置き換えてください
     'private': 1457611128225009666  # 非公開用チャンネルのIDに置き換えてください
 }
+
+# 公開投稿を Webhook 経由で配信する（投稿者名・アイコンで送信）
+WEBHOOK_DELIVERY = os.getenv('WEBHOOK_DELIVERY', '0').lower() in {'1', 'true', 'yes'}
+
+# 定期バックアップの間隔（時間、0 で無効）
+BACKUP_INTERVAL_HOURS = float(os.getenv('BACKUP_INTERVAL_HOURS', '24'))
+# 定期バックアップを残す数（直近の日ごと・週ごと・月ごとに1つずつ）
+BACKUP_KEEP_DAILY = int(os.getenv('BACKUP_KEEP_DAILY', '7'))
+BACKUP_KEEP_WEEKLY = int(os.getenv('BACKUP_KEEP_WEEKLY', '4'))
+BACKUP_KEEP_MONTHLY = int(os.getenv('BACKUP_KEEP_MONTHLY', '12'))
+# バックアップの圧縮形式（gzip / lzma / none）
+BACKUP_COMPRESSION = os.getenv('BACKUP_COMPRESSION', 'gzip').lower()
@@ -2,150 +2,357 @@
 """
 既存投稿の user_id を修復するスクリプト
 Discordメッセージから投稿者情報を取得してデータベースを更新
+
+使い方:
+    python repair_user_ids.py [--dry-run] [--db thoughts.db] [--mode auto|fetch|history]
+                              [--concurrency 8] [--rate 10] [--batch-size 500]
+
+修復対象をチャンネルごとにまとめ、チャンネルは1回だけ解決します。メッセージは
+同時実行数と1秒あたりの呼び出し数を制限して1件ずつ取得するか、対象が多い
+チャンネルでは履歴を100件ずつ走査して取得します。更新は batch-size 件ごとに
+1つのトランザクションでまとめて書き込みます。
+
+ボット（Webhook）が送信したメッセージの送信者は投稿者ではないため、フッターに
+投稿者ID（UID:）が残っている古い投稿だけを修復し、それ以外は修復不可として報告します。
 """
 
-import sqlite3
-import discord
+import argparse
 import asyncio
 import logging
-from typing import Optional
+import os
+import sqlite3
+import sys
+import time
+from collections import Counter
+from typing import Dict, List, Optional, Tuple, Union
+
+import discord
+
+from utils.budget import RequestBudget
+from utils.footer import decode_footer
 
 # ログ設定
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# メッセージを同時に取得する数
+FETCH_CONCURRENCY = 8
+# 1秒あたりの API 呼び出し数
+REQUEST_RATE = 10.0
+# 1回のトランザクションで更新する投稿数
+BATCH_SIZE = 500
+# 履歴の1ページあたりのメッセージ数（API 呼び出し1回分）
+HISTORY_PAGE_SIZE = 100
+# auto のとき、この件数以上の対象があるチャンネルは履歴を走査する
+HISTORY_THRESHOLD = 100
+# ドライランで表示する更新予定の件数
+DRY_RUN_SAMPLE = 20
+
+Channel = Union[discord.TextChannel, discord.Thread]
+
+
 class DatabaseRepair:
-    def __init__(self, db_path: str, bot_token: str):
+    def __init__(
+        self,
+        db_path: str,
+        bot_token: str,
+        dry_run: bool = False,
+        mode: str = 'auto',
+        concurrency: int = FETCH_CONCURRENCY,
+        rate: float = REQUEST_RATE,
+        batch_size: int = BATCH_SIZE,
+    ):
         self.db_path = db_path
         self.bot_token = bot_token
+        self.dry_run = dry_run
+        self.mode = mode
+        self.concurrency = concurrency
+        self.batch_size = batch_size
         self.bot = None
-        
+        self.budget = RequestBudget(rate=rate, burst=max(1, int(rate)))
+        self.stats: Counter = Counter()
+        self._pending: List[Tuple[int, int]] = []
+        self._planned: List[Tuple[int, int]] = []
+        self._conn: Optional[sqlite3.Connection] = None
+
     async def init_bot(self):
         """Discord Botを初期化"""
         intents = discord.Intents.default()
         intents.message_content = True
         intents.guilds = True
-        
+
         self.bot = discord.Client(intents=intents)
-        
+
     def get_db_connection(self):
-        """データベース接続を取得"""
-        conn = sqlite3.connect(self.db_path)
+        """データベース接続を取得（トランザクションは明示的に開始する）"""
+        conn = sqlite3.connect(self.db_path, isolation_level=None)
         conn.row_factory = sqlite3.Row
         return conn
-        
-    async def get_message_author(self, message_id: str, channel_id: str) -> Optional[int]:
-        """Discordメッセージから投稿者IDを取得"""
-        try:
-            channel = self.bot.get_channel(int(channel_id))
-            if not channel:
-                try:
-                    channel = await self.bot.fetch_channel(int(channel_id))
-                except discord.NotFound:
-                    logger.warning(f"チャンネルが見つかりません: {channel_id}")
-                    return None
-                except discord.Forbidden:
-                    logger.warning(f"チャンネルへのアクセス権限がありません: {channel_id}")
-                    return None
-            
-            message = await channel.fetch_message(int(message_id))
+
+    def load_targets(self, conn: sqlite3.Connection) -> Dict[int, Dict[int, int]]:
+        """修復対象を {チャンネルID: {メッセージID: 投稿ID}} にまとめて返します。"""
+        rows = conn.execute('''
+            SELECT t.id, mr.message_id, mr.channel_id
+            FROM thoughts t
+            LEFT JOIN message_references mr ON t.id = mr.post_id
+            WHERE t.user_id IS NULL OR t.user_id = 0 OR t.user_id = ''
+        ''')
+        targets: Dict[int, Dict[int, int]] = {}
+        for row in rows:
+            self.stats['targets'] += 1
+            if not row['message_id'] or not row['channel_id']:
+                logger.warning(f"投稿 {row['id']} のメッセージ参照がありません")
+                self.stats['no_reference'] += 1
+                continue
+            targets.setdefault(int(row['channel_id']), {})[int(row['message_id'])] = row['id']
+        return targets
+
+    @staticmethod
+    def resolve_author(message: discord.Message, post_id: int) -> Optional[int]:
+        """メッセージから投稿者IDを読み取ります（分からなければ None）。"""
+        if not message.author.bot and message.webhook_id is None:
             return message.author.id
-            
+        # ボットが代理で送信した投稿は、フッターに投稿者IDが残っている場合だけ分かる
+        for embed in message.embeds:
+            footer = decode_footer(embed.footer.text if embed.footer else None)
+            if footer is not None and footer.post_id == post_id and footer.user_id:
+                return footer.user_id
+        return None
+
+    def record(self, post_id: int, message: discord.Message) -> None:
+        """取得したメッセージの結果を記録し、たまったら書き込みます。"""
+        author_id = self.resolve_author(message, post_id)
+        if author_id is None:
+            logger.debug(f"投稿 {post_id} はボットが送信したメッセージのため投稿者が分かりません")
+            self.stats['bot_authored'] += 1
+            return
+        self.stats['resolved'] += 1
+        self._pending.append((author_id, post_id))
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        """たまった更新を1つのトランザクションで書き込みます。"""
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, []
+        if self.dry_run:
+            self._planned.extend(batch[:max(0, DRY_RUN_SAMPLE - len(self._planned))])
+            return
+        conn = self._conn
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            # 実行中にボット側で修正された投稿は上書きしない
+            cursor = conn.executemany('''
+                UPDATE thoughts SET user_id = ?
+                WHERE id = ? AND (user_id IS NULL OR user_id = 0 OR user_id = '')
+            ''', batch)
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        self.stats['updated'] += cursor.rowcount
+        self.stats['transactions'] += 1
+
+    async def resolve_channel(self, channel_id: int) -> Optional[Channel]:
+        """チャンネルを1回だけ解決します（キャッシュになければ API で取得）。"""
+        channel = self.bot.get_channel(channel_id)
+        if channel is not None:
+            return channel
+        try:
+            async with self.budget:
+                return await self.bot.fetch_channel(channel_id)
+        except discord.NotFound:
+            logger.warning(f"チャンネルが見つかりません: {channel_id}")
+        except discord.Forbidden:
+            logger.warning(f"チャンネルへのアクセス権限がありません: {channel_id}")
+        except discord.HTTPException as e:
+            logger.error(f"チャンネル取得エラー: {channel_id}: {e}")
+        return None
+
+    async def fetch_one(self, channel: Channel, message_id: int, post_id: int) -> None:
+        """メッセージを1件取得して結果を記録します。"""
+        try:
+            async with self.budget:
+                message = await channel.fetch_message(message_id)
         except discord.NotFound:
             logger.warning(f"メッセージが見つかりません: {message_id}")
-            return None
+            self.stats['not_found'] += 1
+            return
         except discord.Forbidden:
             logger.warning(f"メッセージへのアクセス権限がありません: {message_id}")
-            return None
-        except Exception as e:
-            logger.error(f"メッセージ取得エラー: {e}")
-            return None
-    
+            self.stats['forbidden'] += 1
+            return
+        except discord.HTTPException as e:
+            logger.error(f"メッセージ取得エラー: {message_id}: {e}")
+            self.stats['errors'] += 1
+            return
+        self.record(post_id, message)
+
+    async def scan_history(self, channel: Channel, targets: Dict[int, int]) -> None:
+        """対象メッセージの範囲の履歴を走査して結果を記録します。"""
+        remaining = dict(targets)
+        scanned = 0
+        try:
+            await self.budget.acquire()
+            async for message in channel.history(
+                limit=None,
+                after=discord.Object(id=min(remaining) - 1),
+                before=discord.Object(id=max(remaining) + 1),
+                oldest_first=True
+            ):
+                scanned += 1
+                if scanned % HISTORY_PAGE_SIZE == 0:
+                    await self.budget.acquire()
+                post_id = remaining.pop(message.id, None)
+                if post_id is not None:
+                    self.record(post_id, message)
+                    if not remaining:
+                        break
+        except discord.Forbidden:
+            logger.warning(f"チャンネルの履歴を読む権限がありません: {channel.id}")
+            self.stats['forbidden'] += len(remaining)
+            return
+        except discord.HTTPException as e:
+            logger.error(f"履歴の取得エラー: {channel.id}: {e}")
+            self.stats['errors'] += len(remaining)
+            return
+        self.stats['not_found'] += len(remaining)
+
+    async def _worker(self, queue: asyncio.Queue) -> None:
+        while True:
+            item = await queue.get()
+            try:
+                if item[0] == 'history':
+                    await self.scan_history(item[1], item[2])
+                else:
+                    await self.fetch_one(item[1], item[2], item[3])
+            finally:
+                queue.task_done()
+
     async def repair_user_ids(self):
         """user_idがNULLまたは0の投稿を修復"""
-        conn = self.get_db_connection()
-        cursor = conn.cursor()
-        
+        self._conn = conn = self.get_db_connection()
+        started = time.perf_counter()
         try:
-            # 修復が必要な投稿を取得
-            cursor.execute('''
-                SELECT t.id, t.user_id, mr.message_id, mr.channel_id
-                FROM thoughts t
-                LEFT JOIN message_references mr ON t.id = mr.post_id
-                WHERE t.user_id IS NULL OR t.user_id = 0 OR t.user_id = ''
-            ''')
-            
-            posts_to_repair = cursor.fetchall()
-            
-            if not posts_to_repair:
+            targets = self.load_targets(conn)
+            if not self.stats['targets']:
                 logger.info("修復が必要な投稿はありません")
                 return
-                
-            logger.info(f"修復対象投稿数: {len(posts_to_repair)}")
-            
-            repaired_count = 0
-            failed_count = 0
-            
-            for post in posts_to_repair:
-                post_id = post['id']
-                message_id = post['message_id']
-                channel_id = post['channel_id']
-                
-                if not message_id or not channel_id:
-                    logger.warning(f"投稿 {post_id} のメッセージ参照がありません")
-                    failed_count += 1
-                    continue
-                
-                logger.info(f"投稿 {post_id} の修復を試行中...")
-                
-                # Discordメッセージから投稿者を取得
-                author_id = await self.get_message_author(message_id, channel_id)
-                
-                if author_id:
-                    # データベースを更新
-                    cursor.execute(
-                        'UPDATE thoughts SET user_id = ? WHERE id = ?',
-                        (str(author_id), post_id)
+
+            logger.info(
+                f"修復対象投稿数: {self.stats['targets']} "
+                f"({len(targets)}チャンネル{'、ドライラン' if self.dry_run else ''})"
+            )
+
+            # チャンネルは1回ずつ並行して解決する
+            channel_ids = list(targets)
+            channels = await asyncio.gather(*(self.resolve_channel(cid) for cid in channel_ids))
+
+            queue: asyncio.Queue = asyncio.Queue(maxsize=self.concurrency * 4)
+            workers = [asyncio.create_task(self._worker(queue)) for _ in range(self.concurrency)]
+            try:
+                for channel_id, channel in zip(channel_ids, channels):
+                    messages = targets[channel_id]
+                    if channel is None:
+                        self.stats['channel_unavailable'] += len(messages)
+                        continue
+                    use_history = self.mode == 'history' or (
+                        self.mode == 'auto' and len(messages) >= HISTORY_THRESHOLD
                     )
-                    conn.commit()
-                    logger.info(f"投稿 {post_id} の user_id を {author_id} に修復しました")
-                    repaired_count += 1
-                else:
-                    logger.warning(f"投稿 {post_id} の修復に失敗しました")
-                    failed_count += 1
-            
-            logger.info(f"修復完了: 成功={repaired_count}, 失敗={failed_count}")
-            
-        except Exception as e:
-            logger.error(f"修復処理中にエラーが発生しました: {e}")
-            conn.rollback()
+                    if use_history:
+                        await queue.put(('history', channel, messages))
+                    else:
+                        for message_id, post_id in messages.items():
+                            await queue.put(('fetch', channel, message_id, post_id))
+                await queue.join()
+            finally:
+                for worker in workers:
+                    worker.cancel()
+                await asyncio.gather(*workers, return_exceptions=True)
+            self.flush()
         finally:
             conn.close()
-    
+            self._conn = None
+            self.report(time.perf_counter() - started)
+
+    def report(self, elapsed: float) -> None:
+        """結果と処理速度を表示します。"""
+        stats = self.stats
+        if self.dry_run:
+            for author_id, post_id in self._planned:
+                logger.info(f"[ドライラン] 投稿 {post_id} の user_id を {author_id} に修復します")
+            if stats['resolved'] > len(self._planned):
+                logger.info(f"[ドライラン] 他 {stats['resolved'] - len(self._planned)}件")
+        failed = sum(stats[key] for key in (
+            'no_reference', 'channel_unavailable', 'not_found', 'forbidden', 'errors', 'bot_authored'
+        ))
+        logger.info(
+            f"修復{'予定' if self.dry_run else '完了'}: "
+            f"成功={stats['resolved'] if self.dry_run else stats['updated']}, 失敗={failed} "
+            f"(参照なし={stats['no_reference']}, チャンネル取得不可={stats['channel_unavailable']}, "
+            f"メッセージなし={stats['not_found']}, 権限なし={stats['forbidden']}, "
+            f"投稿者不明={stats['bot_authored']}, エラー={stats['errors']})"
+        )
+        checked = stats['targets'] - stats['no_reference'] - stats['channel_unavailable']
+        logger.info(
+            f"処理時間: {elapsed:.1f}秒, {checked / elapsed if elapsed > 0 else 0.0:.1f}件/秒, "
+            f"API呼び出し: {self.budget.used}回, トランザクション: {stats['transactions']}回"
+        )
+
     async def run(self):
         """修復処理を実行"""
         await self.init_bot()
-        
+
         @self.bot.event
         async def on_ready():
             logger.info(f"Botがログインしました: {self.bot.user}")
-            await self.repair_user_ids()
-            await self.bot.close()
-        
+            try:
+                await self.repair_user_ids()
+            except Exception as e:
+                logger.error(f"修復処理中にエラーが発生しました: {e}")
+            finally:
+                await self.bot.close()
+
         await self.bot.start(self.bot_token)
 
-if __name__ == "__main__":
-    import os
+
+def main() -> int:
     from dotenv import load_dotenv
-    
+
     load_dotenv()
-    
-    db_path = os.getenv("DB_PATH", "database.db")
-    bot_token = os.getenv("DISCORD_BOT_TOKEN")
-    
+
+    parser = argparse.ArgumentParser(description='投稿の user_id の修復')
+    parser.add_argument('--db', default=os.getenv('DB_PATH', 'thoughts.db'), help='データベースファイル')
+    parser.add_argument('--dry-run', action='store_true', help='データベースを更新せずに結果だけを表示する')
+    parser.add_argument('--mode', choices=('auto', 'fetch', 'history'), default='auto',
+                        help=f'メッセージの取得方法（auto は対象が{HISTORY_THRESHOLD}件以上のチャンネルで履歴を走査）')
+    parser.add_argument('--concurrency', type=int, default=FETCH_CONCURRENCY, help='同時に取得する数')
+    parser.add_argument('--rate', type=float, default=REQUEST_RATE, help='1秒あたりの API 呼び出し数')
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='1回のトランザクションで更新する件数')
+    args = parser.parse_args()
+
+    # ボット本体と同じ環境変数を使う（以前の DISCORD_BOT_TOKEN も読む）
+    bot_token = os.getenv("DISCORD_TOKEN") or os.getenv("DISCORD_BOT_TOKEN")
     if not bot_token:
-        logger.error("DISCORD_BOT_TOKENが設定されていません")
-        exit(1)
-    
-    repair = DatabaseRepair(db_path, bot_token)
+        logger.error("DISCORD_TOKENが設定されていません")
+        return 1
+    if not os.path.exists(args.db):
+        logger.error(f"データベースが見つかりません: {args.db}")
+        return 1
+
+    repair = DatabaseRepair(
+        args.db,
+        bot_token,
+        dry_run=args.dry_run,
+        mode=args.mode,
+        concurrency=args.concurrency,
+        rate=args.rate,
+        batch_size=args.batch_size,
+    )
     asyncio.run(repair.run())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,140 @@
+"""バックアップ中の応答時間を計測するベンチマーク
+
+使い方:
+    python scripts/bench_backup.py [--size-mb 300] [--interval 0.02] [--pages 256] [--pause 0.005]
+
+指定した大きさの WAL モードの DB を作り、イベントループ上で投稿の保存と読み込みを
+一定間隔で繰り返しながらバックアップを取ります。以前の方式（イベントループ上で
+`source.backup(dest)` を1回で実行）と、utils.backup.backup_database を別スレッドで
+少しずつ実行する方式のそれぞれで、1回の処理の遅延（予定時刻から完了まで）を表示します。
+"""
+
+import argparse
+import asyncio
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from typing import List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import backup  # noqa: E402
+
+
+def create_database(path: str, size_mb: int) -> None:
+    """約 size_mb MB の thoughts テーブルを持つ DB を作ります。"""
+    conn = sqlite3.connect(path, isolation_level=None)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('''
+        CREATE TABLE thoughts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            content TEXT NOT NULL,
+            category TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            user_id INTEGER NOT NULL
+        )
+    ''')
+    # 1行あたり約 1KB の本文
+    rows = size_mb * 1024
+    conn.execute('''
+        WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < ?)
+        INSERT INTO thoughts (content, category, user_id)
+        SELECT hex(randomblob(500)), 'ベンチ', i % 1000 FROM n
+    ''', (rows,))
+    conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+    conn.close()
+
+
+async def interactions(path: str, interval: float, stop: asyncio.Event, latencies: List[float]) -> None:
+    """コマンドの処理を模して、イベントループ上で保存と読み込みを繰り返します。"""
+    conn = sqlite3.connect(path, isolation_level=None, timeout=30)
+    try:
+        scheduled = time.perf_counter()
+        while not stop.is_set():
+            scheduled += interval
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            conn.execute("INSERT INTO thoughts (content, category, user_id) VALUES ('ベンチ投稿', 'ベンチ', 1)")
+            conn.execute('SELECT id, content FROM thoughts ORDER BY id DESC LIMIT 10').fetchall()
+            latencies.append(time.perf_counter() - scheduled)
+            # 処理が遅れた分はまとめて取り戻さず、次の予定から数え直す
+            scheduled = max(scheduled, time.perf_counter() - interval)
+    finally:
+        conn.close()
+
+
+def blocking_backup(source_path: str, dest_path: str) -> None:
+    """以前の方式: 既定の引数で1回のステップでコピーします。"""
+    with sqlite3.connect(source_path) as source:
+        with sqlite3.connect(dest_path) as dest:
+            source.backup(dest)
+
+
+async def measure(label: str, source_path: str, dest_path: str, args, stepped: bool) -> None:
+    latencies: List[float] = []
+    restarts = 0
+    last_remaining = None
+
+    def on_progress(remaining: int, total: int) -> None:
+        nonlocal restarts, last_remaining
+        if last_remaining is not None and remaining > last_remaining:
+            restarts += 1
+        last_remaining = remaining
+
+    stop = asyncio.Event()
+    worker = asyncio.create_task(interactions(source_path, args.interval, stop, latencies))
+    # 平常時の処理が何回か走ってから始める
+    await asyncio.sleep(args.interval * 5)
+    warmup = len(latencies)
+
+    start = time.perf_counter()
+    if stepped:
+        await asyncio.to_thread(
+            backup.backup_database, source_path, dest_path,
+            pages=args.pages, pause=args.pause, progress=on_progress
+        )
+    else:
+        blocking_backup(source_path, dest_path)
+    elapsed = time.perf_counter() - start
+    # 止まっていた処理を1回分進めてから計測を終える
+    await asyncio.sleep(args.interval * 2)
+    stop.set()
+    await worker
+
+    during = sorted(latencies[warmup:]) or [0.0]
+    p99 = during[min(len(during) - 1, int(len(during) * 0.99))]
+    print(
+        f"{label}: バックアップ {elapsed:.2f} 秒, 処理 {len(during)} 回, "
+        f"遅延 中央値 {statistics.median(during) * 1000:.1f} ms / "
+        f"p99 {p99 * 1000:.1f} ms / 最大 {during[-1] * 1000:.1f} ms"
+        + (f", やり直し {restarts} 回" if stepped else "")
+    )
+    os.remove(dest_path)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='バックアップ中の応答時間のベンチマーク')
+    parser.add_argument('--size-mb', type=int, default=300, help='DB の大きさ（MB）')
+    parser.add_argument('--interval', type=float, default=0.02, help='処理の間隔（秒）')
+    parser.add_argument('--pages', type=int, default=backup.BACKUP_PAGES, help='1ステップでコピーするページ数')
+    parser.add_argument('--pause', type=float, default=backup.BACKUP_STEP_PAUSE, help='ステップの間に休む時間（秒）')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        source_path = os.path.join(tmp, 'bench.db')
+        dest_path = os.path.join(tmp, 'backup.db')
+        start = time.perf_counter()
+        create_database(source_path, args.size_mb)
+        print(f"DB を作成しました: {os.path.getsize(source_path) / 1024 / 1024:.0f} MB "
+              f"({time.perf_counter() - start:.1f} 秒)")
+
+        asyncio.run(measure('イベントループ上で一括', source_path, dest_path, args, stepped=False))
+        asyncio.run(measure('別スレッドで段階的', source_path, dest_path, args, stepped=True))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,162 @@
+"""メッセージ履歴からの復元の書き込み速度を計測するベンチマーク
+
+使い方:
+    python scripts/bench_recovery.py [--messages 50000] [--existing 0.5] [--chunk 500]
+
+合成したボットのメッセージ履歴を、以前の方式（1件ごとに SELECT と INSERT を2回、
+全体を1つの長いトランザクションで実行）と RecoveryWriter（既存IDの事前読み込みと
+executemany によるチャンク単位の書き込み）で復元し、1秒あたりの処理件数を表示します。
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import recovery  # noqa: E402
+
+
+def create_schema(conn: sqlite3.Connection) -> None:
+    conn.execute('''
+        CREATE TABLE thoughts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            content TEXT NOT NULL,
+            category TEXT,
+            image_url TEXT,
+            is_anonymous BOOLEAN DEFAULT 0,
+            is_private BOOLEAN DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            user_id INTEGER NOT NULL,
+            display_name TEXT
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE message_references (
+            post_id INTEGER PRIMARY KEY,
+            message_id TEXT NOT NULL,
+            channel_id TEXT NOT NULL,
+            webhook_id TEXT
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE recovery_checkpoints (
+            channel_id TEXT PRIMARY KEY,
+            last_message_id TEXT NOT NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+
+def synthetic_history(rng: random.Random, count: int):
+    """投稿メッセージに見える合成メッセージを古い順に返します。"""
+    base = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    messages = []
+    for post_id in range(1, count + 1):
+        category = rng.choice(('雑談', '仕事', '趣味', None))
+        footer = (f"カテゴリ: {category} | " if category else "") + f"投稿ID: {post_id}"
+        embed = SimpleNamespace(
+            description=f"投稿 {post_id} " + "あいうえお" * rng.randint(5, 60),
+            footer=SimpleNamespace(text=footer),
+            author=SimpleNamespace(name=rng.choice(('匿名ユーザー', 'user')), icon_url=None),
+        )
+        messages.append(SimpleNamespace(
+            id=10 ** 17 + post_id,
+            author=SimpleNamespace(bot=True),
+            embeds=[embed],
+            webhook_id=None,
+            created_at=(base + timedelta(minutes=post_id)).isoformat(),
+        ))
+    return messages
+
+
+def seed_existing(conn: sqlite3.Connection, rng: random.Random, count: int, ratio: float) -> None:
+    """一部の投稿がすでにDBにある状態を作ります。"""
+    rows = [
+        (post_id, f"投稿 {post_id}", 1)
+        for post_id in range(1, count + 1) if rng.random() < ratio
+    ]
+    conn.executemany('INSERT INTO thoughts (id, content, user_id) VALUES (?, ?, ?)', rows)
+    conn.commit()
+
+
+def recover_row_by_row(conn: sqlite3.Connection, messages, channel_id: int) -> int:
+    """以前の方式: 1件ごとに存在確認して INSERT し、最後にまとめてコミットします。"""
+    cursor = conn.cursor()
+    recovered = 0
+    for message in messages:
+        post = recovery.parse_post_message(message, channel_id, False, 1)
+        if post is None:
+            continue
+        cursor.execute('SELECT id FROM thoughts WHERE id = ?', (post.post_id,))
+        if cursor.fetchone():
+            continue
+        cursor.execute('''
+            INSERT INTO thoughts (id, content, category, is_anonymous, is_private, user_id, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', (post.post_id, post.content, post.category, int(post.is_anonymous), 0, 1, post.created_at))
+        cursor.execute('''
+            INSERT INTO message_references (post_id, message_id, channel_id, webhook_id)
+            VALUES (?, ?, ?, ?)
+        ''', (post.post_id, post.message_id, post.channel_id, post.webhook_id))
+        recovered += 1
+    conn.commit()
+    return recovered
+
+
+def recover_batched(conn: sqlite3.Connection, messages, channel_id: int, interval: int) -> int:
+    """新しい方式: RecoveryWriter で interval 件ごとにチェックポイントと一緒に書き込みます。"""
+    writer = recovery.RecoveryWriter(conn, chunk_size=interval)
+    for scanned, message in enumerate(messages, 1):
+        post = recovery.parse_post_message(message, channel_id, False, 1)
+        if post is not None:
+            writer.add(post)
+        if scanned % interval == 0:
+            writer.flush(checkpoint=(channel_id, message.id))
+    writer.flush(checkpoint=(channel_id, messages[-1].id))
+    return writer.recovered
+
+
+def run(label: str, messages, args, batched: bool) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.db')
+        conn = sqlite3.connect(path, isolation_level=None if batched else '')
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        create_schema(conn)
+        seed_existing(conn, random.Random(args.seed), len(messages), args.existing)
+
+        start = time.perf_counter()
+        if batched:
+            recovered = recover_batched(conn, messages, 1, args.chunk)
+        else:
+            recovered = recover_row_by_row(conn, messages, 1)
+        elapsed = time.perf_counter() - start
+        conn.close()
+
+    print(f"{label}: {len(messages) / elapsed:,.0f} メッセージ/秒 "
+          f"(復元 {recovered:,} 件, {elapsed:.2f} 秒)")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='復元の書き込みベンチマーク')
+    parser.add_argument('--messages', type=int, default=50000, help='合成するメッセージ数')
+    parser.add_argument('--existing', type=float, default=0.5, help='すでにDBにある投稿の割合')
+    parser.add_argument('--chunk', type=int, default=recovery.RECOVERY_CHUNK_SIZE, help='1回に書き込む件数')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    messages = synthetic_history(random.Random(args.seed), args.messages)
+    run('1件ずつ', messages, args, batched=False)
+    run('チャンク書き込み', messages, args, batched=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+"""編集履歴の容量と復元時間を計測するベンチマーク
+
+使い方:
+    python scripts/bench_revisions.py [--edits 200] [--length 2000] [--interval 10]
+
+2000文字程度の投稿に小さな編集を繰り返し、1編集あたりの保存サイズ
+（全文を毎回保存した場合との比較）と、任意の版を復元する時間を表示します。
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import string
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import revisions  # noqa: E402
+
+
+def create_schema(conn: sqlite3.Connection) -> None:
+    conn.execute('''
+        CREATE TABLE thoughts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            content TEXT NOT NULL,
+            category TEXT,
+            image_url TEXT,
+            user_id INTEGER NOT NULL
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE thought_revisions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            post_id INTEGER NOT NULL,
+            revision INTEGER NOT NULL,
+            kind TEXT NOT NULL,
+            data TEXT NOT NULL,
+            category TEXT,
+            image_url TEXT,
+            editor_id INTEGER,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE (post_id, revision)
+        )
+    ''')
+
+
+def random_text(rng: random.Random, length: int) -> str:
+    alphabet = string.ascii_letters + 'あいうえおかきくけこさしすせそ。、 '
+    return ''.join(rng.choice(alphabet) for _ in range(length))
+
+
+def mutate(rng: random.Random, text: str) -> str:
+    """誤字修正程度の小さな編集を1つ加えます。"""
+    pos = rng.randrange(len(text) + 1)
+    action = rng.choice(('insert', 'delete', 'replace'))
+    snippet = random_text(rng, rng.randint(1, 20))
+    if action == 'insert':
+        return text[:pos] + snippet + text[pos:]
+    if action == 'delete':
+        return text[:pos] + text[pos + len(snippet):]
+    return text[:pos] + snippet + text[pos + len(snippet):]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='編集履歴のベンチマーク')
+    parser.add_argument('--edits', type=int, default=200, help='編集回数')
+    parser.add_argument('--length', type=int, default=2000, help='投稿の文字数')
+    parser.add_argument('--interval', type=int, default=revisions.SNAPSHOT_INTERVAL, help='スナップショット間隔')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    revisions.SNAPSHOT_INTERVAL = args.interval
+    rng = random.Random(args.seed)
+
+    conn = sqlite3.connect(':memory:')
+    create_schema(conn)
+    cursor = conn.cursor()
+
+    content = random_text(rng, args.length)
+    cursor.execute('INSERT INTO thoughts (content, category, user_id) VALUES (?, ?, ?)', (content, '雑談', 1))
+    post_id = cursor.lastrowid
+
+    versions = [content]
+    full_bytes = 0
+    start = time.perf_counter()
+    for _ in range(args.edits):
+        content = mutate(rng, content)
+        revisions.record_revision(cursor, post_id, content, '雑談', None, 1)
+        cursor.execute('UPDATE thoughts SET content = ? WHERE id = ?', (content, post_id))
+        versions.append(content)
+        full_bytes += len(content.encode('utf-8'))
+    conn.commit()
+    record_elapsed = time.perf_counter() - start
+
+    cursor.execute('''
+        SELECT COUNT(*), SUM(LENGTH(CAST(data AS BLOB))), SUM(kind = 'snapshot')
+        FROM thought_revisions WHERE revision > 0
+    ''')
+    count, stored_bytes, snapshots = cursor.fetchone()
+
+    # すべての版を復元して正しさと所要時間を確認する
+    latencies = []
+    for number, expected in enumerate(versions):
+        t0 = time.perf_counter()
+        found = revisions.load_revision(cursor, post_id, number)
+        latencies.append(time.perf_counter() - t0)
+        assert found is not None and found.content == expected, f"版 {number} の復元に失敗しました"
+    latencies.sort()
+
+    print(f"編集回数: {count} (スナップショット {snapshots} 件, 間隔 {args.interval})")
+    print(f"保存サイズ: {stored_bytes / count:.0f} B/編集 (全文保存なら {full_bytes / count:.0f} B/編集, "
+          f"{stored_bytes / full_bytes * 100:.1f}%)")
+    print(f"記録時間: {record_elapsed / count * 1000:.2f} ms/編集")
+    print(f"復元時間: 中央値 {latencies[len(latencies) // 2] * 1000:.2f} ms / "
+          f"最大 {latencies[-1] * 1000:.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""保存したチャンネルのエクスポートファイルからデータベースを復元するスクリプト
+
+使い方:
+    python scripts/recover_from_export.py EXPORT [EXPORT ...] --user-id USER_ID
+        [--db thoughts.db] [--channel-id CHANNEL_ID] [--private | --public]
+
+Discord API を使わずに、DiscordChatExporter の JSON やメッセージを1行ずつ並べた
+JSONL を読み込み、DB にない投稿とメッセージ参照を復元します。ボットを止めたまま
+実行でき、ファイルは1メッセージずつ読み込むのでメモリ使用量はファイルの大きさによりません。
+復元した投稿の投稿者は --user-id になるため、後で /assign_user で修正してください。
+"""
+
+import argparse
+import os
+import sqlite3
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.recovery import recover_from_export  # noqa: E402
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='エクスポートファイルからの復元')
+    parser.add_argument('exports', nargs='+', help='エクスポートファイル（.json / .jsonl）')
+    parser.add_argument('--db', default=os.getenv('DB_PATH', 'thoughts.db'), help='データベースファイル')
+    parser.add_argument('--user-id', type=int, required=True, help='復元した投稿に暫定で設定する投稿者ID')
+    parser.add_argument('--channel-id', help='ファイルにチャンネルIDが含まれない場合のチャンネルID')
+    visibility = parser.add_mutually_exclusive_group()
+    visibility.add_argument('--private', dest='is_private', action='store_const', const=True,
+                            help='非公開の投稿として復元する')
+    visibility.add_argument('--public', dest='is_private', action='store_const', const=False,
+                            help='公開の投稿として復元する')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db):
+        print(f"データベースが見つかりません: {args.db}", file=sys.stderr)
+        return 1
+
+    conn = sqlite3.connect(args.db, isolation_level=None)
+    try:
+        tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        if not {'thoughts', 'message_references'} <= tables:
+            print("テーブルがありません。先に一度ボットを起動してデータベースを初期化してください。", file=sys.stderr)
+            return 1
+
+        total_scanned = total_recovered = 0
+        start = time.perf_counter()
+        for path in args.exports:
+            file_start = time.perf_counter()
+
+            def on_progress(scanned: int, recovered: int) -> None:
+                elapsed = time.perf_counter() - file_start
+                rate = scanned / elapsed if elapsed > 0 else 0.0
+                print(f"\r{path}: {scanned:,} 件確認 / {recovered:,} 件復元 ({rate:,.0f} 件/秒)",
+                      end='', flush=True)
+
+            try:
+                scanned, recovered = recover_from_export(
+                    conn,
+                    path,
+                    args.user_id,
+                    channel_id=args.channel_id,
+                    is_private=args.is_private,
+                    on_progress=on_progress
+                )
+            except (OSError, ValueError) as e:
+                print(f"\n{path}: 復元できませんでした: {e}", file=sys.stderr)
+                return 1
+            print()
+            total_scanned += scanned
+            total_recovered += recovered
+    finally:
+        conn.close()
+
+    elapsed = time.perf_counter() - start
+    print(f"完了: {total_scanned:,} 件のメッセージを確認し、{total_recovered:,} 件の投稿を復元しました "
+          f"({elapsed:.1f} 秒)")
+    if total_recovered:
+        print("投稿者は /assign_user で修正してください。")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1 @@
+"""Cog 間で共有するユーティリティ"""
@@ -0,0 +1,326 @@
+"""データベースのバックアップ
+
+`sqlite3.Connection.backup()` を既定の引数で呼ぶと、DB全体を1回のステップで
+コピーし終えるまで呼び出し元をふさぎます。ここではバックアップを
+ワーカースレッドで実行する前提で、pages ページずつコピーし、ステップの間に
+少し休んで他の接続にディスクを譲ります。
+
+コピーの間はコピー元で読み取りトランザクションを開いたままにします。WAL モードでは
+読み取りが書き込みを止めないため通常の投稿や編集はそのまま続けられ、バックアップは
+開始時点のスナップショットを最後までコピーします（途中の書き込みでやり直しになりません）。
+
+create_backup() はコピーしたファイルを圧縮し、チェックサムとテーブルごとの行数を
+バックアップディレクトリの manifest.json に記録します。定期バックアップは
+prune_backups() で日・週・月ごとに1つずつ（grandfather-father-son）残して削除します。
+"""
+
+from __future__ import annotations
+
+import gzip
+import hashlib
+import json
+import logging
+import lzma
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from config import BACKUP_COMPRESSION
+
+logger = logging.getLogger(__name__)
+
+# バックアップを置くディレクトリ
+BACKUP_DIR = "backup"
+# バックアップファイル名の接頭辞
+BACKUP_PREFIX = "thoughts_backup_"
+# チェックサムと行数を記録するファイル
+MANIFEST_NAME = "manifest.json"
+# 圧縮形式ごとの拡張子と開き方
+CODECS = {
+    'gzip': ('.gz', gzip.open),
+    'lzma': ('.xz', lzma.open),
+}
+# 圧縮・展開・チェックサムで1回に読み書きするバイト数
+COPY_CHUNK_SIZE = 1 << 20
+# 1ステップでコピーするページ数（既定のページサイズ 4KiB で 1MiB）
+BACKUP_PAGES = 256
+# ステップの間に休む時間（秒）
+BACKUP_STEP_PAUSE = 0.005
+
+# (残りページ数, 全ページ数) を受け取る進捗通知。例外を送出するとバックアップを中止する
+BackupProgress = Callable[[int, int], None]
+
+# manifest.json の読み書きを直列化する
+_manifest_lock = threading.Lock()
+
+
+def backup_database(
+    source_path: str,
+    dest_path: str,
+    pages: int = BACKUP_PAGES,
+    pause: float = BACKUP_STEP_PAUSE,
+    progress: Optional[BackupProgress] = None,
+) -> int:
+    """source_path の DB を dest_path に少しずつコピーし、コピーしたページ数を返します。
+
+    イベントループをふさがないよう asyncio.to_thread() などで別スレッドから呼んでください。
+    コピーは一時ファイルに行い、完了してから dest_path に置き換えるため、
+    途中で失敗・中止しても不完全なファイルは残りません。
+    """
+    tmp_path = f"{dest_path}.tmp"
+    total_pages = 0
+
+    def on_step(status: int, remaining: int, total: int) -> None:
+        nonlocal total_pages
+        total_pages = total
+        if progress is not None:
+            progress(remaining, total)
+        if remaining and pause > 0:
+            time.sleep(pause)
+
+    source = sqlite3.connect(source_path, isolation_level=None)
+    try:
+        # 読み取りトランザクションを開いたままにして、全ステップで同じスナップショットを読む
+        source.execute('BEGIN')
+        source.execute('SELECT COUNT(*) FROM sqlite_master').fetchone()
+        dest = sqlite3.connect(tmp_path)
+        try:
+            source.backup(dest, pages=pages, progress=on_step)
+        finally:
+            dest.close()
+        source.execute('COMMIT')
+        os.replace(tmp_path, dest_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    finally:
+        source.close()
+
+    return total_pages
+
+
+def restore_database(backup_path: str, target_path: str) -> None:
+    """バックアップの内容で target_path の DB を置き換えます（別スレッドから呼んでください）。
+
+    圧縮されたバックアップは一時ファイルに展開してから読み込みます。
+    復元中の DB を他の接続に見せないよう、こちらは1回のステップでコピーします。
+    """
+    codec = codec_of(backup_path)
+    source_path = backup_path
+    if codec is not None:
+        source_path = f"{backup_path}.restore.tmp"
+        with CODECS[codec][1](backup_path, 'rb') as src, open(source_path, 'wb') as dst:
+            shutil.copyfileobj(src, dst, COPY_CHUNK_SIZE)
+    try:
+        backup = sqlite3.connect(source_path)
+        try:
+            target = sqlite3.connect(target_path)
+            try:
+                backup.backup(target)
+            finally:
+                target.close()
+        finally:
+            backup.close()
+    finally:
+        if source_path != backup_path:
+            os.remove(source_path)
+
+
+def codec_of(path: str) -> Optional[str]:
+    """ファイル名の拡張子から圧縮形式を返します（圧縮されていなければ None）。"""
+    for codec, (ext, _) in CODECS.items():
+        if path.endswith(ext):
+            return codec
+    return None
+
+
+def is_backup_file(filename: str) -> bool:
+    """バックアップファイル（圧縮されたものを含む）かどうかを返します。"""
+    if not filename.startswith(BACKUP_PREFIX):
+        return False
+    return filename.endswith('.db') or any(filename.endswith(f'.db{ext}') for ext, _ in CODECS.values())
+
+
+def file_sha256(path: str) -> str:
+    """ファイルの SHA-256 を返します。"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(COPY_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def row_counts(path: str) -> Dict[str, int]:
+    """DB のテーブルごとの行数を返します。"""
+    conn = sqlite3.connect(path)
+    try:
+        tables = [row[0] for row in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' ORDER BY name"
+        )]
+        return {table: conn.execute(f'SELECT COUNT(*) FROM "{table}"').fetchone()[0] for table in tables}
+    finally:
+        conn.close()
+
+
+def load_manifest(backup_dir: str = BACKUP_DIR) -> List[Dict[str, Any]]:
+    """manifest.json の記録を返します（ない・壊れている場合は空）。"""
+    path = os.path.join(backup_dir, MANIFEST_NAME)
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f).get('backups', [])
+    except FileNotFoundError:
+        return []
+    except (OSError, ValueError) as e:
+        logger.warning(f"バックアップのマニフェストを読み込めませんでした: {e}")
+        return []
+
+
+def _save_manifest(backup_dir: str, entries: List[Dict[str, Any]]) -> None:
+    path = os.path.join(backup_dir, MANIFEST_NAME)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({'backups': entries}, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def find_manifest_entry(filename: str, backup_dir: str = BACKUP_DIR) -> Optional[Dict[str, Any]]:
+    for entry in load_manifest(backup_dir):
+        if entry['filename'] == filename:
+            return entry
+    return None
+
+
+def _new_backup_path(backup_dir: str, created: datetime) -> str:
+    """作成時刻から、既存のバックアップと重ならないファイル名を作ります。"""
+    stem = f"{BACKUP_PREFIX}{created.strftime('%Y-%m-%d_%H-%M-%S')}"
+    existing = set(os.listdir(backup_dir))
+    suffix = 1
+    name = stem
+    while any(f"{name}.db{ext}" in existing for ext in ('', *(e for e, _ in CODECS.values()))):
+        suffix += 1
+        name = f"{stem}_{suffix}"
+    return os.path.join(backup_dir, f"{name}.db")
+
+
+def create_backup(
+    source_path: str,
+    backup_dir: str = BACKUP_DIR,
+    codec: Optional[str] = BACKUP_COMPRESSION,
+    kind: str = 'manual',
+    progress: Optional[BackupProgress] = None,
+    on_stage: Optional[Callable[[str], None]] = None,
+) -> Dict[str, Any]:
+    """バックアップを作成して圧縮し、マニフェストに記録した内容を返します（別スレッドから呼んでください）。
+
+    Args:
+        codec: 'gzip' / 'lzma'、または None / 'none' で圧縮しない
+        kind: 'manual'（/backup_database）または 'scheduled'（定期バックアップ）
+        on_stage: 'copy' / 'compress' の各段階の開始時に呼ばれる関数
+    """
+    if codec == 'none':
+        codec = None
+    if codec is not None and codec not in CODECS:
+        raise ValueError(f"不明な圧縮形式です: {codec}")
+
+    os.makedirs(backup_dir, exist_ok=True)
+    created = datetime.now()
+    raw_path = _new_backup_path(backup_dir, created)
+
+    if on_stage is not None:
+        on_stage('copy')
+    backup_database(source_path, raw_path, progress=progress)
+    original_size = os.path.getsize(raw_path)
+    path = raw_path
+    try:
+        rows = row_counts(raw_path)
+        if codec is not None:
+            if on_stage is not None:
+                on_stage('compress')
+            ext, opener = CODECS[codec]
+            path = raw_path + ext
+            with open(raw_path, 'rb') as src, opener(f"{path}.tmp", 'wb') as dst:
+                shutil.copyfileobj(src, dst, COPY_CHUNK_SIZE)
+            os.replace(f"{path}.tmp", path)
+            os.remove(raw_path)
+    except BaseException:
+        for leftover in (raw_path, f"{path}.tmp"):
+            if os.path.exists(leftover):
+                os.remove(leftover)
+        raise
+
+    entry = {
+        'filename': os.path.basename(path),
+        'created_at': created.isoformat(timespec='seconds'),
+        'kind': kind,
+        'codec': codec,
+        'size': os.path.getsize(path),
+        'original_size': original_size,
+        'sha256': file_sha256(path),
+        'rows': rows,
+    }
+    with _manifest_lock:
+        entries = [e for e in load_manifest(backup_dir) if e['filename'] != entry['filename']]
+        entries.append(entry)
+        _save_manifest(backup_dir, entries)
+    return entry
+
+
+def verify_backup(filename: str, backup_dir: str = BACKUP_DIR) -> Optional[bool]:
+    """バックアップのチェックサムをマニフェストと照合します（記録がなければ None）。"""
+    entry = find_manifest_entry(filename, backup_dir)
+    if entry is None:
+        return None
+    return file_sha256(os.path.join(backup_dir, filename)) == entry['sha256']
+
+
+def select_retained(entries: List[Dict[str, Any]], daily: int, weekly: int, monthly: int) -> Set[str]:
+    """grandfather-father-son で残すバックアップのファイル名を返します。
+
+    直近 daily 日・weekly 週・monthly か月のそれぞれで最も新しいバックアップを1つずつ残します。
+    最新のバックアップは常に残ります。
+    """
+    ordered = sorted(entries, key=lambda e: e['created_at'], reverse=True)
+    if not ordered:
+        return set()
+    keep = {ordered[0]['filename']}
+    periods = (
+        (daily, lambda d: d.date()),
+        (weekly, lambda d: d.isocalendar()[:2]),
+        (monthly, lambda d: (d.year, d.month)),
+    )
+    for count, period_of in periods:
+        seen = set()
+        for entry in ordered:
+            period = period_of(datetime.fromisoformat(entry['created_at']))
+            if period in seen:
+                continue
+            if len(seen) >= count:
+                break
+            seen.add(period)
+            keep.add(entry['filename'])
+    return keep
+
+
+def prune_backups(daily: int, weekly: int, monthly: int, backup_dir: str = BACKUP_DIR) -> List[str]:
+    """保持期間を過ぎた定期バックアップを削除し、削除したファイル名を返します。
+
+    手動のバックアップ（/backup_database）は削除しません。
+    """
+    with _manifest_lock:
+        entries = load_manifest(backup_dir)
+        scheduled = [e for e in entries if e.get('kind') == 'scheduled']
+        keep = select_retained(scheduled, daily, weekly, monthly)
+        removed = [e['filename'] for e in scheduled if e['filename'] not in keep]
+        for filename in removed:
+            try:
+                os.remove(os.path.join(backup_dir, filename))
+            except FileNotFoundError:
+                pass
+        if removed:
+            _save_manifest(backup_dir, [e for e in entries if e['filename'] not in removed])
+    return removed
@@ -0,0 +1,53 @@
+"""API 呼び出しの予算
+
+大量のメッセージを確認・走査する管理コマンドが Discord のレート制限を
+使い切らないよう、トークンバケットで1秒あたりの呼び出し数を制限します。
+複数のワーカーで1つの予算を共有できます。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import time
+
+
+class RequestBudget:
+    """1秒あたり rate 回（最大 burst 回まで連続可）に呼び出しを制限するクラス
+
+    使い方::
+
+        budget = RequestBudget(rate=10)
+        async with budget:
+            await channel.fetch_message(message_id)
+    """
+
+    def __init__(self, rate: float = 10.0, burst: int = 10) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.used = 0
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self) -> None:
+        """呼び出し1回分の予算を確保します（足りなければ待ちます）。"""
+        async with self._lock:
+            while True:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    self.used += 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    async def __aenter__(self) -> "RequestBudget":
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        return None
@@ -0,0 +1,201 @@
+"""投稿メッセージ更新の集約
+
+短時間に同じ投稿が何度も編集された場合、Discord メッセージの更新を
+静止期間（最後の編集からの待ち時間）が過ぎるまで遅らせ、最新の状態だけを
+1回で反映します。描画結果が前回送信したものと同一なら更新自体を省略します。
+呼び出し元は更新を予約するだけで待たないため、編集の応答は静止期間に左右されません。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import logging
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+import discord
+
+from utils import metrics
+
+logger = logging.getLogger(__name__)
+
+# 最後の編集からこの秒数だけ待ってからメッセージを更新する
+EDIT_QUIET_PERIOD = 1.0
+# 編集が続いても最初の編集からこの秒数以内には必ず更新する
+EDIT_MAX_DELAY = 4.0
+# 終了時に待機中の更新を反映し終えるまで待つ最大秒数（過ぎたら中止する）
+EDIT_DRAIN_TIMEOUT = 10.0
+
+Flush = Callable[[], Awaitable[None]]
+# 集約された更新が失敗したときに呼ばれるコルーチン関数
+ErrorHandler = Callable[[Exception], Awaitable[None]]
+
+
+def embed_fingerprint(embed: discord.Embed) -> str:
+    """埋め込みの内容からハッシュ値を計算します。"""
+    payload = json.dumps(embed.to_dict(), sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class _Pending:
+    """まだ反映されていない編集"""
+
+    __slots__ = ('flush', 'first_at', 'deadline', 'error_handlers', 'count', 'wake')
+
+    def __init__(self, flush: Flush, now: float) -> None:
+        self.flush = flush
+        self.first_at = now
+        self.deadline = now
+        self.error_handlers: List[ErrorHandler] = []
+        self.count = 0
+        # deadline を早めたときに待機中の _run を起こす
+        self.wake = asyncio.Event()
+
+
+class EditCoalescer:
+    """投稿ごとにメッセージ更新をデバウンスするクラス
+
+    `schedule` に渡した更新処理のうち、静止期間内に最後に渡されたものだけが
+    実行されます。その1回の更新が失敗すると、同じ期間に `schedule` した
+    すべての呼び出し元の on_error が呼ばれます。
+    待機中の更新のタスクは `drain` で反映し終えるまで待つか中止できます。
+    """
+
+    def __init__(
+        self,
+        quiet_period: float = EDIT_QUIET_PERIOD,
+        max_delay: float = EDIT_MAX_DELAY,
+        max_fingerprints: int = 2048,
+    ) -> None:
+        self.quiet_period = quiet_period
+        self.max_delay = max_delay
+        self.max_fingerprints = max_fingerprints
+        self._pending: Dict[int, _Pending] = {}
+        self._locks: Dict[int, asyncio.Lock] = {}
+        # 実行中の _run タスク（終わったものは取り除く）
+        self._tasks: Set[asyncio.Task] = set()
+        # post_id -> (message_id, 最後に送信した埋め込みのハッシュ)
+        self._sent: "OrderedDict[int, Tuple[int, str]]" = OrderedDict()
+
+    def schedule(self, post_id: int, flush: Flush, on_error: Optional[ErrorHandler] = None) -> None:
+        """更新処理を予約します（更新が終わるのを待たずに戻ります）。
+
+        Args:
+            post_id: 投稿ID
+            flush: 最新の状態でメッセージを更新するコルーチン関数
+            on_error: 更新が失敗したときに例外を受け取るコルーチン関数
+        """
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        pending = self._pending.get(post_id)
+        if pending is None:
+            pending = _Pending(flush, now)
+            self._pending[post_id] = pending
+            task = asyncio.create_task(self._run(post_id, pending))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        else:
+            metrics.increment('edit.coalesced')
+        pending.flush = flush
+        pending.count += 1
+        if on_error is not None:
+            pending.error_handlers.append(on_error)
+        pending.deadline = min(now + self.quiet_period, pending.first_at + self.max_delay)
+
+    async def _run(self, post_id: int, pending: _Pending) -> None:
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                delay = pending.deadline - loop.time()
+                if delay <= 0:
+                    break
+                try:
+                    await asyncio.wait_for(pending.wake.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+
+            # 以降の編集は次の集約に回す
+            if self._pending.get(post_id) is pending:
+                del self._pending[post_id]
+
+            # 同じ投稿の更新が前後して送信されないよう直列化する
+            lock = self._locks.setdefault(post_id, asyncio.Lock())
+            async with lock:
+                try:
+                    await pending.flush()
+                except Exception as e:
+                    logger.warning(f"メッセージの更新に失敗しました: post_id={post_id}, error={e}", exc_info=True)
+                    await self._notify_error(post_id, pending, e)
+                finally:
+                    metrics.increment('edit.flushed')
+                    if pending.count > 1:
+                        logger.info(f"{pending.count}件の編集を1回のメッセージ更新にまとめました: post_id={post_id}")
+        except asyncio.CancelledError:
+            if self._pending.get(post_id) is pending:
+                del self._pending[post_id]
+            raise
+        finally:
+            lock = self._locks.get(post_id)
+            if lock is not None and not lock.locked() and post_id not in self._pending:
+                del self._locks[post_id]
+
+    @staticmethod
+    async def _notify_error(post_id: int, pending: _Pending, error: Exception) -> None:
+        for handler in pending.error_handlers:
+            try:
+                await handler(error)
+            except Exception as e:
+                logger.warning(f"メッセージ更新の失敗を通知できませんでした: post_id={post_id}, error={e}")
+
+    async def drain(self, timeout: float = EDIT_DRAIN_TIMEOUT) -> None:
+        """待機中の更新を静止期間を待たずに反映し、終わるまで待ちます。
+
+        timeout 秒を過ぎても終わらない更新は中止します。Cog のアンロード時に呼びます。
+        """
+        for pending in self._pending.values():
+            pending.deadline = 0.0
+            pending.wake.set()
+        tasks = list(self._tasks)
+        if not tasks:
+            return
+        _, not_done = await asyncio.wait(tasks, timeout=timeout)
+        for task in not_done:
+            task.cancel()
+        await asyncio.gather(*not_done, return_exceptions=True)
+        if not_done:
+            logger.warning(f"{len(not_done)}件のメッセージ更新を反映できないまま中止しました")
+
+    async def reset(self) -> None:
+        """待機中の更新を反映せずに中止し、送信済みの記録も破棄します（バックアップからの復元時）。"""
+        tasks = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if tasks:
+            logger.info(f"{len(tasks)}件の待機中のメッセージ更新を中止しました")
+        self._pending.clear()
+        self._sent.clear()
+
+    def is_unchanged(self, post_id: int, message_id: int, embed: discord.Embed) -> bool:
+        """前回送信した埋め込みと同一かどうかを返します。"""
+        sent = self._sent.get(post_id)
+        if sent is None:
+            return False
+        return sent == (message_id, embed_fingerprint(embed))
+
+    def remember(self, post_id: int, message_id: int, embed: discord.Embed) -> None:
+        """送信した埋め込みのハッシュを記録します。"""
+        self._sent[post_id] = (message_id, embed_fingerprint(embed))
+        self._sent.move_to_end(post_id)
+        while len(self._sent) > self.max_fingerprints:
+            self._sent.popitem(last=False)
+
+    def forget(self, post_id: int) -> None:
+        """投稿の記録を破棄します（削除・再送信時）。"""
+        self._sent.pop(post_id, None)
+
+
+# 全 Cog で共有するインスタンス
+edit_coalescer = EditCoalescer()
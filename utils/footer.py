@@ -0,0 +1,123 @@
+"""投稿の埋め込みフッターの書式
+
+投稿IDとカテゴリーはメッセージの埋め込みのフッターに書き込まれ、データベースを
+メッセージから復元するときの手がかりになります。フッターの書式はこれまでに
+何度か変わっているため、過去の書式をすべて版として定義し、書き込み（encode）と
+読み取り（decode）を1か所にまとめます。
+
+    版 | 書式                                  | 使っていた場所
+    0  | [カテゴリ: X | ]投稿ID: N | UID: U     | 投稿者IDを表示していた頃の投稿
+    1  | カテゴリー: X | ID: N                 | メッセージ参照の再送信（カテゴリーなしは「未設定」）
+    2  | [カテゴリー: X | ]投稿ID: N            | 投稿の編集
+    3  | [カテゴリ: X | ]投稿ID: N              | 投稿（現在の書式）
+
+新しくフッターを書くときは常に FOOTER_VERSION の書式を使います。
+"""
+
+from __future__ import annotations
+
+import re
+from typing import NamedTuple, Optional, Pattern, Tuple
+
+# 現在の書式の版
+FOOTER_VERSION = 3
+
+# カテゴリーがないことを表す表記（版1）
+NO_CATEGORY = "未設定"
+
+# 区切りの前後やコロンの後ろの空白の揺れは読み取り時に許容する
+_SEP = r"\s*\|\s*"
+
+# 版ごとの書式。読み取りは現在の書式から順に試す
+_PATTERNS: Tuple[Tuple[int, Pattern[str]], ...] = (
+    (3, re.compile(rf"(?:カテゴリ:\s*(?P<category>.+?){_SEP})?投稿ID:\s*(?P<post_id>\d+)")),
+    (2, re.compile(rf"カテゴリー:\s*(?P<category>.+?){_SEP}投稿ID:\s*(?P<post_id>\d+)")),
+    (1, re.compile(rf"カテゴリー:\s*(?P<category>.+?){_SEP}ID:\s*(?P<post_id>\d+)")),
+    (0, re.compile(
+        rf"(?:カテゴリ:\s*(?P<category>.+?){_SEP})?投稿ID:\s*(?P<post_id>\d+){_SEP}UID:\s*(?P<user_id>\d+)"
+    )),
+)
+
+
+class Footer(NamedTuple):
+    """フッターから読み取った内容"""
+    post_id: int
+    category: Optional[str] = None
+    user_id: Optional[int] = None
+    version: int = FOOTER_VERSION
+
+
+def encode_footer(
+    post_id: int,
+    category: Optional[str] = None,
+    version: int = FOOTER_VERSION,
+    user_id: Optional[int] = None,
+) -> str:
+    """投稿のフッターの文字列を作ります。
+
+    version を指定すると過去の書式で書き出します（読み取りの確認用）。
+    """
+    if version == 3:
+        return f"カテゴリ: {category} | 投稿ID: {post_id}" if category else f"投稿ID: {post_id}"
+    if version == 2:
+        return f"カテゴリー: {category} | 投稿ID: {post_id}" if category else f"投稿ID: {post_id}"
+    if version == 1:
+        return f"カテゴリー: {category or NO_CATEGORY} | ID: {post_id}"
+    if version == 0:
+        if user_id is None:
+            raise ValueError("版0のフッターには投稿者IDが必要です")
+        text = f"投稿ID: {post_id} | UID: {user_id}"
+        return f"カテゴリ: {category} | {text}" if category else text
+    raise ValueError(f"不明なフッターの版です: {version}")
+
+
+def decode_footer(text: Optional[str]) -> Optional[Footer]:
+    """フッターの文字列を読み取ります。投稿のフッターでなければ None を返します。"""
+    if not text:
+        return None
+    text = text.strip()
+    for version, pattern in _PATTERNS:
+        match = pattern.fullmatch(text)
+        if match is None:
+            continue
+        category = match.group('category')
+        if category == NO_CATEGORY:
+            category = None
+        user_id = match.groupdict().get('user_id')
+        return Footer(
+            post_id=int(match.group('post_id')),
+            category=category,
+            user_id=int(user_id) if user_id else None,
+            version=version,
+        )
+    return None
+
+
+if __name__ == "__main__":
+    # 全ての版で書いて読み、同じ内容と同じ文字列に戻ることを確かめる
+    #   python -m utils.footer
+    categories = (None, "雑談", "仕事 | 趣味", "ID: 1", "カテゴリ: 入れ子", " 前後に空白 ")
+    checked = 0
+    for version in range(FOOTER_VERSION + 1):
+        for post_id in (1, 42, 10 ** 12):
+            for category in categories:
+                user_id = 123456789012345678 if version == 0 else None
+                text = encode_footer(post_id, category, version, user_id)
+                footer = decode_footer(text)
+                expected_category = category.strip() if category else None
+                assert footer is not None, text
+                assert footer.post_id == post_id, (text, footer)
+                assert footer.category == expected_category, (text, footer)
+                assert footer.user_id == user_id, (text, footer)
+                # カテゴリーがない版2と版3は同じ文字列なので、書き戻した文字列で比べる
+                assert encode_footer(footer.post_id, footer.category, footer.version, footer.user_id) \
+                    == encode_footer(post_id, expected_category, version, user_id), (text, footer)
+                checked += 1
+
+    # 空白の揺れと投稿のフッターではない文字列
+    assert decode_footer("カテゴリ:雑談|投稿ID:5") == Footer(5, "雑談", None, 3)
+    assert decode_footer("  投稿ID: 7  ") == Footer(7, None, None, 3)
+    assert decode_footer("カテゴリー: 未設定 | ID: 9") == Footer(9, None, None, 1)
+    for text in (None, "", "投稿ID:", "ID: 5", "投稿ID: 5x", "他 3件のバックアップがあります"):
+        assert decode_footer(text) is None, text
+    print(f"ok: {checked} 件のフッターを確認しました")
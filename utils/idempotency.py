@@ -0,0 +1,99 @@
+"""投稿の重複送信防止
+
+モーダルの再送信やダブルクリックで同じ投稿が二重に保存されないよう、
+(user_id, 投稿内容のハッシュ) をキーに直近の投稿IDを保持します。ハッシュには本文と
+カテゴリのほか、画像URL・公開設定・匿名設定も含めるため、同じ本文でも設定を変えた
+投稿は重複とみなしません。
+"""
+
+from __future__ import annotations
+
+import hashlib
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+# 重複とみなす時間（秒）
+DEDUPE_WINDOW_SECONDS = 60
+
+IdempotencyKey = Tuple[int, str]
+
+
+def normalize_content(content: str) -> str:
+    """全角/半角や空白の揺れを吸収した本文を返します。"""
+    return " ".join(unicodedata.normalize("NFKC", content).split())
+
+
+def content_hash(
+    user_id: int,
+    content: str,
+    category: Optional[str],
+    image_url: Optional[str] = None,
+    is_public: bool = True,
+    is_anonymous: bool = False,
+) -> str:
+    """投稿者・投稿内容・公開/匿名設定から重複判定用のハッシュを作ります。"""
+    raw = "\x1f".join((
+        str(user_id),
+        normalize_content(category or ''),
+        (image_url or '').strip(),
+        'public' if is_public else 'private',
+        'anonymous' if is_anonymous else 'named',
+        normalize_content(content),
+    ))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class IdempotencyWindow:
+    """直近の投稿を一定時間だけ覚えておくウィンドウ"""
+
+    def __init__(self, ttl: float = DEDUPE_WINDOW_SECONDS, max_entries: int = 10000) -> None:
+        self.ttl = ttl
+        self.max_entries = max_entries
+        # キー -> (有効期限, 投稿ID)。挿入順 = 期限順なので先頭から期限切れを捨てられる
+        self._entries: "OrderedDict[IdempotencyKey, Tuple[float, int]]" = OrderedDict()
+
+    @staticmethod
+    def make_key(
+        user_id: int,
+        content: str,
+        category: Optional[str],
+        image_url: Optional[str] = None,
+        is_public: bool = True,
+        is_anonymous: bool = False,
+    ) -> IdempotencyKey:
+        return (user_id, content_hash(user_id, content, category, image_url, is_public, is_anonymous))
+
+    def _expire(self, now: float) -> None:
+        while self._entries:
+            key, (expires_at, _) = next(iter(self._entries.items()))
+            if expires_at > now and len(self._entries) <= self.max_entries:
+                break
+            self._entries.popitem(last=False)
+
+    def get(self, key: IdempotencyKey) -> Optional[int]:
+        """ウィンドウ内に同じ投稿があればその投稿IDを返します。"""
+        now = time.monotonic()
+        self._expire(now)
+        entry = self._entries.get(key)
+        return entry[1] if entry else None
+
+    def put(self, key: IdempotencyKey, post_id: int) -> None:
+        """投稿をウィンドウに記録します。"""
+        now = time.monotonic()
+        self._entries.pop(key, None)
+        self._entries[key] = (now + self.ttl, post_id)
+        self._expire(now)
+
+    def discard(self, key: IdempotencyKey) -> None:
+        """投稿の記録を取り消します（配信に失敗した投稿を再送信できるようにする）。"""
+        self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        """すべての記録を破棄します（バックアップからの復元時）。"""
+        self._entries.clear()
+
+
+# 全 Cog で共有するインスタンス
+recent_posts = IdempotencyWindow()
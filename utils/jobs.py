@@ -0,0 +1,435 @@
+"""管理コマンドのバックグラウンドジョブ
+
+復元や全件チェックのような重い管理コマンドは、インタラクションの中で直接
+実行するとトークンの有効期限（15分）に縛られ、キャンセルもできず、
+二重に実行されると同じ処理が並走します。JobManager はこれらをジョブとして
+`jobs` テーブルに登録し、同時実行数を制限したワーカーで実行します。
+
+ジョブ関数には interaction の代わりに JobContext が渡されます。JobContext は
+`user` / `guild` / `followup` を持ち、フォローアップはトークンが有効な間は
+そのまま送信し、期限切れ後は依頼した管理者へのDMに切り替えます。送信・編集した
+内容はジョブの進捗として記録され、`/job_status` で確認できます。
+
+DB全体を置き換えるジョブ（バックアップからの復元）は exclusive=True で登録し、
+他のジョブが終わるのを待ってから単独で実行します。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Union
+
+import discord
+
+from utils import metrics
+
+logger = logging.getLogger(__name__)
+
+# 同時に実行するジョブの数
+MAX_CONCURRENT_JOBS = 2
+# フォローアップに使うトークンの有効期間（15分より少し短く見積もる）
+INTERACTION_TTL = 14 * 60
+# 記録する進捗・結果の最大文字数
+MAX_PROGRESS_LENGTH = 2000
+
+# 実行中・待機中とみなす状態
+ACTIVE_STATUSES = ('queued', 'running')
+
+JobRunner = Callable[[Union['JobContext', discord.Interaction]], Awaitable[Any]]
+
+
+class Job:
+    """実行待ち・実行中のジョブ"""
+
+    def __init__(
+        self,
+        job_id: int,
+        kind: str,
+        interaction: discord.Interaction,
+        run: JobRunner,
+        exclusive: bool = False
+    ) -> None:
+        self.id = job_id
+        self.kind = kind
+        self.interaction = interaction
+        self.run = run
+        self.exclusive = exclusive
+        self.status = 'queued'
+        self.task: Optional[asyncio.Task] = None
+
+
+class JobMessage:
+    """ジョブが送信したメッセージ（編集内容を進捗として記録します）"""
+
+    def __init__(self, context: 'JobContext', message: Optional[Union[discord.Message, discord.WebhookMessage]]) -> None:
+        self._context = context
+        self._message = message
+
+    async def edit(self, *, content: Optional[str] = None, embed: Optional[discord.Embed] = None) -> None:
+        self._context.record(content)
+        message = self._message
+        # フォローアップはトークンが切れると編集できないが、DMは期限に関係なく編集できる
+        editable = message is not None and not (
+            isinstance(message, discord.WebhookMessage) and self._context.token_expired
+        )
+        if editable:
+            try:
+                await message.edit(**_message_kwargs(content, embed))
+                return
+            except discord.HTTPException as e:
+                logger.info(f"ジョブ #{self._context.job_id} のメッセージを編集できませんでした: {e}")
+        # 編集できなければ新しいメッセージとして送り直す（以降はそのメッセージを編集する）
+        self._message = await self._context.deliver(content, embed)
+
+
+class JobFollowup:
+    """interaction.followup の代わりにジョブの出力を送信するクラス"""
+
+    def __init__(self, context: 'JobContext') -> None:
+        self._context = context
+
+    async def send(
+        self,
+        content: Optional[str] = None,
+        *,
+        embed: Optional[discord.Embed] = None,
+        ephemeral: bool = True,
+        wait: bool = False
+    ) -> JobMessage:
+        self._context.record(content)
+        return JobMessage(self._context, await self._context.deliver(content, embed))
+
+
+class JobContext:
+    """ジョブ関数に interaction の代わりに渡すオブジェクト"""
+
+    def __init__(self, manager: 'JobManager', job: Job) -> None:
+        self.job_id = job.id
+        self.kind = job.kind
+        self.interaction = job.interaction
+        self.user = job.interaction.user
+        self.guild = job.interaction.guild
+        self.followup = JobFollowup(self)
+        self._manager = manager
+        self._use_dm = False
+
+    @property
+    def token_expired(self) -> bool:
+        age = (discord.utils.utcnow() - self.interaction.created_at).total_seconds()
+        return self._use_dm or age > INTERACTION_TTL
+
+    def record(self, content: Optional[str]) -> None:
+        """最後に表示した内容をジョブの進捗として保存します。"""
+        if content:
+            self._manager.update(self.job_id, progress=content[-MAX_PROGRESS_LENGTH:])
+
+    async def deliver(
+        self,
+        content: Optional[str],
+        embed: Optional[discord.Embed]
+    ) -> Optional[Union[discord.Message, discord.WebhookMessage]]:
+        """フォローアップ（期限切れ後は依頼者へのDM）で送信します。"""
+        kwargs = _message_kwargs(content, embed)
+        if not self.token_expired:
+            try:
+                return await self.interaction.followup.send(ephemeral=True, wait=True, **kwargs)
+            except discord.HTTPException as e:
+                logger.info(f"ジョブ #{self.job_id} のフォローアップを送信できませんでした。DMに切り替えます: {e}")
+                self._use_dm = True
+        self._use_dm = True
+        if 'content' in kwargs:
+            kwargs['content'] = f"[ジョブ #{self.job_id}] {kwargs['content']}"[:MAX_PROGRESS_LENGTH]
+        try:
+            return await self.user.send(**kwargs)
+        except discord.HTTPException as e:
+            logger.warning(f"ジョブ #{self.job_id} の結果をDMで送信できませんでした: {e}")
+            return None
+
+
+def _message_kwargs(content: Optional[str], embed: Optional[discord.Embed]) -> Dict[str, Any]:
+    kwargs: Dict[str, Any] = {}
+    if content is not None:
+        kwargs['content'] = content
+    if embed is not None:
+        kwargs['embed'] = embed
+    return kwargs
+
+
+class JobManager:
+    """ジョブの登録・実行・キャンセルを行うクラス
+
+    使い方::
+
+        job_id = await job_manager.submit(interaction, 'recover_from_messages', run)
+
+    run は JobContext（ワーカー未起動時は interaction そのもの）を受け取るコルーチン関数です。
+    同じ種類のジョブが待機中・実行中の場合は登録せず、既存のジョブIDを返します。
+    exclusive=True のジョブは他のジョブと同時には実行されません。
+    """
+
+    def __init__(self, concurrency: int = MAX_CONCURRENT_JOBS) -> None:
+        self.concurrency = concurrency
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self._jobs: Dict[int, Job] = {}
+        self._stopping = False
+        # 実行中のジョブ数と排他ジョブの状態（_admit で参照する）
+        self._gate: Optional[asyncio.Condition] = None
+        self._running_count = 0
+        self._exclusive_running = False
+        self._exclusive_waiting = 0
+
+    @property
+    def db_path(self) -> str:
+        return os.getenv('DB_PATH', 'thoughts.db')
+
+    @property
+    def running(self) -> bool:
+        return bool(self._workers)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30.0)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def update(self, job_id: int, **fields: Any) -> None:
+        """ジョブの行を更新します（status が終了状態なら終了時刻も記録します）。"""
+        assignments = [f"{name} = ?" for name in fields]
+        if fields.get('status') == 'running':
+            assignments.append("started_at = CURRENT_TIMESTAMP")
+        elif 'status' in fields and fields['status'] not in ACTIVE_STATUSES:
+            assignments.append("finished_at = CURRENT_TIMESTAMP")
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute(
+                    f"UPDATE jobs SET {', '.join(assignments)} WHERE id = ?",
+                    (*fields.values(), job_id)
+                )
+        except sqlite3.Error as e:
+            logger.warning(f"ジョブ #{job_id} の状態を保存できませんでした: {e}")
+        finally:
+            conn.close()
+
+    def start(self) -> None:
+        """前回の起動で終わらなかったジョブを中断扱いにして、ワーカーを起動します。"""
+        conn = self._connect()
+        try:
+            with conn:
+                cursor = conn.execute('''
+                    UPDATE jobs
+                    SET status = 'interrupted', finished_at = CURRENT_TIMESTAMP
+                    WHERE status IN ('queued', 'running')
+                ''')
+                if cursor.rowcount:
+                    logger.info(f"前回の起動で終了しなかったジョブ {cursor.rowcount}件を中断扱いにしました")
+        finally:
+            conn.close()
+
+        self._stopping = False
+        self._queue = asyncio.Queue()
+        self._gate = asyncio.Condition()
+        self._running_count = 0
+        self._exclusive_running = False
+        self._exclusive_waiting = 0
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+
+    async def stop(self) -> None:
+        """ワーカーと実行中のジョブを止めます（残ったジョブは中断扱いになります）。"""
+        self._stopping = True
+        for job in list(self._jobs.values()):
+            if job.task is not None:
+                job.task.cancel()
+            self.update(job.id, status='interrupted')
+        self._jobs.clear()
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        self._queue = None
+
+    def active(self, kind: str) -> Optional[Job]:
+        """待機中・実行中の同じ種類のジョブを返します。"""
+        for job in self._jobs.values():
+            if job.kind == kind:
+                return job
+        return None
+
+    async def submit(
+        self,
+        interaction: discord.Interaction,
+        kind: str,
+        run: JobRunner,
+        params: Optional[Dict[str, Any]] = None,
+        exclusive: bool = False
+    ) -> Optional[int]:
+        """ジョブを登録し、インタラクションには登録したことだけを応答します。
+
+        ワーカーが起動していない場合（Jobs Cog が読み込まれていないなど）は、
+        これまでどおりインタラクションの中で直接実行します。
+        exclusive=True のジョブは実行中のジョブがすべて終わってから単独で実行します。
+
+        Returns:
+            Optional[int]: ジョブID（直接実行した場合は None）
+        """
+        if not self.running:
+            await interaction.response.defer(ephemeral=True)
+            try:
+                await run(interaction)
+            except Exception as e:
+                logger.error(f"{kind} の実行中にエラーが発生しました: {e}", exc_info=True)
+                await interaction.followup.send(f"❌ エラーが発生しました: {e}", ephemeral=True)
+            return None
+
+        existing = self.active(kind)
+        if existing is not None:
+            await interaction.response.send_message(
+                f"⏳ 同じ処理（{kind}）がジョブ #{existing.id} として{'実行中' if existing.status == 'running' else '待機中'}です。\n"
+                f"/job_status {existing.id} で進捗を確認できます。",
+                ephemeral=True
+            )
+            return existing.id
+
+        conn = self._connect()
+        try:
+            with conn:
+                cursor = conn.execute('''
+                    INSERT INTO jobs (kind, params, status, requested_by)
+                    VALUES (?, ?, 'queued', ?)
+                ''', (kind, json.dumps(params or {}, ensure_ascii=False), interaction.user.id))
+                job_id = cursor.lastrowid
+        finally:
+            conn.close()
+
+        job = Job(job_id, kind, interaction, run, exclusive)
+        self._jobs[job_id] = job
+        self._queue.put_nowait(job)
+        metrics.increment('jobs.submitted')
+
+        waiting = sum(1 for j in self._jobs.values() if j.status == 'queued') - 1
+        await interaction.response.send_message(
+            f"📋 ジョブ #{job_id}（{kind}）を登録しました。"
+            + (f"\n⏳ 前に{waiting}件のジョブが待機しています。" if waiting > 0 else "")
+            + f"\n進捗はこのメッセージの後に表示されます。/job_status {job_id} でも確認できます。",
+            ephemeral=True
+        )
+        logger.info(f"ジョブ #{job_id}（{kind}）を登録しました: user_id={interaction.user.id}, params={params}")
+        return job_id
+
+    async def cancel(self, job_id: int) -> Optional[str]:
+        """ジョブをキャンセルします。
+
+        Returns:
+            Optional[str]: キャンセル前の状態（待機中・実行中のジョブでなければ None）
+        """
+        job = self._jobs.get(job_id)
+        if job is None:
+            return None
+        previous = job.status
+        if job.task is not None:
+            job.task.cancel()
+        else:
+            # 待機中のジョブはワーカーが取り出したときに捨てる
+            job.status = 'cancelled'
+            del self._jobs[job_id]
+            self.update(job_id, status='cancelled')
+        return previous
+
+    async def _worker(self) -> None:
+        while True:
+            job = await self._queue.get()
+            try:
+                if job.status == 'cancelled':
+                    continue
+                async with self._admit(job.exclusive):
+                    # 順番を待っている間にキャンセルされたジョブは実行しない
+                    if job.status == 'cancelled':
+                        continue
+                    await self._execute(job)
+            finally:
+                self._queue.task_done()
+
+    @asynccontextmanager
+    async def _admit(self, exclusive: bool) -> AsyncIterator[None]:
+        """ジョブの実行枠を確保します。
+
+        排他ジョブは実行中のジョブがなくなるまで待ち、排他ジョブが実行中・待機中の間は
+        他のジョブを開始しません（後から来たジョブが排他ジョブを追い越さないようにする）。
+        """
+        gate = self._gate
+        async with gate:
+            if exclusive:
+                self._exclusive_waiting += 1
+                try:
+                    await gate.wait_for(lambda: not self._exclusive_running and self._running_count == 0)
+                finally:
+                    self._exclusive_waiting -= 1
+                self._exclusive_running = True
+            else:
+                await gate.wait_for(lambda: not self._exclusive_running and self._exclusive_waiting == 0)
+                self._running_count += 1
+        try:
+            yield
+        finally:
+            async with gate:
+                if exclusive:
+                    self._exclusive_running = False
+                else:
+                    self._running_count -= 1
+                gate.notify_all()
+
+    async def _execute(self, job: Job) -> None:
+        context = JobContext(self, job)
+        job.status = 'running'
+        self.update(job.id, status='running')
+        logger.info(f"ジョブ #{job.id}（{job.kind}）を開始しました")
+        job.task = asyncio.create_task(job.run(context))
+        try:
+            result = await job.task
+        except asyncio.CancelledError:
+            if self._stopping:
+                # ワーカー自体の停止（状態は stop() で中断扱いにする）
+                raise
+            self.update(job.id, status='cancelled')
+            metrics.increment('jobs.cancelled')
+            logger.info(f"ジョブ #{job.id}（{job.kind}）をキャンセルしました")
+            await context.deliver(f"🛑 ジョブ #{job.id}（{job.kind}）をキャンセルしました。", None)
+        except Exception as e:
+            self.update(job.id, status='failed', error=str(e)[:MAX_PROGRESS_LENGTH])
+            metrics.increment('jobs.failed')
+            logger.error(f"ジョブ #{job.id}（{job.kind}）が失敗しました: {e}", exc_info=True)
+            await context.deliver(f"❌ ジョブ #{job.id}（{job.kind}）が失敗しました: {e}", None)
+        else:
+            fields: Dict[str, Any] = {'status': 'succeeded'}
+            if isinstance(result, str):
+                fields['result'] = result[:MAX_PROGRESS_LENGTH]
+            self.update(job.id, **fields)
+            metrics.increment('jobs.succeeded')
+            logger.info(f"ジョブ #{job.id}（{job.kind}）が完了しました")
+        finally:
+            self._jobs.pop(job.id, None)
+
+    def get(self, job_id: int) -> Optional[sqlite3.Row]:
+        conn = self._connect()
+        try:
+            return conn.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        finally:
+            conn.close()
+
+    def recent(self, limit: int = 10) -> List[sqlite3.Row]:
+        conn = self._connect()
+        try:
+            return conn.execute(
+                'SELECT * FROM jobs ORDER BY id DESC LIMIT ?', (limit,)
+            ).fetchall()
+        finally:
+            conn.close()
+
+
+# 全 Cog で共有するインスタンス
+job_manager = JobManager()
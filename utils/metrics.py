@@ -0,0 +1,40 @@
+"""プロセス内の簡易メトリクス
+
+カウンターと所要時間の集計をメモリ上に保持し、`/metrics` コマンドで表示します。
+"""
+
+from __future__ import annotations
+
+import threading
+from collections import Counter
+from typing import Dict, Tuple
+
+_lock = threading.Lock()
+_counters: Counter = Counter()
+# name -> (件数, 合計秒, 最大秒)
+_timings: Dict[str, Tuple[int, float, float]] = {}
+
+
+def increment(name: str, value: int = 1) -> None:
+    """カウンターを加算します。"""
+    with _lock:
+        _counters[name] += value
+
+
+def observe(name: str, seconds: float) -> None:
+    """所要時間を記録します。"""
+    with _lock:
+        count, total, peak = _timings.get(name, (0, 0.0, 0.0))
+        _timings[name] = (count + 1, total + seconds, max(peak, seconds))
+
+
+def counters() -> Dict[str, int]:
+    """カウンターのスナップショットを返します。"""
+    with _lock:
+        return dict(_counters)
+
+
+def timings() -> Dict[str, Tuple[int, float, float]]:
+    """所要時間のスナップショットを (件数, 平均秒, 最大秒) で返します。"""
+    with _lock:
+        return {name: (count, total / count, peak) for name, (count, total, peak) in _timings.items() if count}
@@ -0,0 +1,138 @@
+"""投稿IDの入力補完用インデックス
+
+ユーザーごとに最近の投稿 (post_id, プレビュー, カテゴリー) をメモリに保持し、
+`/edit` や `/delete` の投稿ID入力補完をキー入力ごとのDBクエリなしで返します。
+ユーザーの初回補完時にDBから読み込み（遅延ウォームアップ）、投稿・編集・削除の
+たびに更新します。
+"""
+
+from __future__ import annotations
+
+import sqlite3
+from collections import OrderedDict
+from typing import Iterable, List, NamedTuple, Optional, Tuple
+
+from discord import app_commands
+
+# ユーザーごとに保持する投稿数
+MAX_POSTS_PER_USER = 200
+# インデックスを保持するユーザー数
+MAX_USERS = 1000
+# プレビューの文字数
+PREVIEW_LENGTH = 60
+# Discord の補完候補の最大数
+MAX_CHOICES = 25
+
+
+class IndexedPost(NamedTuple):
+    """補完候補の1件"""
+    post_id: int
+    preview: str
+    category: Optional[str]
+
+
+def _preview(content: Optional[str]) -> str:
+    return ' '.join((content or '').split())[:PREVIEW_LENGTH]
+
+
+class RecentPostIndex:
+    """ユーザーごとの最近の投稿を新しい順に保持するクラス"""
+
+    def __init__(self, max_posts: int = MAX_POSTS_PER_USER, max_users: int = MAX_USERS) -> None:
+        self.max_posts = max_posts
+        self.max_users = max_users
+        self._users: "OrderedDict[int, List[IndexedPost]]" = OrderedDict()
+
+    def is_warm(self, user_id: int) -> bool:
+        return user_id in self._users
+
+    def load(self, user_id: int, rows: Iterable[Tuple[int, Optional[str], Optional[str]]]) -> None:
+        """DBから読み込んだ (id, content, category) を新しい順に登録します。"""
+        self._users[user_id] = [
+            IndexedPost(int(post_id), _preview(content), category)
+            for post_id, content, category in rows
+        ][:self.max_posts]
+        self._users.move_to_end(user_id)
+        while len(self._users) > self.max_users:
+            self._users.popitem(last=False)
+
+    def warm(self, user_id: int, conn: sqlite3.Connection) -> None:
+        """ユーザーの最近の投稿をDBから読み込みます（削除済みは除外）。"""
+        cursor = conn.execute('''
+            SELECT id, content, category
+            FROM thoughts
+            WHERE user_id = ? AND deleted_at IS NULL
+            ORDER BY created_at DESC
+            LIMIT ?
+        ''', (user_id, self.max_posts))
+        self.load(user_id, cursor.fetchall())
+
+    def add(self, user_id: int, post_id: int, content: Optional[str], category: Optional[str]) -> None:
+        """新しい投稿を先頭に追加します（未ウォームアップのユーザーは次回の読み込みに任せます）。"""
+        posts = self._users.get(user_id)
+        if posts is None:
+            return
+        posts[:] = [p for p in posts if p.post_id != post_id]
+        posts.insert(0, IndexedPost(post_id, _preview(content), category))
+        del posts[self.max_posts:]
+
+    def update(self, user_id: int, post_id: int, content: Optional[str], category: Optional[str]) -> None:
+        """編集された投稿のプレビューとカテゴリーを更新します。"""
+        posts = self._users.get(user_id)
+        if posts is None:
+            return
+        for i, post in enumerate(posts):
+            if post.post_id == post_id:
+                posts[i] = IndexedPost(post_id, _preview(content), category)
+                return
+
+    def remove(self, user_id: int, post_id: int) -> None:
+        """削除された投稿を取り除きます。"""
+        posts = self._users.get(user_id)
+        if posts is not None:
+            posts[:] = [p for p in posts if p.post_id != post_id]
+
+    def clear(self) -> None:
+        """すべてのインデックスを破棄します（投稿者の付け替えなど）。"""
+        self._users.clear()
+
+    def search(self, user_id: int, current: str, limit: int = MAX_CHOICES) -> List[IndexedPost]:
+        """入力中の文字列に一致する投稿を返します。
+
+        数字だけなら投稿IDの前方一致、それ以外は本文・カテゴリーの部分一致で探します。
+        """
+        posts = self._users.get(user_id)
+        if posts is None:
+            return []
+        self._users.move_to_end(user_id)
+        current = current.strip()
+        if not current:
+            return posts[:limit]
+        if current.isdigit():
+            matches = (p for p in posts if str(p.post_id).startswith(current))
+        else:
+            needle = current.lower()
+            matches = (
+                p for p in posts
+                if needle in p.preview.lower() or (p.category and needle in p.category.lower())
+            )
+        result = []
+        for post in matches:
+            result.append(post)
+            if len(result) >= limit:
+                break
+        return result
+
+    def choices(self, user_id: int, current: str) -> List[app_commands.Choice[int]]:
+        """補完候補を Discord の Choice として返します。"""
+        choices = []
+        for post in self.search(user_id, current):
+            label = f"{post.post_id}: {post.preview}"
+            if post.category:
+                label += f" [{post.category}]"
+            choices.append(app_commands.Choice(name=label[:100], value=post.post_id))
+        return choices
+
+
+# 全 Cog で共有するインスタンス
+recent_post_index = RecentPostIndex()
@@ -0,0 +1,149 @@
+"""投稿者プロフィールのキャッシュ
+
+埋め込みの描画に必要な投稿者の名前とアイコンURLを `user_profiles` テーブルに
+保存し、その手前にメモリ上の LRU を置きます。インタラクションやメンバー更新
+イベントのたびに最新の値で上書きするため、再起動後も `fetch_user` や
+`fetch_member` をほとんど呼ばずに大量の投稿を描画し直せます。
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import sqlite3
+import time
+from collections import OrderedDict
+from typing import NamedTuple, Optional, Union
+
+import discord
+
+from utils import metrics
+
+logger = logging.getLogger(__name__)
+
+# この秒数を過ぎたプロフィールは取り直す（取り直せなければ古い値を使う）
+PROFILE_TTL = 7 * 24 * 60 * 60
+# 値が変わっていなくてもこの秒数ごとにDBの更新時刻を進める
+PROFILE_TOUCH_INTERVAL = 24 * 60 * 60
+
+
+class Profile(NamedTuple):
+    """投稿者の表示情報"""
+    user_id: int
+    username: str
+    display_name: str
+    avatar_url: Optional[str]
+    updated_at: float
+
+    def is_fresh(self) -> bool:
+        return time.time() - self.updated_at < PROFILE_TTL
+
+
+def _from_user(user: Union[discord.User, discord.Member]) -> Profile:
+    return Profile(user.id, str(user), user.display_name, user.display_avatar.url, time.time())
+
+
+class ProfileCache:
+    """user_profiles テーブルとメモリ上の LRU からなる2段のキャッシュ"""
+
+    def __init__(self, maxsize: int = 4096) -> None:
+        self.maxsize = maxsize
+        self._profiles: "OrderedDict[int, Profile]" = OrderedDict()
+
+    @property
+    def db_path(self) -> str:
+        return os.getenv('DB_PATH', 'thoughts.db')
+
+    def _put_memory(self, profile: Profile) -> None:
+        self._profiles[profile.user_id] = profile
+        self._profiles.move_to_end(profile.user_id)
+        while len(self._profiles) > self.maxsize:
+            self._profiles.popitem(last=False)
+
+    def _load(self, user_id: int) -> Optional[Profile]:
+        conn = sqlite3.connect(self.db_path, timeout=30.0)
+        try:
+            row = conn.execute('''
+                SELECT user_id, username, display_name, avatar_url, updated_at
+                FROM user_profiles WHERE user_id = ?
+            ''', (user_id,)).fetchone()
+        finally:
+            conn.close()
+        return Profile(*row) if row else None
+
+    def _store(self, profile: Profile) -> None:
+        conn = sqlite3.connect(self.db_path, timeout=30.0)
+        try:
+            with conn:
+                conn.execute('''
+                    INSERT INTO user_profiles (user_id, username, display_name, avatar_url, updated_at)
+                    VALUES (?, ?, ?, ?, ?)
+                    ON CONFLICT (user_id) DO UPDATE SET
+                        username = excluded.username,
+                        display_name = excluded.display_name,
+                        avatar_url = excluded.avatar_url,
+                        updated_at = excluded.updated_at
+                ''', profile)
+        finally:
+            conn.close()
+
+    def remember(self, user: Union[discord.User, discord.Member]) -> Profile:
+        """ユーザーの最新の表示情報を記録します。
+
+        値が変わった場合か、前回の記録から PROFILE_TOUCH_INTERVAL 経過した場合だけ
+        DBに書き込みます。
+        """
+        profile = _from_user(user)
+        cached = self._profiles.get(user.id)
+        if (
+            cached is not None
+            and cached[1:4] == profile[1:4]
+            and profile.updated_at - cached.updated_at < PROFILE_TOUCH_INTERVAL
+        ):
+            return cached
+        self._put_memory(profile)
+        try:
+            self._store(profile)
+        except sqlite3.Error as e:
+            logger.warning(f"プロフィールの保存に失敗しました: user_id={user.id}, error={e}")
+        return profile
+
+    async def resolve(self, bot: discord.Client, user_id: int) -> Optional[Profile]:
+        """投稿者の表示情報を返します。
+
+        メモリ → DB → ボットのキャッシュ → API (fetch_user) の順に探し、
+        API でも取得できなければ期限切れの値を返します。
+        """
+        user_id = int(user_id)
+        profile = self._profiles.get(user_id)
+        if profile is not None:
+            self._profiles.move_to_end(user_id)
+        else:
+            try:
+                profile = self._load(user_id)
+            except sqlite3.Error as e:
+                logger.warning(f"プロフィールの読み込みに失敗しました: user_id={user_id}, error={e}")
+            if profile is not None:
+                self._put_memory(profile)
+
+        if profile is not None and profile.is_fresh():
+            metrics.increment('profiles.hit')
+            return profile
+
+        user = bot.get_user(user_id)
+        if user is None:
+            metrics.increment('profiles.fetch')
+            try:
+                user = await bot.fetch_user(user_id)
+            except discord.HTTPException as e:
+                logger.info(f"ユーザー情報を取得できませんでした: user_id={user_id}, error={e}")
+                return profile
+        return self.remember(user)
+
+    def clear(self) -> None:
+        """メモリ上のキャッシュを破棄します（バックアップからの復元時）。"""
+        self._profiles.clear()
+
+
+# 全 Cog で共有するインスタンス
+profile_cache = ProfileCache()
@@ -0,0 +1,169 @@
+"""長時間かかる管理コマンドの進捗表示
+
+進捗のたびにフォローアップを送るとその分だけ Webhook の呼び出しが増え、
+処理そのものの API 呼び出しとレート制限を取り合います。ProgressReporter は
+1つのメッセージだけを送り、数秒に1回までの頻度でそのメッセージを編集して
+件数・速度・残り時間・エラーを表示します。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from typing import Callable, List, Optional
+
+import discord
+
+logger = logging.getLogger(__name__)
+
+# 進捗メッセージを編集する最短間隔（秒）
+PROGRESS_INTERVAL = 3.0
+# 表示する直近のエラーの数
+MAX_SHOWN_ERRORS = 3
+# Discord のメッセージの最大文字数
+MAX_MESSAGE_LENGTH = 2000
+
+
+def format_duration(seconds: float) -> str:
+    """秒数を「1時間2分」「3分4秒」のような表記にします。"""
+    seconds = int(seconds)
+    hours, rest = divmod(seconds, 3600)
+    minutes, secs = divmod(rest, 60)
+    if hours:
+        return f"{hours}時間{minutes}分"
+    if minutes:
+        return f"{minutes}分{secs}秒"
+    return f"{secs}秒"
+
+
+class ProgressReporter:
+    """1つのメッセージを編集して進捗を表示するクラス
+
+    使い方::
+
+        progress = ProgressReporter("🔍 メッセージ参照を確認しています", total=len(rows))
+        await progress.start(interaction)
+        async with progress:                # 処理中は定期的に表示を更新する
+            for row in rows:
+                ...
+                progress.advance()
+        await progress.finish("✅ 完了しました")
+
+    advance() や add_error() は表示を更新しません。表示は update() か、
+    async with の間に動く定期更新で PROGRESS_INTERVAL 秒に1回まで行われます。
+    """
+
+    def __init__(
+        self,
+        title: str,
+        total: Optional[int] = None,
+        unit: str = "件",
+        interval: float = PROGRESS_INTERVAL,
+    ) -> None:
+        self.title = title
+        self.total = total
+        self.unit = unit
+        self.interval = interval
+        self.done = 0
+        self.error_count = 0
+        # 追加の表示行を返す関数（チャンネルごとの状況など）
+        self.detail: Optional[Callable[[], List[str]]] = None
+        self.message: Optional[discord.abc.Snowflake] = None
+        self._errors: List[str] = []
+        self._started = time.monotonic()
+        self._last_update = 0.0
+        self._refresher: Optional[asyncio.Task] = None
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self._started
+
+    @property
+    def rate(self) -> float:
+        """1秒あたりの処理件数"""
+        elapsed = self.elapsed
+        return self.done / elapsed if elapsed > 0 else 0.0
+
+    @property
+    def eta(self) -> Optional[float]:
+        """残り時間の見込み（秒）"""
+        if self.total is None or self.done == 0:
+            return None
+        return max(self.total - self.done, 0) / self.rate if self.rate > 0 else None
+
+    async def start(self, interaction: discord.Interaction) -> None:
+        """進捗メッセージをフォローアップとして送信します。"""
+        self._started = time.monotonic()
+        self._last_update = self._started
+        self.message = await interaction.followup.send(self.render(), ephemeral=True, wait=True)
+
+    def advance(self, count: int = 1) -> None:
+        self.done += count
+
+    def add_error(self, error: str) -> None:
+        """エラーを記録します（表示するのは直近の MAX_SHOWN_ERRORS 件だけ）。"""
+        self.error_count += 1
+        self._errors.append(error)
+        del self._errors[:-MAX_SHOWN_ERRORS]
+
+    def render(self) -> str:
+        lines = [f"{self.title}..."]
+        if self.total is not None:
+            percent = self.done / self.total * 100 if self.total else 100.0
+            lines.append(f"📊 {self.done}/{self.total}{self.unit} ({percent:.0f}%)")
+        else:
+            lines.append(f"📊 {self.done}{self.unit}")
+        status = f"⏱️ 経過 {format_duration(self.elapsed)} / {self.rate:.1f}{self.unit}/秒"
+        if self.eta is not None:
+            status += f" / 残り約 {format_duration(self.eta)}"
+        lines.append(status)
+        if self.detail is not None:
+            lines.extend(self.detail())
+        if self.error_count:
+            lines.append(f"⚠️ エラー: {self.error_count}件")
+            lines.extend(f"• {error}" for error in self._errors)
+        return "\n".join(lines)[:MAX_MESSAGE_LENGTH]
+
+    async def _edit(self, content: str) -> None:
+        if self.message is None:
+            return
+        try:
+            await self.message.edit(content=content[:MAX_MESSAGE_LENGTH])
+        except discord.HTTPException as e:
+            logger.warning(f"進捗メッセージを更新できませんでした: {e}")
+
+    async def update(self, force: bool = False) -> None:
+        """前回の更新から interval 秒以上経っていれば表示を更新します。"""
+        now = time.monotonic()
+        if not force and now - self._last_update < self.interval:
+            return
+        self._last_update = now
+        await self._edit(self.render())
+
+    async def finish(self, summary: str) -> None:
+        """定期更新を止め、進捗メッセージを最終結果に置き換えます。"""
+        await self._stop_refresher()
+        await self._edit(summary)
+
+    async def _refresh(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.update()
+
+    async def _stop_refresher(self) -> None:
+        if self._refresher is not None:
+            self._refresher.cancel()
+            try:
+                await self._refresher
+            except asyncio.CancelledError:
+                pass
+            self._refresher = None
+
+    async def __aenter__(self) -> "ProgressReporter":
+        if self._refresher is None:
+            self._refresher = asyncio.create_task(self._refresh())
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        await self._stop_refresher()
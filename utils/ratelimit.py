@@ -0,0 +1,135 @@
+"""書き込み系コマンドの流量制御
+
+ユーザーごとのレート制限と、同時に実行される書き込み処理の上限を管理します。
+上限を超えた場合は待たせずに「N秒後に再試行」を返します。
+
+モーダルを開くコマンドでは、コマンドの実行時とモーダルの送信時の2回判定します。
+モーダルはいくつでも同時に開いたままにできるため、実際に書き込む送信時に
+check_capacity() で判定してから slot() に入ります（間に await を挟まないこと）。
+"""
+
+from __future__ import annotations
+
+import contextlib
+import math
+import time
+from collections import deque
+from typing import Deque, Dict, Iterator
+
+import discord
+from discord import app_commands
+
+from utils import metrics
+
+# ユーザーごとの上限: WRITE_PERIOD 秒あたり WRITE_BURST 回
+WRITE_BURST = 5
+WRITE_PERIOD = 10.0
+# 同時に処理する書き込みの上限
+MAX_CONCURRENT_WRITES = 8
+# 全体が混雑しているときに案内する待ち時間（秒）
+GLOBAL_RETRY_AFTER = 3.0
+
+
+class AdmissionDenied(app_commands.CheckFailure):
+    """流量制限によりコマンドを受け付けなかったことを表す例外"""
+
+    def __init__(self, retry_after: float, reason: str) -> None:
+        self.retry_after = retry_after
+        self.reason = reason
+        super().__init__(f"{reason}: retry after {retry_after:.1f}s")
+
+    @property
+    def retry_after_seconds(self) -> int:
+        return max(1, math.ceil(self.retry_after))
+
+
+class UserRateLimiter:
+    """ユーザーごとのトークンバケット
+
+    直近 burst 回の実行時刻を長さ固定のリングバッファに保持し、
+    最も古い実行から period 秒経過するまで次の実行を拒否します。
+    判定・記録ともに O(1) です。
+    """
+
+    def __init__(self, burst: int = WRITE_BURST, period: float = WRITE_PERIOD) -> None:
+        self.burst = burst
+        self.period = period
+        self._history: Dict[int, Deque[float]] = {}
+
+    def acquire(self, user_id: int) -> float:
+        """実行可能なら記録して 0 を、不可なら再試行までの秒数を返します。"""
+        now = time.monotonic()
+        history = self._history.get(user_id)
+        if history is None:
+            if len(self._history) >= 4096:
+                self._prune(now)
+            history = self._history[user_id] = deque(maxlen=self.burst)
+        elif len(history) == self.burst:
+            elapsed = now - history[0]
+            if elapsed < self.period:
+                return self.period - elapsed
+        history.append(now)
+        return 0.0
+
+    def _prune(self, now: float) -> None:
+        """しばらく実行していないユーザーの記録を捨てます。"""
+        idle = [user_id for user_id, history in self._history.items() if now - history[-1] >= self.period]
+        for user_id in idle:
+            del self._history[user_id]
+
+
+class AdmissionController:
+    """書き込み系コマンドの受付可否を判定するクラス"""
+
+    def __init__(self, max_concurrent: int = MAX_CONCURRENT_WRITES) -> None:
+        self.max_concurrent = max_concurrent
+        self.in_flight = 0
+        self.users = UserRateLimiter()
+
+    def check_capacity(self) -> None:
+        """同時実行数に空きがなければ AdmissionDenied を送出します。"""
+        if self.in_flight >= self.max_concurrent:
+            metrics.increment('admission.denied.global')
+            raise AdmissionDenied(GLOBAL_RETRY_AFTER, "global")
+
+    def admit(self, user_id: int) -> None:
+        """受付可能か判定し、不可なら AdmissionDenied を送出します。"""
+        self.check_capacity()
+
+        retry_after = self.users.acquire(user_id)
+        if retry_after > 0:
+            metrics.increment('admission.denied.user')
+            raise AdmissionDenied(retry_after, "user")
+
+    @contextlib.contextmanager
+    def slot(self) -> Iterator[None]:
+        """実行中の書き込み処理として数えるコンテキストマネージャ"""
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+
+
+# 全 Cog で共有するインスタンス
+admission = AdmissionController()
+
+
+async def send_admission_denied(interaction: discord.Interaction, error: AdmissionDenied) -> None:
+    """受け付けなかったことと再試行までの目安をユーザーに伝えます。"""
+    # 混雑時はキューに積まず、すぐに再試行の目安を返す
+    message = f"⏳ 現在混み合っています。{error.retry_after_seconds}秒後にもう一度お試しください。"
+    if interaction.response.is_done():
+        await interaction.followup.send(message, ephemeral=True)
+    else:
+        await interaction.response.send_message(message, ephemeral=True)
+
+
+def write_command_check():
+    """書き込み系コマンドに付ける app_commands のチェック"""
+
+    async def predicate(interaction: discord.Interaction) -> bool:
+        admission.admit(interaction.user.id)
+        return True
+
+    return app_commands.check(predicate)
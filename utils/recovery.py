@@ -0,0 +1,451 @@
+"""投稿の復元処理
+
+Discord のメッセージやローカルに保存したチャンネルのエクスポートから読み取った投稿を
+thoughts と message_references に書き戻します。復元する行はバッファにためて
+短いトランザクションごとに書き込み、既存の投稿は `INSERT OR IGNORE` で飛ばします。
+チャンク間で書き込みロックを手放すため、復元中も通常の投稿や編集が待たされません。
+
+エクスポートは JSON（メッセージの配列、または DiscordChatExporter 形式）と
+JSONL（1行に1メッセージ）に対応し、ファイル全体を読み込まずに1メッセージずつ
+デコードします。
+"""
+
+from __future__ import annotations
+
+import json
+import sqlite3
+from datetime import datetime, timezone
+from typing import IO, Any, Callable, Dict, Iterator, List, NamedTuple, Optional, Set, Tuple, Union
+
+import discord
+
+from config import CHANNELS, DEFAULT_AVATAR
+from utils.footer import decode_footer
+
+# 1回のトランザクションで書き込む投稿数
+RECOVERY_CHUNK_SIZE = 500
+# エクスポートからの復元で1回のトランザクションで書き込む投稿数
+EXPORT_CHUNK_SIZE = 5000
+# エクスポートファイルを1回に読み込む文字数
+EXPORT_READ_SIZE = 1 << 20
+# この件数のメッセージを処理するごとに進捗を通知する
+EXPORT_PROGRESS_INTERVAL = 1000
+# 読み込んだ範囲の終わりで切れうる語（true / false / null）や \uXXXX エスケープの長さ
+_TOKEN_TAIL = 6
+# 匿名の投稿の表示名（投稿時と再送信時）
+ANONYMOUS_NAMES = ("匿名ユーザー", "匿名")
+
+
+class RecoveredPost(NamedTuple):
+    """復元する投稿1件"""
+    post_id: int
+    content: str
+    category: Optional[str]
+    is_anonymous: bool
+    is_private: bool
+    user_id: int
+    created_at: Union[datetime, str, None]
+    message_id: Optional[str] = None
+    channel_id: Optional[str] = None
+    webhook_id: Optional[str] = None
+
+
+def parse_post_embed(
+    description: Optional[str],
+    footer_text: Optional[str],
+    author_name: Optional[str],
+    author_icon_url: Optional[str],
+) -> Optional[Tuple[int, str, Optional[str], bool, Optional[int]]]:
+    """投稿の埋め込みの内容から (投稿ID, 本文, カテゴリー, 匿名か, 投稿者ID) を読み取ります。
+
+    投稿者IDはフッターに書かれていた頃（版0）の投稿でだけ分かり、それ以外は None です。
+    """
+    # 投稿内容を取得
+    content = description
+    if not content:
+        return None
+
+    # フッターから投稿IDとカテゴリーを読み取る（過去の書式にも対応）
+    footer = decode_footer(footer_text)
+    if footer is None or not footer.post_id:
+        return None
+
+    # 匿名設定を判定（名前とアイコンのどちらか一方でも匿名なら匿名として扱う）
+    is_anonymous = author_name in ANONYMOUS_NAMES
+    if author_icon_url:
+        is_anonymous = is_anonymous or author_icon_url == DEFAULT_AVATAR
+
+    return footer.post_id, content, footer.category, is_anonymous, footer.user_id
+
+
+def parse_post_message(
+    message: discord.Message,
+    channel_id: int,
+    is_private: bool,
+    user_id: int,
+) -> Optional[RecoveredPost]:
+    """ボットが送信した投稿メッセージの埋め込みから投稿を読み取ります。
+
+    投稿者はフッターに書かれていなければ分からないため、呼び出し側が暫定の user_id を渡します。
+    """
+    if not (message.author.bot and message.embeds):
+        return None
+    embed = message.embeds[0]
+    parsed = parse_post_embed(
+        embed.description,
+        embed.footer.text if embed.footer else None,
+        embed.author.name,
+        embed.author.icon_url,
+    )
+    if parsed is None:
+        return None
+
+    post_id, content, category, is_anonymous, footer_user_id = parsed
+    return RecoveredPost(
+        post_id=post_id,
+        content=content,
+        category=category,
+        is_anonymous=is_anonymous,
+        is_private=is_private,
+        user_id=footer_user_id or user_id,
+        created_at=message.created_at,
+        message_id=str(message.id),
+        channel_id=str(channel_id),
+        webhook_id=str(message.webhook_id) if message.webhook_id else None,
+    )
+
+
+def parse_export_message(
+    data: Dict[str, Any],
+    channel_id: Union[int, str],
+    is_private: bool,
+    user_id: int,
+) -> Optional[RecoveredPost]:
+    """エクスポートされたメッセージ（API の JSON または DiscordChatExporter 形式）から投稿を読み取ります。"""
+    author = data.get('author') or {}
+    embeds = data.get('embeds') or []
+    if not ((author.get('bot') or author.get('isBot')) and embeds):
+        return None
+    embed = embeds[0]
+    footer = embed.get('footer') or {}
+    embed_author = embed.get('author') or {}
+    parsed = parse_post_embed(
+        embed.get('description'),
+        footer.get('text'),
+        embed_author.get('name'),
+        embed_author.get('icon_url') or embed_author.get('iconUrl'),
+    )
+    if parsed is None:
+        return None
+
+    post_id, content, category, is_anonymous, footer_user_id = parsed
+    timestamp = data.get('timestamp')
+    webhook_id = data.get('webhook_id') or data.get('webhookId')
+    return RecoveredPost(
+        post_id=post_id,
+        content=content,
+        category=category,
+        is_anonymous=is_anonymous,
+        is_private=is_private,
+        user_id=footer_user_id or user_id,
+        created_at=datetime.fromisoformat(timestamp) if timestamp else None,
+        message_id=str(data['id']) if data.get('id') else None,
+        channel_id=str(channel_id),
+        webhook_id=str(webhook_id) if webhook_id else None,
+    )
+
+
+def _db_timestamp(value: Union[datetime, str, None]) -> Union[str, None]:
+    """CURRENT_TIMESTAMP と同じ UTC の 'YYYY-MM-DD HH:MM:SS' 形式にします。"""
+    if isinstance(value, datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+    return value
+
+
+def save_checkpoint(cursor: sqlite3.Cursor, channel_id: int, message_id: int) -> None:
+    """チャンネル（スレッド）の処理済みの最新メッセージIDを保存します。"""
+    cursor.execute('''
+        INSERT INTO recovery_checkpoints (channel_id, last_message_id, updated_at)
+        VALUES (?, ?, CURRENT_TIMESTAMP)
+        ON CONFLICT (channel_id) DO UPDATE SET
+            last_message_id = excluded.last_message_id,
+            updated_at = excluded.updated_at
+    ''', (str(channel_id), str(message_id)))
+
+
+def load_checkpoint(conn: sqlite3.Connection, channel_id: int) -> Optional[int]:
+    """チャンネル（スレッド）の処理済みの最新メッセージIDを返します。"""
+    row = conn.execute(
+        'SELECT last_message_id FROM recovery_checkpoints WHERE channel_id = ?',
+        (str(channel_id),)
+    ).fetchone()
+    return int(row[0]) if row else None
+
+
+class RecoveryWriter:
+    """復元する投稿をためてまとめて書き込むクラス
+
+    使い方::
+
+        writer = RecoveryWriter(conn)
+        writer.add(post)            # DBにある投稿IDは無視される
+        writer.flush(checkpoint=(channel_id, message_id))
+
+    conn は自動コミット（isolation_level=None）の接続を想定しています。
+    DBにある投稿は書き込み時に `INSERT OR IGNORE` で飛ばし、挿入できた投稿だけ
+    メッセージ参照を書き込みます。track_existing=True（既定）の場合は既存の投稿IDを
+    最初に読み込み、add() の時点で判定します。件数の分からないエクスポートからの
+    復元では track_existing=False にしてメモリ使用量を一定に保ちます。
+    """
+
+    def __init__(
+        self,
+        conn: sqlite3.Connection,
+        chunk_size: int = RECOVERY_CHUNK_SIZE,
+        track_existing: bool = True,
+    ) -> None:
+        self.conn = conn
+        self.chunk_size = chunk_size
+        self.recovered = 0
+        self._pending: List[RecoveredPost] = []
+        self._existing: Optional[Set[int]] = None
+        if track_existing:
+            self._existing = {row[0] for row in conn.execute('SELECT id FROM thoughts')}
+
+    def __contains__(self, post_id: int) -> bool:
+        return self._existing is not None and post_id in self._existing
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def add(self, post: RecoveredPost) -> bool:
+        """投稿をバッファに追加します（DBにあると分かっている投稿なら何もしません）。
+
+        バッファが chunk_size に達したら書き込みます（チェックポイントは進めません）。
+
+        Returns:
+            bool: 復元対象として追加した場合は True（track_existing=False では常に True）
+        """
+        if self._existing is not None:
+            if post.post_id in self._existing:
+                return False
+            self._existing.add(post.post_id)
+        self._pending.append(post)
+        if len(self._pending) >= self.chunk_size:
+            self.flush()
+        return True
+
+    def flush(self, checkpoint: Optional[Tuple[int, int]] = None) -> int:
+        """ためた投稿を1つのトランザクションで書き込みます。
+
+        checkpoint に (channel_id, message_id) を渡すと、同じトランザクションで
+        recovery_checkpoints も更新します。
+
+        Returns:
+            int: 書き込んだ投稿数（DBにあった投稿は含みません）
+        """
+        posts, self._pending = self._pending, []
+        if not posts and checkpoint is None:
+            return 0
+
+        cursor = self.conn.cursor()
+        cursor.execute('BEGIN IMMEDIATE')
+        try:
+            inserted = []
+            for p in posts:
+                cursor.execute('''
+                    INSERT OR IGNORE INTO thoughts (id, content, category, is_anonymous, is_private, user_id, created_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                ''', (p.post_id, p.content, p.category, int(p.is_anonymous), int(p.is_private), p.user_id, _db_timestamp(p.created_at)))
+                if cursor.rowcount:
+                    inserted.append(p)
+            # 投稿の消えた古い参照が残っていれば置き換える（既存の投稿の参照には触れない）
+            cursor.executemany('''
+                INSERT OR REPLACE INTO message_references (post_id, message_id, channel_id, webhook_id)
+                VALUES (?, ?, ?, ?)
+            ''', [
+                (p.post_id, p.message_id, p.channel_id, p.webhook_id)
+                for p in inserted if p.message_id and p.channel_id
+            ])
+            if checkpoint is not None:
+                save_checkpoint(cursor, *checkpoint)
+            cursor.execute('COMMIT')
+        except BaseException:
+            cursor.execute('ROLLBACK')
+            # 書き込めなかった投稿は次回の復元で拾えるようにする
+            if self._existing is not None:
+                self._existing.difference_update(p.post_id for p in posts)
+            raise
+
+        self.recovered += len(inserted)
+        return len(inserted)
+
+
+class _JsonStream:
+    """ファイルから JSON の値を1つずつデコードするクラス（ファイル全体は読み込みません）"""
+
+    def __init__(self, f: IO[str], read_size: int = EXPORT_READ_SIZE) -> None:
+        self._f = f
+        self._read_size = read_size
+        self._buf = ''
+        self._pos = 0
+        self._eof = False
+        self._decoder = json.JSONDecoder()
+
+    def _fill(self) -> bool:
+        if self._eof:
+            return False
+        data = self._f.read(self._read_size)
+        if not data:
+            self._eof = True
+            return False
+        # 読み終えた部分は捨てる
+        self._buf = self._buf[self._pos:] + data
+        self._pos = 0
+        return True
+
+    def peek(self) -> str:
+        """空白を読み飛ばし、次の文字を返します（ファイルの終わりなら空文字）。"""
+        while True:
+            while self._pos < len(self._buf) and self._buf[self._pos] in ' \t\r\n':
+                self._pos += 1
+            if self._pos < len(self._buf):
+                return self._buf[self._pos]
+            if not self._fill():
+                return ''
+
+    def expect(self, char: str) -> None:
+        found = self.peek()
+        if found != char:
+            raise ValueError(f"エクスポートの形式が正しくありません: '{char}' が必要ですが '{found}' がありました")
+        self._pos += 1
+
+    def _truncated(self, error: json.JSONDecodeError) -> bool:
+        """デコードの失敗が、値が読み込んだ範囲の終わりで切れているためかどうかを返します。"""
+        # 閉じていない文字列は必ず範囲の終わりまで続いている
+        if error.msg.startswith('Unterminated string'):
+            return True
+        return len(self._buf) - error.pos < _TOKEN_TAIL
+
+    def decode(self) -> Any:
+        """次の値を1つデコードします。
+
+        値が読み込んだ範囲の終わりで切れている場合だけ続きを読み込みます。
+        それ以外の位置の構文エラーは、残りを読み込まずにすぐ送出します。
+        """
+        self.peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buf, self._pos)
+            except json.JSONDecodeError as e:
+                if not self._truncated(e) or not self._fill():
+                    raise
+                continue
+            if (
+                len(self._buf) - end < _TOKEN_TAIL
+                and not isinstance(value, (dict, list, str))
+                and self._fill()
+            ):
+                # 数値などは続きがあるかもしれないので読み直す
+                continue
+            self._pos = end
+            return value
+
+    def iter_array(self) -> Iterator[Any]:
+        """配列の要素を1つずつデコードします。"""
+        self.expect('[')
+        if self.peek() == ']':
+            self._pos += 1
+            return
+        while True:
+            yield self.decode()
+            if self.peek() == ',':
+                self._pos += 1
+                continue
+            self.expect(']')
+            return
+
+
+def iter_export_messages(path: str) -> Iterator[Tuple[Optional[str], Dict[str, Any]]]:
+    """エクスポートファイルのメッセージを (チャンネルID, メッセージ) として1件ずつ返します。
+
+    次の形式に対応します。チャンネルIDがファイルから分からない場合は None です。
+
+    - JSONL: 1行に1メッセージ（拡張子 .jsonl / .ndjson）
+    - JSON: メッセージの配列
+    - JSON: DiscordChatExporter 形式（{"channel": {...}, "messages": [...]}）
+    """
+    with open(path, encoding='utf-8-sig') as f:
+        stream = _JsonStream(f)
+        first = stream.peek()
+        if path.endswith(('.jsonl', '.ndjson')):
+            while stream.peek():
+                yield None, stream.decode()
+        elif first == '[':
+            for message in stream.iter_array():
+                yield None, message
+        elif first == '{':
+            channel_id = None
+            stream.expect('{')
+            while stream.peek() != '}':
+                key = stream.decode()
+                stream.expect(':')
+                if key == 'messages':
+                    for message in stream.iter_array():
+                        yield channel_id, message
+                else:
+                    value = stream.decode()
+                    if key == 'channel' and isinstance(value, dict) and value.get('id'):
+                        channel_id = str(value['id'])
+                if stream.peek() == ',':
+                    stream.expect(',')
+            stream.expect('}')
+        elif first:
+            raise ValueError("エクスポートの形式が正しくありません（JSON または JSONL が必要です）")
+
+
+def recover_from_export(
+    conn: sqlite3.Connection,
+    path: str,
+    user_id: int,
+    channel_id: Optional[str] = None,
+    is_private: Optional[bool] = None,
+    on_progress: Optional[Callable[[int, int], None]] = None,
+    chunk_size: int = EXPORT_CHUNK_SIZE,
+) -> Tuple[int, int]:
+    """エクスポートファイルから DB にない投稿を復元します。
+
+    メッセージは1件ずつ読み込んで chunk_size 件ごとに書き込むため、
+    メモリ使用量はファイルの大きさによりません。
+
+    Args:
+        conn: 自動コミット（isolation_level=None）の接続
+        user_id: 復元した投稿に暫定で設定する投稿者ID
+        channel_id: ファイルからチャンネルIDが分からない場合に使うチャンネルID
+        is_private: 公開・非公開（省略時は公開チャンネルかどうかで判定）
+        on_progress: EXPORT_PROGRESS_INTERVAL 件ごとに (確認したメッセージ数, 復元した投稿数) で呼ばれる関数
+
+    Returns:
+        Tuple[int, int]: (確認したメッセージ数, 復元した投稿数)
+    """
+    # 件数の分からないファイルなので既存の投稿IDは読み込まず、書き込み時に判定する
+    writer = RecoveryWriter(conn, chunk_size=chunk_size, track_existing=False)
+    scanned = 0
+    for export_channel_id, data in iter_export_messages(path):
+        message_channel_id = data.get('channel_id') or export_channel_id or channel_id
+        if message_channel_id is None:
+            raise ValueError("エクスポートにチャンネルIDが含まれていません。チャンネルIDを指定してください。")
+        private = is_private if is_private is not None else int(message_channel_id) != CHANNELS['public']
+        post = parse_export_message(data, message_channel_id, private, user_id)
+        if post is not None:
+            writer.add(post)
+        scanned += 1
+        if on_progress is not None and scanned % EXPORT_PROGRESS_INTERVAL == 0:
+            on_progress(scanned, writer.recovered)
+    writer.flush()
+    if on_progress is not None:
+        on_progress(scanned, writer.recovered)
+    return scanned, writer.recovered
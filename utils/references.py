@@ -0,0 +1,33 @@
+"""投稿が送信されたDiscordメッセージの位置
+
+message_references の行 (channel_id, message_id, webhook_id) を表し、
+メッセージを fetch せずに編集・削除するための PartialMessage を作ります。
+"""
+
+from __future__ import annotations
+
+from typing import NamedTuple, Optional, Union
+
+import discord
+
+
+class MessageRef(NamedTuple):
+    """投稿が送信されたメッセージの位置"""
+    channel_id: int
+    message_id: int
+    webhook_id: Optional[int] = None
+
+    @classmethod
+    def from_row(cls, channel_id: Union[int, str], message_id: Union[int, str], webhook_id: Union[int, str, None] = None) -> "MessageRef":
+        """DBの行（文字列で保存されている場合を含む）から作成します。"""
+        return cls(int(channel_id), int(message_id), int(webhook_id) if webhook_id else None)
+
+
+def partial_message(bot: discord.Client, ref: MessageRef) -> discord.PartialMessage:
+    """API を呼ばずにメッセージ操作用の PartialMessage を作ります。
+
+    キャッシュ済みのチャンネルがあればそれを使い、なければ
+    PartialMessageable を使います。どちらも HTTP リクエストは発生しません。
+    """
+    channel = bot.get_channel(ref.channel_id) or bot.get_partial_messageable(ref.channel_id)
+    return channel.get_partial_message(ref.message_id)
@@ -0,0 +1,94 @@
+"""応答期限を意識したインタラクション応答
+
+Discord のインタラクションは作成から3秒以内に最初の応答が必要です。
+`DeadlineResponder` は経過時間を監視し、期限の直前になっても応答していなければ
+自動で defer し、以降の応答を followup に切り替えます。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+from typing import Any, Optional
+
+import discord
+
+from utils import metrics
+
+logger = logging.getLogger(__name__)
+
+# Discord の初回応答期限（秒）
+INTERACTION_DEADLINE = 3.0
+# 期限のこの秒数前に自動で defer する
+DEFER_MARGIN = 0.8
+# 直接応答できてもこの秒数を超えたら「ぎりぎり」として数える
+NEAR_MISS_THRESHOLD = 2.0
+
+
+class DeadlineResponder:
+    """応答期限の直前に自動で defer するインタラクション応答ラッパー
+
+    使い方::
+
+        async with DeadlineResponder(interaction, "edit") as responder:
+            ...  # 時間のかかる処理
+            await responder.send("✅ 完了しました")
+    """
+
+    def __init__(self, interaction: discord.Interaction, command_name: str, *, ephemeral: bool = True) -> None:
+        self.interaction = interaction
+        self.command_name = command_name
+        self.ephemeral = ephemeral
+        self.auto_deferred = False
+        self.responded = False
+        self._lock = asyncio.Lock()
+        self._timer: Optional[asyncio.Task] = None
+
+    def elapsed(self) -> float:
+        """インタラクション作成からの経過秒数"""
+        return (discord.utils.utcnow() - self.interaction.created_at).total_seconds()
+
+    async def __aenter__(self) -> "DeadlineResponder":
+        delay = max(0.0, INTERACTION_DEADLINE - DEFER_MARGIN - self.elapsed())
+        self._timer = asyncio.create_task(self._auto_defer(delay))
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+        metrics.observe(f'responder.{self.command_name}', self.elapsed())
+
+    async def _auto_defer(self, delay: float) -> None:
+        await asyncio.sleep(delay)
+        async with self._lock:
+            if self.interaction.response.is_done():
+                return
+            try:
+                await self.interaction.response.defer(ephemeral=self.ephemeral, thinking=True)
+            except discord.HTTPException as e:
+                logger.warning(f"自動 defer に失敗しました: command={self.command_name}, error={e}")
+                return
+            self.auto_deferred = True
+            metrics.increment(f'responder.near_miss.{self.command_name}')
+            logger.info(f"応答期限が近いため自動で defer しました: command={self.command_name}, elapsed={self.elapsed():.2f}s")
+
+    async def defer(self) -> None:
+        """明示的に defer します（既に応答済みなら何もしません）。"""
+        async with self._lock:
+            if not self.interaction.response.is_done():
+                await self.interaction.response.defer(ephemeral=self.ephemeral, thinking=True)
+
+    async def send(self, content: Optional[str] = None, **kwargs: Any) -> None:
+        """最終的な応答を送信します（defer 済みなら followup で送信します）。"""
+        kwargs.setdefault('ephemeral', self.ephemeral)
+        async with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+            if not self.interaction.response.is_done():
+                elapsed = self.elapsed()
+                if elapsed > NEAR_MISS_THRESHOLD:
+                    metrics.increment(f'responder.near_miss.{self.command_name}')
+                await self.interaction.response.send_message(content, **kwargs)
+            else:
+                await self.interaction.followup.send(content, **kwargs)
+            self.responded = True
@@ -0,0 +1,171 @@
+"""投稿の編集履歴
+
+編集のたびに本文全体を保存すると容量が増えるため、直前の版との差分だけを
+`thought_revisions` に保存します。差分が長く続くと復元に時間がかかるので、
+`SNAPSHOT_INTERVAL` 版ごとに本文全体（スナップショット）を保存し、
+どの版も最大 `SNAPSHOT_INTERVAL` 個の差分の適用で復元できるようにします。
+
+版番号 0 は最初の編集時に記録する元の投稿内容です。
+"""
+
+from __future__ import annotations
+
+import difflib
+import json
+import sqlite3
+from typing import Any, Dict, List, NamedTuple, Optional, Union
+
+# この版番号ごとに本文全体を保存する
+SNAPSHOT_INTERVAL = 10
+
+# 差分の1要素: [開始, 終了] は直前の版からのコピー、文字列はそのまま挿入
+DeltaOp = Union[List[int], str]
+
+
+def make_delta(old: str, new: str) -> str:
+    """old から new を作る差分を JSON 文字列で返します。"""
+    # 編集は一部分だけのことが多いので、共通の先頭・末尾を除いてから比較する
+    limit = min(len(old), len(new))
+    prefix = 0
+    while prefix < limit and old[prefix] == new[prefix]:
+        prefix += 1
+    suffix = 0
+    while suffix < limit - prefix and old[-1 - suffix] == new[-1 - suffix]:
+        suffix += 1
+
+    ops: List[DeltaOp] = []
+    if prefix:
+        ops.append([0, prefix])
+    old_mid = old[prefix:len(old) - suffix]
+    new_mid = new[prefix:len(new) - suffix]
+    matcher = difflib.SequenceMatcher(None, old_mid, new_mid, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            ops.append([prefix + i1, prefix + i2])
+        elif tag in ('replace', 'insert'):
+            ops.append(new_mid[j1:j2])
+    if suffix:
+        ops.append([len(old) - suffix, len(old)])
+    return json.dumps(ops, ensure_ascii=False, separators=(',', ':'))
+
+
+def apply_delta(old: str, delta: str) -> str:
+    """make_delta で作った差分を old に適用します。"""
+    parts = []
+    for op in json.loads(delta):
+        if isinstance(op, str):
+            parts.append(op)
+        else:
+            parts.append(old[op[0]:op[1]])
+    return ''.join(parts)
+
+
+class Revision(NamedTuple):
+    """復元した版"""
+    revision: int
+    content: str
+    category: Optional[str]
+    image_url: Optional[str]
+    editor_id: Optional[int]
+    created_at: Optional[str]
+
+
+def _insert(
+    cursor: sqlite3.Cursor,
+    post_id: int,
+    revision: int,
+    previous: Optional[str],
+    content: str,
+    category: Optional[str],
+    image_url: Optional[str],
+    editor_id: Optional[int],
+) -> None:
+    kind, data = 'snapshot', content
+    if previous is not None and revision % SNAPSHOT_INTERVAL != 0:
+        delta = make_delta(previous, content)
+        # 差分の方が大きくなる場合（全面的な書き換えなど）は全文を保存する
+        if len(delta.encode('utf-8')) < len(content.encode('utf-8')):
+            kind, data = 'delta', delta
+    cursor.execute('''
+        INSERT INTO thought_revisions (post_id, revision, kind, data, category, image_url, editor_id)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', (post_id, revision, kind, data, category, image_url, editor_id))
+
+
+def record_revision(
+    cursor: sqlite3.Cursor,
+    post_id: int,
+    content: str,
+    category: Optional[str],
+    image_url: Optional[str],
+    editor_id: Optional[int],
+) -> Optional[int]:
+    """投稿を更新する直前に呼び出し、新しい版を記録します。
+
+    呼び出し側と同じトランザクションで実行してください。内容が変わらない場合や
+    投稿が存在しない場合は何も記録しません。
+
+    Returns:
+        Optional[int]: 記録した版番号
+    """
+    cursor.execute('''
+        SELECT t.content, t.category, t.image_url, t.user_id,
+               (SELECT MAX(revision) FROM thought_revisions WHERE post_id = t.id)
+        FROM thoughts t
+        WHERE t.id = ?
+    ''', (post_id,))
+    row = cursor.fetchone()
+    if row is None:
+        return None
+
+    old_content, old_category, old_image_url, author_id, last_revision = row
+    if (old_content, old_category, old_image_url) == (content, category, image_url):
+        return None
+
+    if last_revision is None:
+        # 最初の編集では元の投稿内容を版 0 として残す
+        _insert(cursor, post_id, 0, None, old_content, old_category, old_image_url, author_id)
+        last_revision = 0
+
+    revision = last_revision + 1
+    _insert(cursor, post_id, revision, old_content, content, category, image_url, editor_id)
+    return revision
+
+
+def load_revision(cursor: sqlite3.Cursor, post_id: int, revision: int) -> Optional[Revision]:
+    """指定した版を復元します（直近のスナップショットから差分を適用）。"""
+    cursor.execute('''
+        SELECT revision, kind, data, category, image_url, editor_id, created_at
+        FROM thought_revisions
+        WHERE post_id = ?
+          AND revision <= ?
+          AND revision >= (
+              SELECT MAX(revision) FROM thought_revisions
+              WHERE post_id = ? AND revision <= ? AND kind = 'snapshot'
+          )
+        ORDER BY revision
+    ''', (post_id, revision, post_id, revision))
+    rows = cursor.fetchall()
+    if not rows or rows[-1][0] != revision:
+        return None
+
+    content = ''
+    for _, kind, data, *_ in rows:
+        content = data if kind == 'snapshot' else apply_delta(content, data)
+    _, _, _, category, image_url, editor_id, created_at = rows[-1]
+    return Revision(revision, content, category, image_url, editor_id, created_at)
+
+
+def list_revisions(cursor: sqlite3.Cursor, post_id: int, limit: int = 20) -> List[Dict[str, Any]]:
+    """投稿の版の一覧を新しい順に返します（本文は復元しません）。"""
+    cursor.execute('''
+        SELECT revision, kind, LENGTH(CAST(data AS BLOB)) AS size, editor_id, created_at
+        FROM thought_revisions
+        WHERE post_id = ?
+        ORDER BY revision DESC
+        LIMIT ?
+    ''', (post_id, limit))
+    return [
+        {'revision': r[0], 'kind': r[1], 'size': r[2], 'editor_id': r[3], 'created_at': r[4]}
+        for r in cursor.fetchall()
+    ]
@@ -0,0 +1,135 @@
+"""Webhook 経由の投稿配信
+
+公開投稿を投稿者の名前・アイコンで送信するための Webhook をチャンネルごとに
+キャッシュします。Webhook の実行はボット本体の送信とは別のレート制限バケットを
+使うため、公開チャンネルへの連続投稿に強くなります。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+from typing import Dict, Optional
+
+import discord
+
+logger = logging.getLogger(__name__)
+
+# ボットが作成・再利用する Webhook の名前
+WEBHOOK_NAME = "ThoughtBot Delivery"
+
+
+class WebhookDelivery:
+    """チャンネルごとの Webhook をキャッシュして送信・編集・削除を行うクラス"""
+
+    def __init__(self) -> None:
+        self._by_channel: Dict[int, discord.Webhook] = {}
+        self._by_id: Dict[int, discord.Webhook] = {}
+        self._locks: Dict[int, asyncio.Lock] = {}
+
+    def _remember(self, channel_id: int, webhook: discord.Webhook) -> discord.Webhook:
+        self._by_channel[channel_id] = webhook
+        self._by_id[webhook.id] = webhook
+        return webhook
+
+    def forget(self, webhook_id: int) -> None:
+        """削除された Webhook をキャッシュから取り除きます。"""
+        webhook = self._by_id.pop(webhook_id, None)
+        if webhook is not None and webhook.channel_id is not None:
+            self._by_channel.pop(webhook.channel_id, None)
+
+    async def get_webhook(self, channel: discord.TextChannel) -> discord.Webhook:
+        """チャンネル用の Webhook を取得します（なければ作成します）。
+
+        Args:
+            channel: 配信先のテキストチャンネル
+
+        Returns:
+            discord.Webhook: トークン付きの Webhook
+        """
+        cached = self._by_channel.get(channel.id)
+        if cached is not None:
+            return cached
+
+        # 同じチャンネルで同時に Webhook を作成しないようにロックする
+        lock = self._locks.setdefault(channel.id, asyncio.Lock())
+        async with lock:
+            cached = self._by_channel.get(channel.id)
+            if cached is not None:
+                return cached
+
+            bot_user = channel.guild.me
+            for webhook in await channel.webhooks():
+                if webhook.name == WEBHOOK_NAME and webhook.token and webhook.user and webhook.user.id == bot_user.id:
+                    logger.info(f"既存の Webhook を再利用します: channel_id={channel.id}, webhook_id={webhook.id}")
+                    return self._remember(channel.id, webhook)
+
+            webhook = await channel.create_webhook(name=WEBHOOK_NAME, reason="投稿配信用 Webhook の作成")
+            logger.info(f"Webhook を作成しました: channel_id={channel.id}, webhook_id={webhook.id}")
+            return self._remember(channel.id, webhook)
+
+    async def _resolve(self, bot: discord.Client, channel_id: int, webhook_id: int) -> discord.Webhook:
+        """保存済みの Webhook ID から Webhook を取得します。"""
+        webhook = self._by_id.get(webhook_id)
+        if webhook is not None:
+            return webhook
+
+        webhook = await bot.fetch_webhook(webhook_id)
+        if not webhook.token:
+            raise RuntimeError(f"Webhook のトークンを取得できません (webhook_id={webhook_id})")
+        return self._remember(channel_id, webhook)
+
+    async def send(
+        self,
+        channel: discord.TextChannel,
+        embed: discord.Embed,
+        username: str,
+        avatar_url: Optional[str],
+    ) -> discord.WebhookMessage:
+        """Webhook で埋め込みメッセージを送信します。
+
+        Args:
+            channel: 配信先のテキストチャンネル
+            embed: 送信する埋め込み
+            username: 表示する投稿者名
+            avatar_url: 表示するアイコンURL
+
+        Returns:
+            discord.WebhookMessage: 送信されたメッセージ
+        """
+        webhook = await self.get_webhook(channel)
+        try:
+            return await webhook.send(embed=embed, username=username[:80], avatar_url=avatar_url, wait=True)
+        except discord.NotFound:
+            # Webhook が手動で削除されていた場合は作り直して1回だけ再送する
+            logger.warning(f"Webhook が見つかりません。再作成します: webhook_id={webhook.id}")
+            self.forget(webhook.id)
+            webhook = await self.get_webhook(channel)
+            return await webhook.send(embed=embed, username=username[:80], avatar_url=avatar_url, wait=True)
+
+    async def edit(
+        self,
+        bot: discord.Client,
+        channel_id: int,
+        webhook_id: int,
+        message_id: int,
+        embed: discord.Embed,
+    ) -> None:
+        """Webhook で送信したメッセージを編集します。"""
+        webhook = await self._resolve(bot, channel_id, webhook_id)
+        await webhook.edit_message(message_id, embed=embed)
+
+    async def delete(
+        self,
+        bot: discord.Client,
+        channel_id: int,
+        webhook_id: int,
+        message_id: int,
+    ) -> None:
+        """Webhook で送信したメッセージを削除します。"""
+        webhook = await self._resolve(bot, channel_id, webhook_id)
+        await webhook.delete_message(message_id)
+
+
+# 全 Cog で共有するインスタンス
+webhook_delivery = WebhookDelivery()